@@ -0,0 +1,455 @@
+"""Benchmarks of building, sampling, joining and serving word salads.
+
+Every benchmark is run on a synthetic corpus and on a real text (test.txt by
+default), cut or repeated to each of the given sizes in characters. The time
+is the best and the median of a number of runs, and the peak memory is
+measured with tracemalloc in one more run. Run from the repository root:
+
+    python -m benchmarks.run --output before.json
+    python -m benchmarks.run --output after.json --compare before.json
+
+Synthetic corpora are generated from a fixed seed, so results of different
+commits can be compared.
+"""
+from wordsalad import WordSaladMatrixBuilder, WordSaladMatrix, draw_follower, chain, generate_sentences, generate_batch, compact_matrix
+from wordsalad.input import split_germanic, split_germanic_ids
+from wordsalad.sampling import AliasSampler, ModeSampler, SamplingMode
+from wordsalad.utils import join_germanic, join_germanic_many
+from itertools import islice
+import argparse
+import atexit
+import json
+import numpy as np
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+DEFAULT_SIZES = [100000, 1000000]
+DEFAULT_REAL = "test.txt"
+STOPS = list(".?!")
+
+BENCHMARKS = []
+
+def benchmark(name):
+    """Registers a benchmark. The decorated function is given a Corpus and
+    returns a function to time, which returns the number of items (words,
+    draws, sentences...) it handled."""
+    def register(f):
+        BENCHMARKS.append((name, f))
+        return f
+    return register
+
+class Corpus:
+    """A text, and what is built from it, computed once when first used."""
+    def __init__(self, name, text):
+        self.name = name
+        self.text = text
+        self._words = None
+        self._builder = None
+        self._matrix = None
+        self._starts = None
+
+    @property
+    def words(self):
+        if self._words is None:
+            self._starts = []
+            self._words = list(split_germanic(self.text, start_words=self._starts))
+        return self._words
+
+    @property
+    def starts(self):
+        self.words
+        return self._starts
+
+    @property
+    def builder(self):
+        if self._builder is None:
+            self._builder = WordSaladMatrixBuilder()
+            self._builder.count_followers_in_sequence(self.words)
+        return self._builder
+
+    @property
+    def matrix(self):
+        if self._matrix is None:
+            self._matrix = self.builder.build_matrix()
+        return self._matrix
+
+def synthetic_text(size, seed=0):
+    """Returns about size characters of sentences of made up words, whose
+    frequencies follow a Zipf-like distribution."""
+    rnd = random.Random(seed)
+    syllables = ["ka", "lo", "mi", "ne", "su", "ra", "te", "vo", "shi", "den", "ul", "ix"]
+    words = ["".join(rnd.choice(syllables) for _ in range(0, rnd.randint(1, 4))) for _ in range(0, 20000)]
+    weights = [1.0 / (r + 1) for r in range(0, len(words))]
+    parts = []
+    n = 0
+    while n < size:
+        sentence = rnd.choices(words, weights, k=rnd.randint(4, 20))
+        sentence[0] = sentence[0].capitalize()
+        if rnd.random() < 0.2:
+            sentence.insert(rnd.randint(1, len(sentence) - 1), ",")
+        s = " ".join(sentence).replace(" ,", ",") + rnd.choice([".", ".", ".", "?", "!"])
+        parts.append(s)
+        n += len(s) + 1
+    return " ".join(parts)[:size]
+
+def real_text(path, size):
+    """Returns the first size characters of the file at path, repeated if it is
+    shorter."""
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    if len(text) == 0:
+        raise ValueError("{} is empty.".format(path))
+    return (text * (size // len(text) + 1))[:size]
+
+@benchmark("split_germanic")
+def bench_split_germanic(corpus):
+    text = corpus.text
+    return lambda: sum(1 for _ in split_germanic(text))
+
+@benchmark("count_followers_in_sequence")
+def bench_count_followers(corpus):
+    words = corpus.words
+    def run():
+        WordSaladMatrixBuilder().count_followers_in_sequence(words)
+        return len(words)
+    return run
+
+@benchmark("count_text")
+def bench_count_text(corpus):
+    # Tokenising and counting, with start words, the way the server did.
+    text = corpus.text
+    def run():
+        starts = []
+        builder = WordSaladMatrixBuilder()
+        builder.count_followers_in_sequence(split_germanic(text, start_words=starts))
+        return len(builder.row) + 1
+    return run
+
+@benchmark("count_text_ids")
+def bench_count_text_ids(corpus):
+    # The same with word indices all the way.
+    text = corpus.text
+    def run():
+        builder = WordSaladMatrixBuilder()
+        ids, starts = split_germanic_ids(text, builder.words)
+        builder.count_followers_in_ids(ids)
+        return len(ids)
+    return run
+
+@benchmark("build_matrix")
+def bench_build_matrix(corpus):
+    builder = corpus.builder
+    def run():
+        builder.build_matrix()
+        return len(builder.row)
+    return run
+
+@benchmark("draw_follower")
+def bench_draw_follower(corpus):
+    mat = corpus.matrix
+    rnd = random.Random(1)
+    words = [rnd.choice(corpus.words) for _ in range(0, 100000)]
+    mat.sampler()
+    def run():
+        for w in words:
+            draw_follower(mat, w)
+        return len(words)
+    return run
+
+@benchmark("draw_follower_alias")
+def bench_draw_follower_alias(corpus):
+    # The same draws as draw_follower, on a copy of the matrix using alias 
+    # tables.
+    mat = WordSaladMatrix(corpus.matrix.matrix, corpus.matrix.vocabulary, counts=corpus.matrix.counts)
+    mat.useAliasSampling()
+    rnd = random.Random(1)
+    words = [rnd.choice(corpus.words) for _ in range(0, 100000)]
+    def run():
+        for w in words:
+            draw_follower(mat, w)
+        return len(words)
+    return run
+
+@benchmark("draw_follower_top_p")
+def bench_draw_follower_top_p(corpus):
+    # The same draws as draw_follower in a sampling mode, after its index is
+    # built.
+    mat = corpus.matrix
+    mode = SamplingMode(temperature=0.8, top_p=0.9)
+    rnd = random.Random(1)
+    words = [rnd.choice(corpus.words) for _ in range(0, 100000)]
+    mat.sampler(mode)
+    def run():
+        for w in words:
+            draw_follower(mat, w, mode=mode)
+        return len(words)
+    return run
+
+@benchmark("build_mode_sampler")
+def bench_build_mode_sampler(corpus):
+    m = corpus.matrix.matrix.tocsr()
+    mode = SamplingMode(temperature=0.8, top_k=40, top_p=0.9)
+    def run():
+        ModeSampler.from_matrix(m, mode)
+        return m.nnz
+    return run
+
+def _heavy_draws(corpus, sampler):
+    # Draws straight from the sampler, from the ten rows with the most
+    # followers.
+    rows = np.argsort(np.diff(sampler.indptr))[-10:].tolist()
+    rnd = random.Random(5)
+    draws = [(rnd.choice(rows), rnd.uniform(0.0, 1.0)) for _ in range(0, 100000)]
+    def run():
+        draw = sampler.draw
+        for i, p in draws:
+            draw(i, p)
+        return len(draws)
+    return run
+
+@benchmark("draw_heavy_cumulative")
+def bench_draw_heavy_cumulative(corpus):
+    return _heavy_draws(corpus, corpus.matrix.sampler())
+
+@benchmark("draw_heavy_alias")
+def bench_draw_heavy_alias(corpus):
+    return _heavy_draws(corpus, AliasSampler.from_sampler(corpus.matrix.sampler()))
+
+@benchmark("compact_matrix")
+def bench_compact_matrix(corpus):
+    mat = corpus.matrix
+    def run():
+        compact_matrix(mat, min_count=2)
+        return mat.matrix.nnz
+    return run
+
+@benchmark("draw_follower_compact")
+def bench_draw_follower_compact(corpus):
+    # The same draws as draw_follower, from a compact copy of the matrix.
+    mat = compact_matrix(corpus.matrix)
+    rnd = random.Random(1)
+    words = [rnd.choice(corpus.words) for _ in range(0, 100000)]
+    def run():
+        for w in words:
+            draw_follower(mat, w)
+        return len(words)
+    return run
+
+@benchmark("chain")
+def bench_chain(corpus):
+    mat = corpus.matrix
+    starts = corpus.starts
+    mat.sampler()
+    def run():
+        random.seed(2)
+        n = 0
+        while n < 100000:
+            n += sum(1 for _ in islice(chain(mat, random.choice(starts)), 100000 - n))
+        return n
+    return run
+
+@benchmark("generate_sentences")
+def bench_generate_sentences(corpus):
+    mat = corpus.matrix
+    starts = corpus.starts
+    mat.sampler()
+    def run():
+        random.seed(3)
+        return len([list(s) for s in generate_sentences(mat, 1000, starts, stops=STOPS)])
+    return run
+
+@benchmark("generate_batch")
+def bench_generate_batch(corpus):
+    mat = corpus.matrix
+    starts = corpus.starts
+    mat.sampler()
+    def run():
+        random.seed(3)
+        return len(generate_batch(mat, 1000, starts, stops=STOPS, join=list))
+    return run
+
+@benchmark("join_germanic")
+def bench_join_germanic(corpus):
+    sentences = _sentences(corpus.words, 20)
+    def run():
+        for s in sentences:
+            join_germanic(s)
+        return len(sentences)
+    return run
+
+@benchmark("join_germanic_many")
+def bench_join_germanic_many(corpus):
+    sentences = _sentences(corpus.words, 20)
+    def run():
+        join_germanic_many(sentences)
+        return len(sentences)
+    return run
+
+@benchmark("flask")
+def bench_flask(corpus):
+    import wordsaladflask
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "corpus.txt")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(corpus.text)
+    config = {"corpora": [{"name": "bench", "filename": path}], "preload": True}
+    wordsaladflask.salads.clear()
+    wordsaladflask.buildSalads(config)
+    wordsaladflask.app.config.update(config)
+    shutil.rmtree(directory)
+    client = wordsaladflask.app.test_client()
+    def run():
+        random.seed(4)
+        for _ in range(0, 10):
+            response = client.get("/salad/100/bench")
+            # The salads are streamed, so they are only made when read.
+            response.get_data()
+            response.close()
+            if response.status_code != 200:
+                raise RuntimeError("Request failed with status {}.".format(response.status_code))
+        return 10 * 100
+    return run
+
+@benchmark("import_wordsalad")
+def bench_import_wordsalad(corpus):
+    # A fresh interpreter each run, so this includes starting Python.
+    return lambda: _python("import wordsalad; wordsalad.generate_batch")
+
+@benchmark("import_serve")
+def bench_import_serve(corpus):
+    # What a serve-only worker does: load a saved model and generate, without
+    # importing scipy.
+    from wordsalad import save_matrix
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "corpus.wsm")
+    save_matrix(corpus.matrix, path)
+    atexit.register(shutil.rmtree, directory, True)
+    return lambda: _python(
+        "import sys, wordsalad\n"
+        "mat = wordsalad.load_matrix(sys.argv[1], mmap=True)\n"
+        "wordsalad.generate_batch(mat, 10, [mat.vocabulary.words[0]], max_length=20)\n"
+        "assert 'scipy' not in sys.modules, 'scipy was imported'\n", path)
+
+def _python(code, *args):
+    # Runs code in a new interpreter, from the repository root.
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, "-c", code] + list(args), cwd=root, check=True)
+    return 1
+
+def _sentences(words, length):
+    return [words[i:i + length] for i in range(0, len(words) - length + 1, length)]
+
+def measure(fn, repeat):
+    """Times fn repeat times and measures its peak memory in one more run."""
+    times = []
+    for _ in range(0, repeat):
+        start = time.perf_counter()
+        items = fn()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    best = min(times)
+    return {
+        "seconds": best,
+        "median_seconds": statistics.median(times),
+        "peak_bytes": peak,
+        "items": items,
+        "items_per_second": items / best if best > 0 else None,
+    }
+
+def environment():
+    """Describes where the benchmarks ran."""
+    import numpy
+    import scipy
+    env = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": numpy.__version__,
+        "scipy": scipy.__version__,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    try:
+        env["commit"] = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        env["commit"] = None
+    return env
+
+def run(sizes, repeat, real=DEFAULT_REAL, only=None, log=None):
+    """Runs the benchmarks, returns the results as a JSON-able dict."""
+    corpora = []
+    for size in sizes:
+        corpora.append(lambda size=size: Corpus("synthetic", synthetic_text(size)))
+        if real:
+            corpora.append(lambda size=size: Corpus(os.path.basename(real), real_text(real, size)))
+    results = []
+    for make in corpora:
+        corpus = make()
+        for name, setup in BENCHMARKS:
+            if only and name not in only:
+                continue
+            result = {"name": name, "corpus": corpus.name, "size": len(corpus.text)}
+            result.update(measure(setup(corpus), repeat))
+            results.append(result)
+            if log is not None:
+                log(result)
+    return {"environment": environment(), "repeat": repeat, "results": results}
+
+def compare(old, new):
+    """Returns lines comparing the times of two results dicts, for the
+    benchmarks in both."""
+    before = {(r["name"], r["corpus"], r["size"]): r for r in old["results"]}
+    lines = []
+    for r in new["results"]:
+        o = before.get((r["name"], r["corpus"], r["size"]))
+        if o is None or r["seconds"] <= 0:
+            continue
+        lines.append("{:<28} {:<12} {:>9} {:>9.4f}s -> {:>9.4f}s  x{:.2f}  peak {:>9.1f} -> {:>9.1f} KiB".format(
+            r["name"], r["corpus"], r["size"], o["seconds"], r["seconds"], o["seconds"] / r["seconds"],
+            o["peak_bytes"] / 1024, r["peak_bytes"] / 1024))
+    return lines
+
+def _print_result(r):
+    print("{:<28} {:<12} {:>9} {:>9.4f}s {:>12.0f}/s  peak {:>9.1f} KiB".format(
+        r["name"], r["corpus"], r["size"], r["seconds"], r["items_per_second"] or 0, r["peak_bytes"] / 1024),
+        file=sys.stderr)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Runs the wordsalad benchmarks.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="Corpus sizes in characters.")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per benchmark.")
+    parser.add_argument("--real", default=DEFAULT_REAL,
+                        help="A text file to use as the real corpus, or '' for none.")
+    parser.add_argument("--only", nargs="+", help="Names of the benchmarks to run.")
+    parser.add_argument("--output", help="Writes the results as JSON to this file.")
+    parser.add_argument("--compare", help="A results file to compare with.")
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, max(args.repeat, 1), real=args.real, only=args.only, log=_print_result)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            old = json.load(f)
+        for line in compare(old, results):
+            print(line, file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
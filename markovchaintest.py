@@ -1,5 +1,3 @@
-from scipy.sparse import csr_matrix, coo_matrix, diags
-from scipy.sparse import isspmatrix
 import random
 
 class WordSaladMatrixBuilder():
@@ -38,6 +36,7 @@ class WordSaladMatrixBuilder():
         self.data.append(1)
     
     def build_matrix(self):
+        from scipy.sparse import coo_matrix, diags
         m = coo_matrix((self.data, (self.row, self.col)), shape=(self.c, self.c))
         m.sum_duplicates()
         m = m.tocsr()
@@ -74,6 +73,7 @@ class WordSaladMatrix:
     is expected, a great deal of followers will have probability zero.
     """
     def __init__(self, freqmatrix, wordtoindex):
+        from scipy.sparse import isspmatrix
         if not isspmatrix(freqmatrix):
             raise TypeError("freqmatrix must be a scipy sparse matrix, is type {}.".format(type(freqmatrix)))
         self.matrix = freqmatrix
@@ -247,4 +247,5 @@ def test():
 
 #import cProfile
 #cProfile.run("test()", sort="cumtime")
-test()
\ No newline at end of file
+if __name__ == "__main__":
+    test()
\ No newline at end of file
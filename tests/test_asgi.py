@@ -0,0 +1,78 @@
+from tests.test_flask import ServerTestCase
+import wordsaladasgi
+import wordsaladflask
+import asyncio
+import json
+import os
+
+def request(path, query=b"", scope_type="http"):
+    """Runs wordsaladasgi.application for one request, returns the messages it
+    sent."""
+    sent = []
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+    async def send(message):
+        sent.append(message)
+    scope = {"type": scope_type, "path": path, "query_string": query}
+    asyncio.run(wordsaladasgi.application(scope, receive, send))
+    return sent
+
+def body(sent):
+    return b"".join(m["body"] for m in sent if m["type"] == "http.response.body").decode("utf-8")
+
+class TestASGI(ServerTestCase):
+
+    def test_batches(self):
+        self.setUpServer(batch_size=3)
+        sent = request("/salad/7/test")
+        self.assertEqual(200, sent[0]["status"])
+        bodies = [m for m in sent if m["type"] == "http.response.body"]
+        # Three batches and the end.
+        self.assertEqual([True, True, True, False], [m.get("more_body", False) for m in bodies])
+        self.assertEqual(7, body(sent).count("."))
+
+    def test_seed(self):
+        self.setUpServer(batch_size=2)
+        first = body(request("/salad/5/test", b"seed=3"))
+        self.assertEqual(first, body(request("/salad/5/test", b"seed=3")))
+
+    def test_errors(self):
+        self.setUpServer()
+        self.assertEqual(404, request("/nope")[0]["status"])
+        self.assertEqual("404", body(request("/salad/1/nope")))
+        self.assertEqual(400, request("/salad/21/test")[0]["status"])
+        self.assertEqual(400, request("/salad/1/test", b"top_p=2")[0]["status"])
+
+    def test_corpora(self):
+        self.setUpServer()
+        corpora = json.loads(body(request("/salad/corpora")))
+        self.assertEqual(["test"], [c["name"] for c in corpora])
+
+    def test_pool(self):
+        self.setUpServer(pool_depth=6, batch_size=2)
+        pool = wordsaladflask.pools["test"]
+        self.assertTrue(pool.wait(timeout=5))
+        self.assertEqual(5, body(request("/salad/5/test")).count("."))
+        self.assertEqual(5, pool.stats()["drained"])
+
+    def test_lifespan(self):
+        path = os.path.join(self.dir, "config.json")
+        self.config.update(pool_depth=4)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.config, f)
+        messages = [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}]
+        sent = []
+        async def receive():
+            return messages.pop(0)
+        async def send(message):
+            sent.append(message["type"])
+        old = wordsaladflask.DEFAULT_CONFIG_PATH
+        wordsaladflask.DEFAULT_CONFIG_PATH = path
+        try:
+            asyncio.run(wordsaladasgi.application({"type": "lifespan"}, receive, send))
+        finally:
+            wordsaladflask.DEFAULT_CONFIG_PATH = old
+        self.assertEqual(["lifespan.startup.complete", "lifespan.shutdown.complete"], sent)
+        pool = wordsaladflask.pools["test"]
+        self.assertTrue(pool.wait(timeout=5))
+        self.assertEqual(0, pool.stats()["errors"])
@@ -0,0 +1,27 @@
+from benchmarks.run import run, compare, synthetic_text, real_text, BENCHMARKS
+import json
+import os
+import unittest
+
+TEXT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "test.txt")
+
+class TestBenchmarks(unittest.TestCase):
+
+    def test_corpora(self):
+        self.assertEqual(synthetic_text(5000), synthetic_text(5000))
+        self.assertEqual(5000, len(synthetic_text(5000)))
+        self.assertEqual(5000, len(real_text(TEXT, 5000)))
+
+    def test_run_all(self):
+        results = run([3000], 1, real=TEXT)
+        # Must be JSON-able.
+        results = json.loads(json.dumps(results))
+        self.assertEqual(2 * len(BENCHMARKS), len(results["results"]))
+        for r in results["results"]:
+            self.assertGreater(r["items"], 0)
+            self.assertGreaterEqual(r["peak_bytes"], 0)
+        self.assertEqual(len(results["results"]), len(compare(results, results)))
+
+    def test_only(self):
+        results = run([3000], 1, real="", only=["split_germanic"])
+        self.assertEqual(["split_germanic"], [r["name"] for r in results["results"]])
@@ -0,0 +1,99 @@
+from wordsalad import WordSaladMatrixBuilder, WordSaladCompactMatrix, compact_matrix, draw_follower, generate_batch
+from wordsalad.compact import compaction_report
+import numpy as np
+import random
+import unittest
+
+class TestCompactMatrix(unittest.TestCase):
+
+    def setUp(self):
+        rnd = random.Random(7)
+        builder = WordSaladMatrixBuilder()
+        builder.count_followers_in_sequence([rnd.randint(0, 40) for i in range(0, 3000)])
+        for f, n in [("a", 6), ("b", 3), ("c", 1)]:
+            for i in range(0, n):
+                builder.count_follower("x", f)
+        builder.add_word("lonely")
+        self.M = builder.build_matrix()
+
+    def _followers(self, mat, w):
+        row = mat.probabilities(w).tocoo()
+        return {mat.wordAt(j): p for j, p in zip(row.col.tolist(), row.data.tolist())}
+
+    def test_without_pruning(self):
+        c = compact_matrix(self.M)
+        self.assertIsInstance(c, WordSaladCompactMatrix)
+        self.assertEqual(self.M.matrix.nnz, c.matrix.nnz)
+        self.assertLess(abs(self.M.matrix - c.matrix).max(), 1.0 / 65535)
+        self.assertEqual(np.uint16, c.sampler().indices.dtype)
+        self.assertEqual(np.uint16, c.sampler().cumulative.dtype)
+
+    def test_index_type(self):
+        for words, index_type in [(1 << 16, np.uint16), ((1 << 16) + 1, np.int32)]:
+            builder = WordSaladMatrixBuilder()
+            builder.count_followers_in_sequence(range(0, words))
+            mat = builder.build_matrix()
+            c = compact_matrix(mat)
+            self.assertEqual(index_type, c.sampler().indices.dtype)
+            # The last word is a follower, its index fits.
+            self.assertEqual(words - 1, draw_follower(c, words - 2))
+
+    def test_last_word_of_uint16_indices(self):
+        builder = WordSaladMatrixBuilder()
+        builder.count_followers_in_sequence(list(range(0, 1 << 16)) + [0, 1])
+        mat = builder.build_matrix()
+        c = compact_matrix(mat)
+        self.assertEqual(np.uint16, c.sampler().indices.dtype)
+        last = (1 << 16) - 1
+        expected = generate_batch(mat, 3, [last], max_length=3, join=list, seed=1)
+        self.assertEqual([[last, 0, 1]] * 3, expected)
+        self.assertEqual(expected, generate_batch(c, 3, [last], max_length=3, join=list, seed=1))
+
+    def test_min_count(self):
+        c = compact_matrix(self.M, min_count=3)
+        followers = self._followers(c, "x")
+        self.assertEqual({"a", "b"}, set(followers))
+        self.assertAlmostEqual(6 / 9.0, followers["a"], places=4)
+        # The likeliest follower is kept, however rare.
+        self.assertEqual(self.M.matrix.getrow(self.M.indexOf(0)).nnz > 0, c.matrix.getrow(c.indexOf(0)).nnz > 0)
+        for i in range(0, c.wordCount()):
+            row = c.matrix.getrow(i)
+            if row.nnz > 0:
+                self.assertAlmostEqual(1.0, row.sum())
+
+    def test_min_probability(self):
+        followers = self._followers(compact_matrix(self.M, min_probability=0.2), "x")
+        self.assertEqual({"a", "b"}, set(followers))
+
+    def test_min_count_needs_counts(self):
+        self.M.counts = None
+        with self.assertRaises(ValueError):
+            compact_matrix(self.M, min_count=2)
+
+    def test_draws(self):
+        c = compact_matrix(self.M, min_count=2, bits=8)
+        self.assertIsNone(draw_follower(c, "lonely"))
+        self.assertIn(draw_follower(c, "x"), ["a", "b"])
+        seqs = generate_batch(c, 20, [0], max_length=10, join=list, seed=1)
+        for seq in seqs:
+            for w, f in zip(seq, seq[1:]):
+                self.assertGreater(c.probability(w, f), 0.0)
+
+    def test_report(self):
+        report = compaction_report(self.M, compact_matrix(self.M))
+        self.assertEqual(report["entries"], report["compact_entries"])
+        self.assertLess(report["compact_bytes"], report["bytes"])
+        self.assertLess(report["total_variation"], 0.001)
+        self.assertLess(report["kl_divergence"], 0.001)
+
+        pruned = compaction_report(self.M, compact_matrix(self.M, min_count=3))
+        self.assertLess(pruned["compact_entries"], pruned["entries"])
+        self.assertGreater(pruned["total_variation"], report["total_variation"])
+        self.assertGreaterEqual(pruned["max_total_variation"], pruned["total_variation"])
+
+    def test_cannot_update(self):
+        c = compact_matrix(self.M)
+        with self.assertRaises(ValueError):
+            c.update([0, 1, 2])
+        with self.assertRaises(ValueError):
+            c.useAliasSampling()
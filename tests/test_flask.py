@@ -0,0 +1,104 @@
+import wordsalad.metrics
+import wordsaladflask
+from wordsaladflask import app, pools, salads
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+TEXT = "The cat sat. The dog ran. The cat ran."
+
+class ServerTestCase(unittest.TestCase):
+    """Sets up wordsaladflask with one small corpus, "test"."""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        path = os.path.join(self.dir, "test.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(TEXT)
+        self.config = {"corpora": [{"name": "test", "filename": path}], "max_salads": 20}
+
+    def tearDown(self):
+        for pool in pools.values():
+            pool.stop()
+        pools.clear()
+        salads.clear()
+        # buildSalads binds the loader to the test's config.
+        salads.loader = wordsaladflask.buildSalad
+        for name in ["corpora", "max_salads", "pool_depth", "pool_batch", "batch_size", "metrics", "processes"]:
+            app.config.pop(name, None)
+        wordsalad.metrics.set_sink(None)
+        shutil.rmtree(self.dir)
+
+    def setUpServer(self, **config):
+        self.config.update(config)
+        app.config.update(self.config)
+        wordsaladflask.buildSalads(self.config)
+
+class TestFlask(ServerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client = app.test_client()
+
+    def test_corpora(self):
+        self.setUpServer()
+        corpora = json.loads(self.client.get("/salad/corpora").get_data(as_text=True))
+        self.assertEqual([("test", False)], [(c["name"], c["loaded"]) for c in corpora])
+
+    def test_salads_are_streamed(self):
+        self.setUpServer()
+        response = self.client.get("/salad/5/test")
+        self.assertEqual(200, response.status_code)
+        self.assertTrue(response.is_streamed)
+        text = response.get_data(as_text=True)
+        self.assertEqual(5, text.count("."))
+        self.assertTrue(text.startswith("The "))
+
+    def test_counted_on_processes(self):
+        self.setUpServer(processes=2)
+        self.assertEqual(3, self.client.get("/salad/3/test").get_data(as_text=True).count("."))
+        self.assertListEqual(["The"], salads.get("test").startWords())
+
+    def test_seed(self):
+        self.setUpServer()
+        first = self.client.get("/salad/10/test?seed=7").get_data(as_text=True)
+        self.assertEqual(first, self.client.get("/salad/10/test?seed=7").get_data(as_text=True))
+
+    def test_unknown_corpus(self):
+        self.setUpServer()
+        self.assertEqual("404", self.client.get("/salad/1/nope").get_data(as_text=True))
+
+    def test_too_many(self):
+        self.setUpServer()
+        response = self.client.get("/salad/21/test")
+        self.assertEqual(400, response.status_code)
+        self.assertIn("20", response.get_data(as_text=True))
+
+    def test_sampling_mode(self):
+        self.setUpServer()
+        self.assertEqual(400, self.client.get("/salad/1/test?top_k=0").status_code)
+        text = self.client.get("/salad/3/test?top_k=1").get_data(as_text=True)
+        self.assertEqual(3, text.count("."))
+
+    def test_pool(self):
+        self.setUpServer(pool_depth=10, pool_batch=5)
+        pool = pools["test"]
+        self.assertTrue(pool.wait(timeout=5))
+        text = self.client.get("/salad/4/test").get_data(as_text=True)
+        self.assertEqual(4, text.count("."))
+        stats = pool.stats()
+        self.assertEqual((4, 0, 0), (stats["drained"], stats["on_demand"], stats["errors"]))
+        # Seeded requests are not served from the pool.
+        self.client.get("/salad/2/test?seed=1").get_data()
+        self.assertEqual(4, pool.stats()["drained"])
+        self.assertEqual(0, salads.stats()["failures"])
+
+    def test_metrics(self):
+        self.setUpServer(pool_depth=4, metrics=True)
+        pools["test"].wait(timeout=5)
+        self.client.get("/salad/2/test").get_data()
+        text = self.client.get("/metrics").get_data(as_text=True)
+        self.assertIn("wordsalad_registry_misses", text)
+        self.assertIn('wordsalad_pool_drained{corpus="test"} 2', text)
@@ -1,9 +1,10 @@
 import unittest
 
-from wordsalad import WordSaladMatrixBuilder, WordSaladMatrix
-from wordsalad.generators import draw_follower, chain, generate_sentences
+from wordsalad import WordSaladMatrixBuilder, SamplingMode
+from wordsalad.generators import draw_follower, chain, generate_sentences, generate_batch
 from itertools import islice
 import random
+import numpy as np
 
 
 def _get_static_string_mat():
@@ -37,6 +38,25 @@ class TestDrawFollower(unittest.TestCase):
         follower = draw_follower(_get_static_string_mat(), "cat")
         self.assertEqual(follower, "has")
     
+    def test_draws_from_the_whole_range(self):
+        # The least likely follower is drawn with the lowest numbers too.
+        builder = WordSaladMatrixBuilder()
+        builder.count_follower("I", "am")
+        for i in range(0, 199):
+            builder.count_follower("I", "have")
+        mat = builder.build_matrix()
+        self.assertEqual("am", draw_follower(mat, "I", rng=lambda a, b: a))
+        self.assertEqual("have", draw_follower(mat, "I", rng=lambda a, b: 0.5))
+
+    def test_draws_in_mode(self):
+        builder = WordSaladMatrixBuilder()
+        builder.count_follower("I", "am")
+        builder.count_follower("I", "have")
+        builder.count_follower("I", "have")
+        mat = builder.build_matrix()
+        for i in range(0, 20):
+            self.assertEqual("have", draw_follower(mat, "I", mode=SamplingMode(top_k=1)))
+
     def test_draws_roughly_uniformly(self):
         builder = WordSaladMatrixBuilder()
 
@@ -136,5 +156,89 @@ class TestGenerateSentences(unittest.TestCase):
         self.assertEqual(len(lists), 2)
 
         self.assertTrue(first or second, "None of the sentences matched our expected output.")
+
+    def test_generate_sentences_stored_start_words(self):
+        self.M.setStartWords([9, 9, 9])
+        for l in [list(k) for k in generate_sentences(self.M, 5)]:
+            self.assertEqual([9, 10, 11], l)
         
         
+
+class TestGenerateBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.builder = WordSaladMatrixBuilder()
+        self.builder.count_follower(1, 2)
+        self.builder.count_follower(2, 3)
+        self.builder.count_follower(9, 10)
+        self.builder.count_follower(10, 11)
+        self.M = self.builder.build_matrix()
+
+    def test_generate_batch_matrix_type(self):
+        with self.assertRaises(TypeError):
+            generate_batch(1, 2, [1, 9])
+
+    def test_generate_batch_missing_start_word(self):
+        with self.assertRaises(ValueError):
+            generate_batch(self.M, 2, [1, 77])
+
+    def test_generate_batch_n(self):
+        n = random.randint(2, 15)
+        seqs = generate_batch(self.M, n, [1, 9])
+        self.assertEqual(n, len(seqs))
+        self.assertEqual([], generate_batch(self.M, 0, [1]))
+
+    def test_generate_batch_indices(self):
+        seqs = generate_batch(self.M, 10, [1])
+        expected = [self.M.indexOf(w) for w in [1, 2, 3]]
+        for seq in seqs:
+            self.assertListEqual(expected, list(seq))
+
+    def test_generate_batch_join(self):
+        seqs = generate_batch(self.M, 10, [1, 9], join=list)
+        for seq in seqs:
+            self.assertIn(seq, [[1, 2, 3], [9, 10, 11]])
+
+    def test_generate_batch_stored_start_words(self):
+        self.M.setStartWords([1, 9, 1])
+        self.assertListEqual([1, 9], self.M.startWords())
+        seqs = generate_batch(self.M, 20, join=list)
+        for seq in seqs:
+            self.assertIn(seq, [[1, 2, 3], [9, 10, 11]])
+
+    def test_generate_batch_without_start_words(self):
+        with self.assertRaises(TypeError):
+            generate_batch(self.M, 2)
+
+    def test_generate_batch_stops(self):
+        seqs = generate_batch(self.M, 3, [1], stops=[2, "not there"], join=list)
+        self.assertListEqual([[1, 2]] * 3, seqs)
+
+    def test_generate_batch_max_length(self):
+        builder = WordSaladMatrixBuilder()
+        builder.count_follower("hey", "man")
+        builder.count_follower("man", "hey")
+        mat = builder.build_matrix()
+
+        seqs = generate_batch(mat, 4, ["hey"], max_length=5, join=list)
+        self.assertListEqual([["hey", "man", "hey", "man", "hey"]] * 4, seqs)
+
+    def test_generate_batch_mode(self):
+        builder = WordSaladMatrixBuilder()
+        builder.count_follower("I", "am")
+        builder.count_follower("I", "have")
+        builder.count_follower("I", "have")
+        mat = builder.build_matrix()
+        seqs = generate_batch(mat, 50, ["I"], join=list, mode=SamplingMode(temperature=0))
+        self.assertListEqual([["I", "have"]] * 50, seqs)
+
+    def test_generate_batch_matches_distribution(self):
+        builder = WordSaladMatrixBuilder()
+        builder.count_follower("I", "am")
+        builder.count_follower("I", "have")
+        mat = builder.build_matrix()
+
+        seqs = generate_batch(mat, 1000, ["I"], rng=np.random.default_rng(5), join=list)
+        ams = sum(1 for s in seqs if s == ["I", "am"])
+        self.assertGreater(ams / 1000.0, 0.40)
+        self.assertLess(ams / 1000.0, 0.60)
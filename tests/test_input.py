@@ -1,4 +1,8 @@
-from wordsalad.input import split_germanic, group_words
+import io
+from wordsalad.input import split_germanic, split_germanic_ids, group_words
+from wordsalad.input import tokenisation
+from wordsalad.vocabulary import Vocabulary
+import numpy as np
 import unittest
 
 class TestTokenisation(unittest.TestCase):
@@ -78,4 +82,83 @@ class TestGroupWords(unittest.TestCase):
     
     def test_group_words_size_larger_than_1(self):
         with self.assertRaises(ValueError):
-            list(group_words([1,2,3], size=1))
\ No newline at end of file
+            list(group_words([1,2,3], size=1))
+
+class TestSplitGermanicStreaming(unittest.TestCase):
+
+    text = "Hello my name is Gary Goat. How very nice to meet you! :) What is your name?"
+
+    def test_split_germanic_chunks_match_string(self):
+        expected_starts = []
+        expected = list(split_germanic(self.text, start_words=expected_starts))
+        for size in range(1, 12):
+            chunks = [self.text[i:i + size] for i in range(0, len(self.text), size)]
+            starts = []
+            self.assertListEqual(expected, list(split_germanic(chunks, start_words=starts)))
+            self.assertListEqual(expected_starts, starts)
+
+    def test_split_germanic_file_object(self):
+        expected = list(split_germanic(self.text))
+        self.assertListEqual(expected, list(split_germanic(io.StringIO(self.text))))
+
+    def test_split_germanic_word_longer_than_chunks(self):
+        chunks = ["a", "bb", "ccc", " d", "d."]
+        self.assertListEqual(["abbccc", "dd", "."], list(split_germanic(chunks)))
+
+    def test_split_germanic_word_over_many_chunks(self):
+        chunks = ["ab", "", "cd", "e f", "gh", "i", " "]
+        self.assertListEqual(["abcde", "fghi"], list(split_germanic(chunks)))
+
+    def test_split_germanic_special_characters(self):
+        res = list(split_germanic("a-b]c^d\\e", punctuation="-]^\\"))
+        self.assertListEqual(["a", "-", "b", "]", "c", "^", "d", "\\", "e"], res)
+
+    def test_split_germanic_long_string(self):
+        text = self.text * 10
+        expected = list(split_germanic(io.StringIO(text)))
+        old = tokenisation.CHUNK_SIZE
+        tokenisation.CHUNK_SIZE = 7
+        try:
+            self.assertListEqual(expected, list(split_germanic(text)))
+        finally:
+            tokenisation.CHUNK_SIZE = old
+
+class TestSplitGermanicIds(unittest.TestCase):
+
+    text = "Hello my name is Gary Goat. How very nice to meet you! :) What is your name? Gary"
+
+    def test_matches_split_germanic(self):
+        starts = []
+        words = list(split_germanic(self.text, start_words=starts))
+        vocab = Vocabulary()
+        ids, counts = split_germanic_ids(self.text, vocab)
+        self.assertEqual(np.int32, ids.dtype)
+        self.assertListEqual(words, [vocab.wordAt(i) for i in ids.tolist()])
+        self.assertEqual(len(vocab), len(counts))
+        expected = np.zeros(len(vocab), dtype=np.int64)
+        for w in starts:
+            expected[vocab.indexOf(w)] += 1
+        np.testing.assert_array_equal(expected, counts)
+
+    def test_chunks(self):
+        vocab = Vocabulary()
+        expected, expected_counts = split_germanic_ids(self.text, vocab)
+        for size in range(1, 12):
+            chunks = [self.text[i:i + size] for i in range(0, len(self.text), size)]
+            ids, counts = split_germanic_ids(chunks, vocab)
+            np.testing.assert_array_equal(expected, ids)
+            np.testing.assert_array_equal(expected_counts, counts)
+
+    def test_shared_vocabulary(self):
+        vocab = Vocabulary(["Gary", "x"])
+        ids, counts = split_germanic_ids("Gary is here.", vocab)
+        self.assertEqual(0, ids[0])
+        ids, counts = split_germanic_ids(io.StringIO("New. Gary"), vocab, start_counts=counts)
+        self.assertEqual(2, counts[vocab.indexOf("Gary")])
+        self.assertEqual(1, counts[vocab.indexOf("New")])
+        self.assertEqual(len(vocab), len(counts))
+
+    def test_empty(self):
+        ids, counts = split_germanic_ids("", Vocabulary())
+        self.assertEqual(0, len(ids))
+        self.assertEqual(0, len(counts))
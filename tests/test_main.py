@@ -0,0 +1,91 @@
+from wordsalad import WordSaladCompactMatrix, WordSaladMatrixBuilder, load_matrix, save_matrix
+from wordsalad.__main__ import main
+from wordsalad.parallel import build_parallel
+from contextlib import redirect_stdout
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+TEXT = """It was a dark and stormy night. The rain fell in torrents! Except at
+occasional intervals, when it was checked by a violent gust of wind? It was
+a dark night. The rain was a torrent."""
+
+class TestMain(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.corpus = self._path("corpus.txt")
+        with open(self.corpus, "w", encoding="utf-8") as f:
+            f.write(TEXT)
+        self.model = self._path("corpus.wsalad")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _path(self, name):
+        return os.path.join(self.dir, name)
+
+    def _main(self, *args):
+        out = io.StringIO()
+        with redirect_stdout(out):
+            code = main(["--quiet"] + list(args))
+        self.assertEqual(0, code)
+        return out.getvalue()
+
+    def test_build_matches_build_parallel(self):
+        self._main("build", self.corpus, "-o", self.model)
+        mat = load_matrix(self.model)
+        expected = build_parallel(self.corpus, processes=1)
+        self.assertListEqual(expected.vocabulary.words, mat.vocabulary.words)
+        self.assertEqual(0, (expected.matrix != mat.matrix).nnz)
+        self.assertListEqual(expected.startWords(), mat.startWords())
+
+    def test_build_compact(self):
+        self._main("build", self.corpus, "-o", self.model, "--compact", "8")
+        self.assertIsInstance(load_matrix(self.model), WordSaladCompactMatrix)
+
+    def test_stats(self):
+        self._main("build", self.corpus, "-o", self.model)
+        stats = json.loads(self._main("stats", self.model, "--json"))
+        mat = load_matrix(self.model)
+        self.assertEqual(mat.wordCount(), stats["words"])
+        self.assertEqual(mat.matrix.nnz, stats["followers"])
+        degree = stats["out_degree"]
+        self.assertEqual(stats["words"] - degree["dead_ends"], sum(count for _, count in degree["histogram"]))
+        self.assertIn("out-degree", self._main("stats", self.model))
+
+    def test_generate(self):
+        self._main("build", self.corpus, "-o", self.model)
+        text = self._main("generate", self.model, "7", "--seed", "3", "--chunk", "2")
+        self.assertEqual(7, len(text.splitlines()))
+        self.assertEqual(text, self._main("generate", self.model, "7", "--seed", "3", "--chunk", "2"))
+        output = self._path("salads.txt")
+        self._main("generate", self.model, "7", "--seed", "3", "--chunk", "2", "--processes", "2", "-o", output)
+        with open(output, encoding="utf-8") as f:
+            self.assertEqual(text, f.read())
+
+    def test_generate_top_k(self):
+        self._main("build", self.corpus, "-o", self.model)
+        text = self._main("generate", self.model, "2", "--start", "The", "--top-k", "1", "--max-words", "5")
+        lines = text.splitlines()
+        self.assertEqual(lines[0], lines[1])
+        self.assertTrue(lines[0].startswith("The"))
+
+    def test_sep(self):
+        self._main("build", self.corpus, "-o", self.model)
+        text = self._main("generate", self.model, "3", "--sep", " é\\t")
+        self.assertEqual(2, text.count(" é\t"))
+
+    def test_errors(self):
+        with redirect_stdout(io.StringIO()):
+            self.assertEqual(1, main(["--quiet", "stats", self._path("missing")]))
+        builder = WordSaladMatrixBuilder()
+        builder.count_followers_in_sequence(["a", "b"])
+        save_matrix(builder.build_matrix(), self.model)
+        with redirect_stdout(io.StringIO()):
+            self.assertEqual(1, main(["--quiet", "generate", self.model, "2"]))
+            self.assertEqual(1, main(["--quiet", "generate", self.model, "2", "--start", "nope"]))
+            self.assertEqual(0, main(["--quiet", "generate", self.model, "2", "--start", "a"]))
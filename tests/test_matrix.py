@@ -1,4 +1,7 @@
-from wordsalad import WordSaladMatrixBuilder
+from wordsalad import WordSaladMatrixBuilder, WordSaladMatrix, WordSaladMatrixReference
+from array import array
+import numpy as np
+import random
 import unittest
 
 class TestWordSaladMatrixBuilder(unittest.TestCase):
@@ -29,4 +32,169 @@ class TestWordSaladMatrixBuilder(unittest.TestCase):
     
     def test_count_followers_in_sequence_throws_on_type(self):
         with self.assertRaises(TypeError):
-            self.builder.count_followers_in_sequence(None)
\ No newline at end of file
+            self.builder.count_followers_in_sequence(None)
+
+    def test_count_followers_in_ids(self):
+        ids = array("i", [self.builder.add_word(w) for w in ["a", "b", "a", "c"]])
+        self.builder.count_followers_in_ids(ids)
+        self.builder.count_followers_in_ids(np.array([self.builder.words["c"], self.builder.words["a"]]))
+        mat = self.builder.build_matrix()
+
+        self.assertAlmostEqual(mat.probability("a", "b"), 0.5)
+        self.assertAlmostEqual(mat.probability("a", "c"), 0.5)
+        self.assertEqual(mat.probability("b", "a"), 1)
+        self.assertEqual(mat.probability("c", "a"), 1)
+
+    def test_count_followers_in_ids_unknown_index(self):
+        self.builder.add_word("a")
+        with self.assertRaises(ValueError):
+            self.builder.count_followers_in_ids([0, 1])
+
+    def test_count_followers_in_sequence_lone_word(self):
+        self.builder.count_followers_in_sequence(["alone"])
+        self.builder.count_followers_in_sequence([])
+        self.assertEqual(0, self.builder.c)
+
+    def test_build_matrix_matches_count_follower(self):
+        rnd = random.Random(3)
+        seq = [rnd.randint(0, 20) for i in range(0, 500)]
+        other = WordSaladMatrixBuilder()
+        for w, f in zip(seq, seq[1:]):
+            other.count_follower(w, f)
+        self.builder.count_followers_in_sequence(seq)
+
+        a = self.builder.build_matrix()
+        b = other.build_matrix()
+        self.assertEqual(0, (a.matrix != b.matrix).nnz)
+
+    def test_build_matrix_start_counts(self):
+        self.builder.count_followers_in_sequence(["a", "b", "c"])
+        counts = [0] * 3
+        counts[self.builder.words.index["c"]] = 2
+        mat = self.builder.build_matrix(start_counts=counts)
+        self.assertListEqual(["c"], mat.startWords())
+        self.assertIs(mat.starts, mat.update(["a", "c"]).starts)
+
+    def test_set_start_words_unknown_word(self):
+        self.builder.count_followers_in_sequence(["a", "b"])
+        mat = self.builder.build_matrix()
+        self.assertIsNone(mat.startWords())
+        with self.assertRaises(ValueError):
+            mat.setStartWords(["a", "nope"])
+
+    def test_from_csr(self):
+        self.builder.count_followers_in_sequence(["a", "b", "a", "c", "b"])
+        mat = self.builder.build_matrix()
+        m = mat.matrix
+        csr = WordSaladMatrix.fromCSR(m.data, m.indices, m.indptr, mat.vocabulary, counts=mat.counts)
+        self.assertIsNone(csr._matrix)
+        np.testing.assert_array_equal(mat.sampler().cumulative, csr.sampler().cumulative)
+        self.assertIsNone(csr._matrix)
+        self.assertEqual(0.5, csr.probability("a", "c"))
+        self.assertEqual(0, (mat.matrix != csr.matrix).nnz)
+        with self.assertRaises(ValueError):
+            WordSaladMatrix.fromCSR(m.data, m.indices, m.indptr, mat.vocabulary, counts=[1])
+
+class TestWordSaladMatrixUpdate(unittest.TestCase):
+
+    def _build(self, *sequences):
+        builder = WordSaladMatrixBuilder()
+        for seq in sequences:
+            builder.count_followers_in_sequence(seq)
+        return builder.build_matrix()
+
+    def _assert_same(self, a, b):
+        self.assertEqual(a.wordCount(), b.wordCount())
+        for i in range(0, a.wordCount()):
+            self.assertEqual(a.wordAt(i), b.wordAt(i))
+        self.assertEqual(0, (a.matrix != b.matrix).nnz)
+        np.testing.assert_array_equal(a.counts, b.counts)
+        np.testing.assert_array_equal(a.sampler().cumulative, b.sampler().cumulative)
+
+    def test_update_matches_build(self):
+        rnd = random.Random(11)
+        first = [rnd.randint(0, 30) for i in range(0, 300)]
+        second = [rnd.randint(10, 50) for i in range(0, 100)]
+        mat = self._build(first)
+        mat.sampler()
+        self._assert_same(self._build(first, second), mat.update(second))
+
+    def test_update_without_sampler(self):
+        mat = self._build(["a", "b", "c"])
+        updated = mat.update(["c", "d", "a", "b"], endmarker="end")
+        self._assert_same(self._build(["a", "b", "c"], ["c", "d", "a", "b", "end"]), updated)
+
+    def test_update_leaves_original(self):
+        mat = self._build(["a", "b", "c"])
+        mat.update(["a", "c", "new"])
+        self.assertEqual(3, mat.wordCount())
+        self.assertEqual(1, mat.probability("a", "b"))
+
+    def test_update_lone_word(self):
+        mat = self._build(["a", "b"])
+        self.assertIs(mat, mat.update(["x"]))
+
+    def test_update_needs_counts(self):
+        mat = self._build(["a", "b"])
+        mat = WordSaladMatrix(mat.matrix, mat.vocabulary)
+        with self.assertRaises(ValueError):
+            mat.update(["a", "b"])
+
+    def test_reference_swaps(self):
+        ref = WordSaladMatrixReference(self._build(["a", "b"]))
+        before = ref.get()
+        after = ref.update(["b", "c"])
+        self.assertIs(after, ref.get())
+        self.assertIsNot(before, after)
+        self.assertEqual(2, before.wordCount())
+        self.assertEqual(1, after.probability("b", "c"))
+
+class TestWordSaladMatrixProbabilitiesAfter(unittest.TestCase):
+
+    def setUp(self):
+        rnd = random.Random(5)
+        builder = WordSaladMatrixBuilder()
+        builder.count_followers_in_sequence([rnd.randint(0, 20) for i in range(0, 400)])
+        self.M = builder.build_matrix()
+
+    def test_matches_matrix_power(self):
+        dense = self.M.matrix.toarray()
+        before = self.M.matrix.copy()
+        for k in range(0, 5):
+            expected = np.linalg.matrix_power(dense, k)[self.M.indexOf(3)]
+            actual = self.M.probabilitiesAfter(3, k).toarray().ravel()
+            np.testing.assert_allclose(expected, actual, atol=1e-12)
+        self.assertEqual(0, (before != self.M.matrix).nnz)
+
+    def test_several_words(self):
+        dense = self.M.matrix.toarray()
+        start = np.zeros(self.M.wordCount())
+        start[self.M.indexOf(1)] = 0.25
+        start[self.M.indexOf(2)] = 0.75
+        actual = self.M.probabilitiesAfter({1: 1, 2: 3}, 3).toarray().ravel()
+        np.testing.assert_allclose(start @ np.linalg.matrix_power(dense, 3), actual, atol=1e-12)
+        uniform = self.M.probabilitiesAfter([1, 2], 2).toarray().ravel()
+        start[self.M.indexOf(1)] = start[self.M.indexOf(2)] = 0.5
+        np.testing.assert_allclose(start @ np.linalg.matrix_power(dense, 2), uniform, atol=1e-12)
+
+    def test_top(self):
+        v = self.M.probabilitiesAfter(3, 4, top=5)
+        self.assertLessEqual(v.nnz, 5)
+        self.assertLessEqual(v.sum(), 1.0 + 1e-12)
+        exact = self.M.probabilitiesAfter(3, 1).toarray().ravel()
+        top1 = self.M.probabilitiesAfter(3, 1, top=1)
+        self.assertEqual(exact.max(), top1.data[0])
+
+    def test_unknown_word(self):
+        with self.assertRaises(ValueError):
+            self.M.probabilitiesAfter(100, 2)
+        with self.assertRaises(ValueError):
+            self.M.probabilitiesAfter([1, 100], 2)
+
+    def test_string_is_one_word(self):
+        builder = WordSaladMatrixBuilder()
+        builder.count_followers_in_sequence(["a", "b", "c", "a"])
+        mat = builder.build_matrix()
+        with self.assertRaises(ValueError):
+            mat.probabilitiesAfter("ab", 1)
+        self.assertEqual(1.0, mat.probabilitiesAfter("a", 1)[0, mat.indexOf("b")])
@@ -0,0 +1,78 @@
+from wordsalad import WordSaladMatrixBuilder, draw_follower, generate_sentences, generate_batch
+from wordsalad import metrics
+from wordsalad.metrics import MemorySink, Histogram, prometheus_text
+from wordsalad.utils import join_germanic, join_germanic_many
+import numpy as np
+import unittest
+
+class TestHistogram(unittest.TestCase):
+
+    def test_buckets(self):
+        h = Histogram([1, 2, 4])
+        for v in [0, 1, 2, 3, 5]:
+            h.observe(v)
+        snap = h.snapshot()
+        self.assertEqual([(1, 2), (2, 3), (4, 4), (float("inf"), 5)], snap["buckets"])
+        self.assertEqual(11, snap["sum"])
+        self.assertEqual(5, snap["count"])
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        builder = WordSaladMatrixBuilder()
+        builder.count_followers_in_sequence(["a", "b", ".", "a", "c", "b", "end"])
+        self.sink = MemorySink()
+        self.previous = metrics.set_sink(self.sink)
+        self.M = builder.build_matrix()
+
+    def tearDown(self):
+        metrics.set_sink(self.previous)
+
+    def test_build_matrix(self):
+        snap = self.sink.snapshot()
+        self.assertEqual(6, snap["counters"]["build_matrix.pairs"])
+        for name in ["build_matrix.seconds", "build_matrix.count_seconds", "build_matrix.normalize_seconds"]:
+            self.assertEqual(1, snap["histograms"][name]["count"])
+
+    def test_draw_follower(self):
+        draw_follower(self.M, "a")
+        draw_follower(self.M, "end")
+        counters = self.sink.snapshot()["counters"]
+        self.assertEqual(2, counters["draw_follower.draws"])
+        self.assertEqual(1, counters["draw_follower.dead_ends"])
+
+    def test_generate_sentences(self):
+        sentences = [list(s) for s in generate_sentences(self.M, 20, ["c"], stops=["."])]
+        snap = self.sink.snapshot()
+        counters = snap["counters"]
+        self.assertEqual(20, counters["generate_sentences.sentences"])
+        self.assertEqual(sum(map(len, sentences)), counters["generate_sentences.words"])
+        self.assertEqual(sum(s[-1] == "end" for s in sentences), counters.get("generate_sentences.dead_ends", 0))
+        self.assertEqual(20, snap["histograms"]["generate_sentences.length"]["count"])
+
+    def test_generate_batch(self):
+        sentences = generate_batch(self.M, 20, ["c"], rng=np.random.default_rng(1), stops=["."], join=list)
+        counters = self.sink.snapshot()["counters"]
+        self.assertEqual(20, counters["generate_batch.sentences"])
+        self.assertEqual(sum(map(len, sentences)), counters["generate_batch.words"])
+        self.assertEqual(sum(s[-1] == "end" for s in sentences), counters["generate_batch.dead_ends"])
+
+    def test_join_germanic(self):
+        join_germanic(["a", "b"])
+        join_germanic_many([["a"], ["b"]])
+        snap = self.sink.snapshot()
+        self.assertEqual(1, snap["histograms"]["join_germanic.seconds"]["count"])
+        self.assertEqual(2, snap["counters"]["join_germanic_many.sequences"])
+
+    def test_disabled(self):
+        metrics.set_sink(None)
+        self.sink.reset()
+        draw_follower(self.M, "a")
+        self.assertEqual({"counters": {}, "histograms": {}}, self.sink.snapshot())
+
+    def test_prometheus(self):
+        draw_follower(self.M, "a")
+        text = self.sink.prometheus()
+        self.assertIn("wordsalad_draw_follower_draws 1\n", text)
+        self.assertIn('wordsalad_build_matrix_seconds_bucket{le="+Inf"} 1\n', text)
+        self.assertEqual("\n", prometheus_text({"counters": {}, "histograms": {}}))
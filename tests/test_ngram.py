@@ -0,0 +1,116 @@
+from wordsalad import WordSaladNGramMatrixBuilder, SamplingMode
+from wordsalad.generators import draw_follower, chain, generate_sentences
+from wordsalad.ngram import _context_keys, _context_key
+from itertools import islice
+import numpy as np
+import unittest
+
+class TestWordSaladNGramMatrixBuilder(unittest.TestCase):
+
+    def setUp(self):
+        self.builder = WordSaladNGramMatrixBuilder(order=2)
+        self.builder.count_followers_in_sequence("the cat sat . the cat ran . the dog sat .".split())
+        self.M = self.builder.build_matrix()
+
+    def test_order_must_be_positive(self):
+        with self.assertRaises(ValueError):
+            WordSaladNGramMatrixBuilder(order=0)
+
+    def test_contexts_are_distinct(self):
+        # the cat, cat sat, sat ., . the, cat ran, ran ., the dog, dog sat
+        self.assertEqual(8, self.M.contextCount())
+        self.assertEqual(6, self.M.wordCount())
+
+    def test_probabilities(self):
+        self.assertAlmostEqual(0.5, self.M.probability(("the", "cat"), "sat"))
+        self.assertAlmostEqual(0.5, self.M.probability(("the", "cat"), "ran"))
+        self.assertEqual(1, self.M.probability(("cat", "sat"), "."))
+        self.assertAlmostEqual(1.0, self.M.probabilities((".", "the")).sum())
+
+    def test_contains(self):
+        self.assertIn(("the", "cat"), self.M)
+        self.assertNotIn(("cat", "the"), self.M)
+        self.assertNotIn(("the",), self.M)
+        self.assertNotIn(("the", "unicorn"), self.M)
+        self.assertNotIn(12, self.M)
+
+    def test_last_context_has_no_followers(self):
+        builder = WordSaladNGramMatrixBuilder(order=2)
+        builder.count_followers_in_sequence(["a", "b", "c"])
+        mat = builder.build_matrix()
+        self.assertEqual(0, mat.probabilities(("b", "c")).nnz)
+
+    def test_short_sequences_are_ignored(self):
+        builder = WordSaladNGramMatrixBuilder(order=3)
+        builder.count_followers_in_sequence(["a", "b"])
+        self.assertEqual(0, builder.build_matrix().contextCount())
+
+    def test_start_contexts(self):
+        starts = self.M.startContexts(["the", "nope"])
+        self.assertEqual(sorted([("the", "cat"), ("the", "dog")]), sorted(starts))
+
+class TestNGramGenerators(unittest.TestCase):
+
+    def test_draw_follower(self):
+        builder = WordSaladNGramMatrixBuilder(order=2)
+        builder.count_followers_in_sequence(["a", "b", "c"])
+        mat = builder.build_matrix()
+        self.assertEqual("c", draw_follower(mat, ("a", "b")))
+        self.assertIsNone(draw_follower(mat, ("b", "c")))
+
+    def test_chain_uses_whole_context(self):
+        # An order 1 chain could go a -> x -> d, but after "a x" only "c" was seen.
+        builder = WordSaladNGramMatrixBuilder(order=2)
+        builder.count_followers_in_sequence(["a", "x", "c"])
+        builder.count_followers_in_sequence(["b", "x", "d"])
+        mat = builder.build_matrix()
+        for i in range(0, 20):
+            self.assertListEqual(["a", "x", "c"], list(chain(mat, ("a", "x"))))
+
+    def test_chain_with_mode(self):
+        builder = WordSaladNGramMatrixBuilder(order=1)
+        builder.count_followers_in_sequence(["a", "b", "a", "b", "a", "c", "d"])
+        mat = builder.build_matrix()
+        seq = list(islice(chain(mat, ("a",), mode=SamplingMode(top_k=1)), 6))
+        self.assertListEqual(["a", "b", "a", "b", "a", "b"], seq)
+
+    def test_chain_loops(self):
+        builder = WordSaladNGramMatrixBuilder(order=3)
+        builder.count_followers_in_sequence(["a", "b", "c", "a", "b", "c", "a"])
+        mat = builder.build_matrix()
+        self.assertListEqual(["a", "b", "c"] * 4, list(islice(chain(mat, ("a", "b", "c")), 12)))
+
+    def test_chain_missing_context(self):
+        builder = WordSaladNGramMatrixBuilder(order=2)
+        builder.count_followers_in_sequence(["a", "b", "c"])
+        with self.assertRaises(ValueError):
+            list(chain(builder.build_matrix(), ("c", "a")))
+
+    def test_generate_sentences(self):
+        builder = WordSaladNGramMatrixBuilder(order=2)
+        builder.count_followers_in_sequence("the cat sat . the dog ran .".split())
+        mat = builder.build_matrix()
+        sentences = [list(s) for s in generate_sentences(mat, 10, mat.startContexts(["the"]), stops=["."])]
+        for s in sentences:
+            self.assertIn(s, ["the cat sat .".split(), "the dog ran .".split()])
+
+class TestContextKeys(unittest.TestCase):
+
+    def test_keys_match(self):
+        contexts = np.array([[0, 1, 2], [2, 1, 0], [5, 5, 5]], dtype=np.int32)
+        for n in [6, 2 ** 40]:
+            keys = _context_keys(contexts, n)
+            self.assertListEqual([int(k) for k in keys], [_context_key(c, n) for c in contexts.tolist()])
+
+    def test_hashed_lookup(self):
+        # A vocabulary too large to pack four indices in 64 bits.
+        builder = WordSaladNGramMatrixBuilder(order=4)
+        for i in range(0, 2 ** 17):
+            builder.add_word(i)
+        builder.count_followers_in_sequence([0, 1, 2, 3, 4, 1, 2, 3, 5])
+        mat = builder.build_matrix()
+        self.assertIn((1, 2, 3, 4), mat)
+        self.assertIn((4, 1, 2, 3), mat)
+        self.assertNotIn((1, 2, 3, 6), mat)
+        self.assertEqual(1, mat.probability((4, 1, 2, 3), 5))
+        self.assertListEqual([0, 1, 2, 3, 4, 1, 2, 3, 5], list(chain(mat, (0, 1, 2, 3))))
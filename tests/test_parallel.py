@@ -0,0 +1,119 @@
+from wordsalad import WordSaladMatrixBuilder
+from wordsalad.input import split_germanic
+from wordsalad.parallel import build_parallel, split_points, generate_parallel
+import io
+import numpy as np
+import os
+import shutil
+import tempfile
+import unittest
+
+TEXT = """It was a dark and stormy night. The rain fell in torrents! Except at
+occasional intervals, when it was checked by a violent gust of wind? Which
+swept up the streets (for it is in London that our scene lies), rattling
+along the housetops. Ünïcödé is fine too... And so on. Stop."""
+
+def _serial(paths):
+    starts = []
+    builder = WordSaladMatrixBuilder()
+    for p in paths:
+        with open(p, encoding="utf-8") as f:
+            builder.count_followers_in_sequence(split_germanic(f, start_words=starts))
+    mat = builder.build_matrix()
+    # A lone word is not in the matrix.
+    mat.setStartWords([w for w in starts if w in mat])
+    return mat
+
+class TestBuildParallel(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _write(self, name, text):
+        path = os.path.join(self.dir, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        return path
+
+    def _assert_same(self, a, b):
+        self.assertEqual(a.wordCount(), b.wordCount())
+        for i in range(0, a.wordCount()):
+            self.assertEqual(a.wordAt(i), b.wordAt(i))
+        self.assertEqual(0, (a.matrix != b.matrix).nnz)
+        np.testing.assert_array_equal(a.counts, b.counts)
+        np.testing.assert_array_equal(a.starts.ids, b.starts.ids)
+        np.testing.assert_array_equal(a.starts.cumulative, b.starts.cumulative)
+
+    def test_split_points_are_sentence_boundaries(self):
+        path = self._write("a.txt", TEXT * 3)
+        data = open(path, "rb").read()
+        points = split_points(path, 8)
+        self.assertGreater(len(points), 1)
+        self.assertEqual(points, sorted(set(points)))
+        for p in points:
+            self.assertIn(data[p - 1:p], [b" ", b"\n"])
+            self.assertIn(data[p - 2:p - 1], [b".", b"!", b"?"])
+
+    def test_split_points_without_boundaries(self):
+        path = self._write("a.txt", "no sentence ends here at all")
+        self.assertEqual([], split_points(path, 4))
+
+    def test_matches_serial_build(self):
+        path = self._write("a.txt", TEXT * 5)
+        expected = _serial([path])
+        for shards in [1, 2, 3, 7, 40]:
+            self._assert_same(expected, build_parallel(path, processes=2, shards=shards))
+
+    def test_files_are_separate_sequences(self):
+        paths = [self._write("a.txt", TEXT), self._write("b.txt", "Lone"), self._write("c.txt", ""), self._write("d.txt", TEXT[::-1])]
+        self._assert_same(_serial(paths), build_parallel(paths, processes=2, shards=6))
+
+class TestGenerateParallel(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        builder = WordSaladMatrixBuilder()
+        self.starts = []
+        builder.count_followers_in_sequence(split_germanic(TEXT * 3, start_words=self.starts))
+        self.M = builder.build_matrix()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _generate(self, **kwargs):
+        out = io.StringIO()
+        self.assertEqual(50, generate_parallel(self.M, 50, self.starts, out, stops=list(".?!"), **kwargs))
+        return out.getvalue().split("\n")
+
+    def test_ordered_is_reproducible(self):
+        a = self._generate(processes=1, chunk=7, seed=3)
+        b = self._generate(processes=2, chunk=7, seed=3)
+        self.assertEqual(50, len(a))
+        self.assertEqual(a, b)
+        self.assertNotEqual(a, self._generate(processes=2, chunk=7, seed=4))
+
+    def test_unordered(self):
+        a = self._generate(processes=2, chunk=7, seed=3)
+        b = self._generate(processes=2, chunk=7, seed=3, ordered=False)
+        self.assertEqual(sorted(a), sorted(b))
+
+    def test_salads_end_with_stops(self):
+        for salad in self._generate(processes=2, chunk=10, max_length=1000):
+            self.assertIn(salad[-1], ".?!")
+
+    def test_stored_start_words(self):
+        self.M.setStartWords(self.starts)
+        out = io.StringIO()
+        self.assertEqual(10, generate_parallel(self.M, 10, None, out, processes=2, chunk=3, seed=1, stops=["."]))
+        self.assertEqual(10, len(out.getvalue().split("\n")))
+
+    def test_from_file(self):
+        path = os.path.join(self.dir, "model.bin")
+        out = os.path.join(self.dir, "out.txt")
+        self.M.save(path)
+        generate_parallel(path, 20, self.starts, out, processes=2, chunk=3, seed=1, stops=["."])
+        with open(out, encoding="utf-8") as f:
+            self.assertEqual(20, len(f.read().split("\n")))
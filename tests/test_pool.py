@@ -0,0 +1,83 @@
+from wordsalad import WordSaladMatrixBuilder, generate_batch
+from wordsalad.pool import SaladPool
+from wordsalad.utils import join_germanic
+import itertools
+import threading
+import unittest
+
+class TestSaladPool(unittest.TestCase):
+
+    def setUp(self):
+        self.numbers = itertools.count()
+        self.calls = []
+
+    def _generate(self, n):
+        self.calls.append(n)
+        return [str(next(self.numbers)) for i in range(0, n)]
+
+    def test_takes_from_pool_in_order(self):
+        pool = SaladPool(self._generate, 10, batch=5)
+        pool.start()
+        self.assertTrue(pool.wait(timeout=5))
+        pool.stop()
+        self.assertEqual(10, len(pool))
+        self.assertListEqual(["0", "1", "2"], pool.take(3))
+        stats = pool.stats()
+        self.assertEqual((10, 3, 0), (stats["refilled"], stats["drained"], stats["on_demand"]))
+
+    def test_generates_what_the_pool_lacks(self):
+        pool = SaladPool(self._generate, 4, batch=4)
+        self.assertListEqual(["0", "1"], pool.take(2))
+        pool.start()
+        pool.wait(timeout=5)
+        pool.stop()
+        self.assertEqual(6, len(pool.take(6)))
+        self.assertEqual(2 + 2, pool.stats()["on_demand"])
+        self.assertEqual(0, len(pool))
+
+    def test_refills_after_take(self):
+        pool = SaladPool(self._generate, 8, batch=4)
+        pool.start()
+        try:
+            pool.wait(timeout=5)
+            pool.take(5)
+            self.assertTrue(pool.wait(timeout=5))
+        finally:
+            pool.stop()
+        self.assertEqual(8, len(pool))
+        self.assertTrue(all(n >= 4 for n in self.calls))
+
+    def test_errors_are_retried(self):
+        failed = threading.Event()
+        def generate(n):
+            if not failed.is_set():
+                failed.set()
+                raise RuntimeError("once")
+            return self._generate(n)
+        pool = SaladPool(generate, 2, retry=0.01)
+        pool.start()
+        try:
+            self.assertTrue(pool.wait(timeout=5))
+        finally:
+            pool.stop()
+        self.assertEqual(1, pool.stats()["errors"])
+
+    def test_depth(self):
+        with self.assertRaises(ValueError):
+            SaladPool(self._generate, 0)
+        self.assertEqual(3, SaladPool(self._generate, 3, batch=100).batch)
+
+    def test_stop_without_start(self):
+        pool = SaladPool(self._generate, 3)
+        pool.stop()
+        self.assertFalse(pool.running())
+
+    def test_salads(self):
+        builder = WordSaladMatrixBuilder()
+        builder.count_followers_in_sequence(["the", "cat", "sat", "."])
+        mat = builder.build_matrix()
+        pool = SaladPool(lambda n: [join_germanic(s) for s in generate_batch(mat, n, ["the"], join=list)], 3)
+        pool.start()
+        pool.wait(timeout=5)
+        pool.stop()
+        self.assertListEqual(["the cat sat."] * 4, pool.take(4))
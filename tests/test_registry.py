@@ -0,0 +1,90 @@
+from wordsalad import WordSaladMatrixBuilder
+from wordsalad.registry import ModelRegistry, model_nbytes
+import threading
+import time
+import unittest
+
+class TestModelRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.loads = []
+
+    def _loader(self, name):
+        self.loads.append(name)
+        if name == "missing":
+            raise KeyError(name)
+        return name.upper()
+
+    def test_loads_once(self):
+        reg = ModelRegistry(self._loader, sizeof=len)
+        self.assertEqual("A", reg.get("a"))
+        self.assertEqual("A", reg.get("a"))
+        self.assertEqual(["a"], self.loads)
+        self.assertIn("a", reg)
+        stats = reg.stats()
+        self.assertEqual((1, 1, 0, 1), (stats["hits"], stats["misses"], stats["evictions"], stats["bytes"]))
+
+    def test_evicts_least_recently_used(self):
+        reg = ModelRegistry(self._loader, max_bytes=5, sizeof=len)
+        reg.get("aa")
+        reg.get("bb")
+        reg.get("aa")
+        reg.get("cc")
+        self.assertEqual(["aa", "cc"], reg.names())
+        self.assertEqual(1, reg.stats()["evictions"])
+
+    def test_max_models(self):
+        reg = ModelRegistry(self._loader, max_models=2, sizeof=len)
+        for name in ["a", "b", "c", "a"]:
+            reg.get(name)
+        self.assertEqual(["c", "a"], reg.names())
+        self.assertEqual(["a", "b", "c", "a"], self.loads)
+
+    def test_keeps_newest_when_too_large(self):
+        reg = ModelRegistry(self._loader, max_bytes=1, sizeof=len)
+        reg.get("a")
+        reg.get("large")
+        self.assertEqual(["large"], reg.names())
+
+    def test_failed_load_is_retried(self):
+        reg = ModelRegistry(self._loader, sizeof=len)
+        for i in range(0, 2):
+            with self.assertRaises(KeyError):
+                reg.get("missing")
+        self.assertEqual(["missing", "missing"], self.loads)
+        self.assertEqual(2, reg.stats()["failures"])
+        self.assertEqual(0, len(reg))
+
+    def test_concurrent_loads_are_shared(self):
+        started = threading.Event()
+        def slow(name):
+            started.set()
+            time.sleep(0.1)
+            return self._loader(name)
+        reg = ModelRegistry(slow, sizeof=len)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(reg.get("a"))) for i in range(0, 8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(["A"] * 8, results)
+        self.assertEqual(["a"], self.loads)
+
+    def test_evict_and_put(self):
+        reg = ModelRegistry(self._loader, sizeof=len)
+        reg.put("a", "xyz")
+        self.assertEqual("xyz", reg.get("a"))
+        self.assertTrue(reg.evict("a"))
+        self.assertFalse(reg.evict("a"))
+        self.assertEqual("A", reg.get("a"))
+
+    def test_model_nbytes(self):
+        builder = WordSaladMatrixBuilder()
+        builder.count_followers_in_sequence(["a", "b", "c", "a"])
+        mat = builder.build_matrix()
+        size = model_nbytes(mat)
+        self.assertGreater(size, mat.matrix.data.nbytes)
+        mat.sampler()
+        self.assertGreater(model_nbytes(mat), size)
+        self.assertGreater(model_nbytes((mat, ["a"])), model_nbytes(mat))
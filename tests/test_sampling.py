@@ -0,0 +1,292 @@
+from wordsalad import WordSaladMatrixBuilder
+from wordsalad.sampling import CumulativeSampler, AliasSampler, StartSampler, ModeSampler, SamplingMode, QuantizedSampler, MODE_CACHE_SIZE
+import numpy as np
+import unittest
+import random
+
+def _reference_draw(mat, i, p):
+    # The row walk draw_follower originally did.
+    probs = mat.matrix.getrow(i).tocoo()
+    for j, p1 in zip(probs.col, probs.data):
+        if p1 != 0.0:
+            p -= p1
+            if p <= 0.0:
+                return j
+    return -1
+
+class TestCumulativeSampler(unittest.TestCase):
+
+    def setUp(self):
+        rnd = random.Random(1234)
+        builder = WordSaladMatrixBuilder()
+        builder.count_followers_in_sequence([rnd.randint(0, 30) for i in range(0, 2000)])
+        builder.add_word("lonely")
+        self.M = builder.build_matrix()
+
+    def test_matches_row_walk(self):
+        sampler = self.M.sampler()
+        rnd = random.Random(99)
+        for k in range(0, 2000):
+            i = rnd.randrange(0, self.M.wordCount())
+            p = rnd.uniform(0.0, 1.0)
+            self.assertEqual(_reference_draw(self.M, i, p), sampler.draw(i, p))
+
+    def test_row_without_followers(self):
+        sampler = self.M.sampler()
+        self.assertEqual(-1, sampler.draw(self.M.indexOf("lonely"), 0.5))
+
+    def test_rows_sum_to_one(self):
+        sampler = self.M.sampler()
+        for i in range(0, self.M.wordCount() - 1):
+            end = sampler.indptr[i + 1]
+            self.assertAlmostEqual(1.0, sampler.cumulative[end - 1], places=5)
+
+    def test_sampler_is_cached(self):
+        self.assertIs(self.M.sampler(), self.M.sampler())
+
+    def test_from_matrix_accepts_empty(self):
+        builder = WordSaladMatrixBuilder()
+        builder.add_word("a")
+        sampler = CumulativeSampler.from_matrix(builder.build_matrix().matrix)
+        self.assertEqual(-1, sampler.draw(0, 0.3))
+
+    def test_draw_many_matches_draw(self):
+        sampler = self.M.sampler()
+        rnd = random.Random(7)
+        rows = [rnd.randrange(0, self.M.wordCount()) for k in range(0, 500)]
+        ps = [rnd.uniform(0.0, 1.0) for k in range(0, 500)]
+        expected = [sampler.draw(i, p) for i, p in zip(rows, ps)]
+        self.assertListEqual(expected, list(sampler.draw_many(rows, ps)))
+
+
+def _grid_distribution(sampler, i, low, high, n=200000):
+    # The distribution of draws for p spread evenly over [low, high).
+    ps = low + (np.arange(0, n) + 0.5) * (high - low) / n
+    counts = {}
+    for p in ps.tolist():
+        f = sampler.draw(i, p)
+        counts[f] = counts.get(f, 0) + 1
+    return {f: c / n for f, c in counts.items()}
+
+class TestAliasSampler(unittest.TestCase):
+
+    def setUp(self):
+        rnd = random.Random(4321)
+        builder = WordSaladMatrixBuilder()
+        # Word 0 follows every other word, so it gets a lot of followers.
+        seq = []
+        for i in range(0, 3000):
+            seq += [0, rnd.randint(1, 400)]
+        builder.count_followers_in_sequence(seq)
+        builder.add_word("lonely")
+        self.M = builder.build_matrix()
+        self.cumulative = self.M.sampler()
+        self.alias = AliasSampler.from_sampler(self.cumulative, threshold=16)
+
+    def _exact(self, sampler, i, low, high):
+        # The probability of every outcome, read off the table of row i.
+        prob, alias, outcome, scale = sampler._table(i)
+        dist = {}
+        for k in range(0, len(prob)):
+            own = outcome[k]
+            dist[own] = dist.get(own, 0.0) + prob[k] / len(prob)
+            dist[alias[k]] = dist.get(alias[k], 0.0) + (1.0 - prob[k]) / len(prob)
+        return dist
+
+    def test_table_matches_cumulative(self):
+        i = self.M.indexOf(0)
+        lo = self.cumulative.indptr[i]
+        hi = self.cumulative.indptr[i + 1]
+        self.assertGreater(hi - lo, 16)
+        for low in [0.0, 0.01]:
+            sampler = AliasSampler.from_sampler(self.cumulative, threshold=16, low=low)
+            dist = self._exact(sampler, i, low, 1.0)
+            cum = np.asarray(self.cumulative.cumulative[lo:hi])
+            prev = np.concatenate(([0.0], cum[:-1]))
+            expected = np.clip(np.minimum(cum, 1.0) - np.maximum(prev, low), 0.0, None) / (1.0 - low)
+            for j in range(lo, hi):
+                self.assertAlmostEqual(expected[j - lo], dist.get(j, 0.0), places=12)
+            self.assertAlmostEqual(max(0.0, 1.0 - max(cum[-1], low)) / (1.0 - low), dist.get(-1, 0.0), places=12)
+
+    def test_same_distribution_as_cumulative(self):
+        i = self.M.indexOf(0)
+        expected = _grid_distribution(self.cumulative, i, 0.0, 1.0)
+        actual = _grid_distribution(self.alias, i, 0.0, 1.0)
+        for f in set(expected) | set(actual):
+            self.assertAlmostEqual(expected.get(f, 0.0), actual.get(f, 0.0), delta=0.002)
+
+    def test_light_rows_use_cumulative(self):
+        rnd = random.Random(5)
+        for k in range(0, 500):
+            i = rnd.randrange(1, self.M.wordCount())
+            p = rnd.uniform(0.0, 1.0)
+            self.assertEqual(self.cumulative.draw(i, p), self.alias.draw(i, p))
+        self.assertEqual(0, self.alias.tables())
+        self.assertEqual(-1, self.alias.draw(self.M.indexOf("lonely"), 0.5))
+
+    def test_tables_are_lazy(self):
+        self.alias.draw(self.M.indexOf(0), 0.5)
+        self.alias.draw(self.M.indexOf(0), 0.7)
+        self.assertEqual(1, self.alias.tables())
+
+    def test_edges(self):
+        i = self.M.indexOf(0)
+        for p in [0.0, 0.01, 1.0, 1.5]:
+            self.assertIn(self.alias.draw(i, p), set(self.cumulative.indices.tolist()))
+
+    def test_use_alias_sampling(self):
+        sampler = self.M.useAliasSampling(threshold=16)
+        self.assertIsInstance(sampler, AliasSampler)
+        self.assertIs(sampler, self.M.sampler())
+        updated = self.M.update([0, 1, 0, 2])
+        self.assertIsInstance(updated.sampler(), AliasSampler)
+        self.assertEqual(16, updated.sampler().threshold)
+
+class TestStartSampler(unittest.TestCase):
+
+    def setUp(self):
+        self.starts = StartSampler.from_counts([0, 3, 0, 1, 0])
+
+    def test_from_counts(self):
+        self.assertEqual(2, len(self.starts))
+        self.assertEqual(4, self.starts.total)
+        np.testing.assert_array_equal([1, 3], self.starts.ids)
+        np.testing.assert_array_equal([3, 4], self.starts.cumulative)
+
+    def test_draw(self):
+        self.assertEqual(1, self.starts.draw(0.0))
+        self.assertEqual(1, self.starts.draw(0.74))
+        self.assertEqual(3, self.starts.draw(0.75))
+        self.assertEqual(3, self.starts.draw(1.0))
+
+    def test_draw_many_matches_draw(self):
+        ps = np.random.default_rng(2).random(200)
+        expected = [self.starts.draw(p) for p in ps.tolist()]
+        np.testing.assert_array_equal(expected, self.starts.draw_many(ps))
+
+    def test_empty(self):
+        starts = StartSampler.from_counts([0, 0])
+        self.assertEqual(0, len(starts))
+        with self.assertRaises(ValueError):
+            starts.draw(0.5)
+        with self.assertRaises(ValueError):
+            starts.draw_many([0.5])
+
+class TestModeSampler(unittest.TestCase):
+
+    def setUp(self):
+        builder = WordSaladMatrixBuilder()
+        for f, n in [("a", 5), ("b", 3), ("c", 2)]:
+            for i in range(0, n):
+                builder.count_follower("x", f)
+        builder.count_follower("b", "a")
+        builder.add_word("lonely")
+        self.M = builder.build_matrix()
+        self.x = self.M.indexOf("x")
+
+    def _probabilities(self, mode):
+        s = self.M.sampler(mode)
+        lo, hi = s.indptr[self.x], s.indptr[self.x + 1]
+        cum = s.cumulative[lo:hi]
+        probs = np.diff(np.concatenate(([0.0], cum)))
+        return {self.M.wordAt(j): p for j, p in zip(s.indices[lo:hi].tolist(), probs.tolist())}
+
+    def _assert_probabilities(self, expected, mode):
+        actual = self._probabilities(mode)
+        self.assertEqual(sorted(expected), sorted(actual))
+        for w, p in expected.items():
+            self.assertAlmostEqual(p, actual[w])
+
+    def test_plain_mode_is_the_matrix_sampler(self):
+        self.assertIs(self.M.sampler(), self.M.sampler(SamplingMode()))
+        self.assertIs(self.M.sampler(), self.M.sampler(SamplingMode(top_p=1.0)))
+
+    def test_modes_are_kept(self):
+        mode = SamplingMode(top_k=2)
+        self.assertIsInstance(self.M.sampler(mode), ModeSampler)
+        self.assertIs(self.M.sampler(mode), self.M.sampler(SamplingMode(top_k=2)))
+
+    def test_modes_are_bounded(self):
+        first = self.M.sampler(SamplingMode(temperature=0.5))
+        for i in range(0, MODE_CACHE_SIZE):
+            self.M.sampler(SamplingMode(temperature=0.6 + i / 100.0))
+        self.assertEqual(MODE_CACHE_SIZE, len(self.M._modes))
+        self.assertIsNot(first, self.M.sampler(SamplingMode(temperature=0.5)))
+
+    def test_temperature(self):
+        self._assert_probabilities({"a": 0.5, "b": 0.3, "c": 0.2}, SamplingMode(top_k=3))
+        self._assert_probabilities({"a": 25 / 38.0, "b": 9 / 38.0, "c": 4 / 38.0}, SamplingMode(temperature=0.5))
+        self._assert_probabilities({"a": 1.0}, SamplingMode(temperature=0.0))
+
+    def test_top_k(self):
+        self._assert_probabilities({"a": 0.625, "b": 0.375}, SamplingMode(top_k=2))
+
+    def test_top_p(self):
+        self._assert_probabilities({"a": 1.0}, SamplingMode(top_p=0.5))
+        self._assert_probabilities({"a": 0.625, "b": 0.375}, SamplingMode(top_p=0.6))
+        self._assert_probabilities({"a": 0.5, "b": 0.3, "c": 0.2}, SamplingMode(top_p=0.95))
+
+    def test_top_p_after_top_k(self):
+        # a has 0.625 of what top_k leaves, enough for top_p.
+        self._assert_probabilities({"a": 1.0}, SamplingMode(top_k=2, top_p=0.6))
+        self._assert_probabilities({"a": 0.625, "b": 0.375}, SamplingMode(top_k=2, top_p=0.7))
+
+    def test_locate_gives_matrix_positions(self):
+        s = self.M.sampler(SamplingMode(top_k=1))
+        j = s.locate(self.x, 0.99)
+        self.assertEqual(self.M.indexOf("a"), self.M.matrix.indices[j])
+        self.assertEqual(-1, s.locate(self.M.indexOf("lonely"), 0.5))
+
+    def test_draw_many_matches_draw(self):
+        s = self.M.sampler(SamplingMode(temperature=2.0, top_p=0.7))
+        rows = np.array([self.x, self.M.indexOf("b"), self.M.indexOf("lonely")] * 50)
+        ps = np.random.default_rng(3).random(len(rows))
+        expected = [s.draw(i, p) for i, p in zip(rows.tolist(), ps.tolist())]
+        np.testing.assert_array_equal(expected, s.draw_many(rows, ps))
+
+    def test_invalid_modes(self):
+        for kwargs in [{"temperature": -1}, {"top_k": 0}, {"top_p": 0.0}, {"top_p": 1.5}]:
+            with self.assertRaises(ValueError):
+                SamplingMode(**kwargs)
+
+class TestQuantizedSampler(unittest.TestCase):
+
+    def setUp(self):
+        self.indptr = [0, 3, 3, 5]
+        self.indices = [1, 2, 3, 0, 4]
+        self.data = [0.5, 0.4999, 0.0001, 0.3, 0.7]
+
+    def test_rows_sum_to_scale(self):
+        for bits in [8, 16]:
+            s = QuantizedSampler.from_probabilities(self.indptr, self.indices, self.data, bits=bits)
+            ends = s.indptr[1:][np.diff(s.indptr) > 0] - 1
+            self.assertTrue(np.all(s.cumulative[ends] == s.scale))
+            probs = s.probabilities()
+            self.assertAlmostEqual(1.0, probs[s.indptr[2]:s.indptr[3]].sum())
+
+    def test_drops_what_rounds_away(self):
+        s = QuantizedSampler.from_probabilities(self.indptr, self.indices, self.data, bits=8)
+        self.assertListEqual([1, 2, 0, 4], s.indices.tolist())
+        s = QuantizedSampler.from_probabilities(self.indptr, self.indices, self.data, bits=16)
+        self.assertEqual(5, len(s.indices))
+
+    def test_draw(self):
+        s = QuantizedSampler.from_probabilities(self.indptr, self.indices, self.data, bits=8)
+        self.assertEqual(1, s.draw(0, 0.0))
+        self.assertEqual(2, s.draw(0, 0.9999))
+        self.assertEqual(-1, s.draw(1, 0.5))
+        # Every follower is drawn for exactly its steps of a fine grid.
+        grid = (np.arange(0, 255 * 4) + 0.5) / (255 * 4)
+        drawn = [s.draw(2, p) for p in grid.tolist()]
+        self.assertEqual(int(s.cumulative[s.indptr[2]]) * 4, drawn.count(0))
+
+    def test_draw_many_matches_draw(self):
+        s = QuantizedSampler.from_probabilities(self.indptr, self.indices, self.data)
+        rows = np.array([0, 1, 2] * 40)
+        ps = np.random.default_rng(1).random(len(rows))
+        expected = [s.draw(i, p) for i, p in zip(rows.tolist(), ps.tolist())]
+        np.testing.assert_array_equal(expected, s.draw_many(rows, ps))
+
+    def test_bits(self):
+        with self.assertRaises(ValueError):
+            QuantizedSampler.from_probabilities(self.indptr, self.indices, self.data, bits=12)
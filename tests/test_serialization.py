@@ -0,0 +1,135 @@
+from wordsalad import WordSaladMatrixBuilder, WordSaladMatrix, save_matrix, load_matrix
+from wordsalad.input import split_germanic, group_words
+import numpy as np
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+TEXT = "The cat has a tail. The dog has a bone! Does the cat have a bone? Ünïcödé wörds too."
+
+class TestSerialization(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "model.bin")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _build(self, words):
+        builder = WordSaladMatrixBuilder()
+        builder.count_followers_in_sequence(words)
+        return builder.build_matrix()
+
+    def _assert_same(self, a, b):
+        self.assertEqual(a.wordCount(), b.wordCount())
+        for i in range(0, a.wordCount()):
+            self.assertEqual(a.wordAt(i), b.wordAt(i))
+        self.assertEqual(0, (a.matrix != b.matrix).nnz)
+        np.testing.assert_array_equal(a.sampler().cumulative, b.sampler().cumulative)
+        np.testing.assert_array_equal(a.counts, b.counts)
+
+    def test_round_trip_str(self):
+        mat = self._build(split_germanic(TEXT))
+        mat.save(self.path)
+        for mmap in [True, False]:
+            self._assert_same(mat, WordSaladMatrix.load(self.path, mmap=mmap))
+
+    def test_round_trip_tuple_of_str(self):
+        mat = self._build(group_words(split_germanic(TEXT), size=2))
+        save_matrix(mat, self.path)
+        loaded = load_matrix(self.path)
+        self._assert_same(mat, loaded)
+        self.assertIs(type(loaded.wordAt(0)), tuple)
+
+    def test_round_trip_other_hashables(self):
+        mat = self._build([1, 2, (3, "x"), frozenset([4]), 1, None, 2])
+        save_matrix(mat, self.path)
+        self._assert_same(mat, load_matrix(self.path))
+
+    def test_round_trip_empty(self):
+        builder = WordSaladMatrixBuilder()
+        save_matrix(builder.build_matrix(), self.path)
+        self.assertEqual(0, load_matrix(self.path).wordCount())
+
+    def test_loaded_matrix_draws_the_same(self):
+        mat = self._build(split_germanic(TEXT))
+        save_matrix(mat, self.path)
+        loaded = load_matrix(self.path)
+        for i in range(0, mat.wordCount()):
+            for p in [0.01, 0.3, 0.5, 0.99]:
+                self.assertEqual(mat.sampler().draw(i, p), loaded.sampler().draw(i, p))
+
+    def test_loaded_matrix_can_be_updated(self):
+        mat = self._build(split_germanic(TEXT))
+        save_matrix(mat, self.path)
+        updated = load_matrix(self.path).update(["The", "cat", "purrs"])
+        self._assert_same(mat.update(["The", "cat", "purrs"]), updated)
+
+    def test_serving_does_not_import_scipy(self):
+        starts = []
+        mat = self._build(split_germanic(TEXT, start_words=starts))
+        mat.setStartWords(starts)
+        save_matrix(mat, self.path)
+        code = ("import sys, wordsalad\n"
+                "mat = wordsalad.load_matrix(sys.argv[1], mmap=True)\n"
+                "wordsalad.generate_batch(mat, 5, max_length=20)\n"
+                "print('scipy' in sys.modules)\n")
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        out = subprocess.run([sys.executable, "-c", code, self.path], cwd=root,
+                             capture_output=True, text=True, check=True).stdout
+        self.assertEqual("False", out.strip())
+
+    def test_not_a_matrix_file(self):
+        with open(self.path, "wb") as f:
+            f.write(b"definitely not a matrix")
+        with self.assertRaises(ValueError):
+            load_matrix(self.path)
+
+    def test_save_type(self):
+        with self.assertRaises(TypeError):
+            save_matrix("nope", self.path)
+
+    def test_keys(self):
+        mat = self._build(split_germanic(TEXT))
+        save_matrix(mat, self.path)
+        self.assertIsNone(load_matrix(self.path).sampler()._keys)
+        save_matrix(mat, self.path, keys=True)
+        loaded = load_matrix(self.path)
+        np.testing.assert_array_equal(mat.sampler().keys(), loaded.sampler()._keys)
+
+    def test_start_words(self):
+        starts = []
+        mat = self._build(split_germanic(TEXT, start_words=starts))
+        mat.setStartWords(starts)
+        mat.save(self.path)
+        loaded = load_matrix(self.path)
+        np.testing.assert_array_equal(mat.starts.ids, loaded.starts.ids)
+        np.testing.assert_array_equal(mat.starts.cumulative, loaded.starts.cumulative)
+        self.assertListEqual(mat.startWords(), loaded.startWords())
+        self.assertIsNone(load_matrix(self._save_plain()).starts)
+
+    def _save_plain(self):
+        path = os.path.join(self.dir, "plain.bin")
+        self._build(split_germanic(TEXT)).save(path)
+        return path
+
+    def test_compact(self):
+        from wordsalad import compact_matrix
+        starts = []
+        mat = self._build(split_germanic(TEXT * 2, start_words=starts))
+        mat.setStartWords(starts)
+        compact = compact_matrix(mat, min_count=2, bits=8)
+        compact.save(self.path)
+        loaded = load_matrix(self.path)
+        self.assertEqual(type(compact), type(loaded))
+        for name in ["indptr", "indices", "cumulative"]:
+            a = getattr(compact.sampler(), name)
+            b = getattr(loaded.sampler(), name)
+            self.assertEqual(a.dtype, b.dtype)
+            np.testing.assert_array_equal(a, b)
+        self.assertListEqual(compact.startWords(), loaded.startWords())
+        self.assertEqual(0, (compact.matrix != loaded.matrix).nnz)
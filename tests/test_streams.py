@@ -0,0 +1,84 @@
+from wordsalad import WordSaladMatrixBuilder, chain, generate_sentences, generate_batch
+from wordsalad.streams import block_uniform, generator, spawn, spawn_uniform
+from itertools import islice
+import numpy as np
+import random
+import unittest
+
+class TestStreams(unittest.TestCase):
+
+    def test_generator(self):
+        g = np.random.default_rng(1)
+        self.assertIs(g, generator(g))
+        self.assertEqual(generator(5).random(), generator(5).random())
+
+    def test_spawn_int_is_reproducible(self):
+        a = [g.random() for g in spawn(7, 4)]
+        b = [g.random() for g in spawn(7, 4)]
+        self.assertEqual(a, b)
+        self.assertEqual(4, len(set(a)))
+
+    def test_spawn_generator_gives_new_children(self):
+        g = np.random.default_rng(7)
+        a = [c.random() for c in spawn(g, 2)]
+        b = [c.random() for c in spawn(g, 2)]
+        self.assertNotEqual(a, b)
+
+    def test_block_uniform(self):
+        rng = block_uniform(3, block=10)
+        expected = np.random.default_rng(3).random(25)
+        actual = [rng(0.0, 1.0) for i in range(0, 25)]
+        np.testing.assert_allclose(expected[0:10], actual[0:10])
+        for x in [rng(2.0, 5.0) for i in range(0, 1000)]:
+            self.assertTrue(2.0 <= x < 5.0)
+
+    def test_spawn_uniform(self):
+        a = spawn_uniform(5, 3, block=4)
+        first = [[a[k](0.0, 1.0) for i in range(0, 10)] for k in [2, 0, 1]]
+        b = spawn_uniform(5, 3, block=4)
+        second = [[b[k](0.0, 1.0) for i in range(0, 10)] for k in [0, 1, 2]]
+        self.assertEqual(first, [second[2], second[0], second[1]])
+        self.assertEqual(30, len(set(sum(first, []))))
+
+class TestSeededGeneration(unittest.TestCase):
+
+    def setUp(self):
+        rnd = random.Random(3)
+        builder = WordSaladMatrixBuilder()
+        builder.count_followers_in_sequence([rnd.randint(0, 40) for i in range(0, 3000)])
+        self.M = builder.build_matrix()
+        self.starts = list(range(0, 10))
+
+    def test_generate_sentences_seed(self):
+        a = [list(s) for s in generate_sentences(self.M, 20, self.starts, stops=[0], seed=11)]
+        b = [list(s) for s in generate_sentences(self.M, 20, self.starts, stops=[0], seed=11)]
+        c = [list(s) for s in generate_sentences(self.M, 20, self.starts, stops=[0], seed=12)]
+        self.assertEqual(a, b)
+        self.assertNotEqual(a, c)
+
+    def test_generate_sentences_seed_order_independent(self):
+        expected = [list(s) for s in generate_sentences(self.M, 5, self.starts, stops=[0], seed=4)]
+        sentences = generate_sentences(self.M, 5, self.starts, stops=[0], seed=4)
+        # Consume them backwards, interleaved.
+        its = [iter(s) for s in reversed(sentences)]
+        actual = [[] for i in range(0, 5)]
+        busy = True
+        while busy:
+            busy = False
+            for k, it in enumerate(its):
+                for w in islice(it, 1):
+                    actual[4 - k].append(w)
+                    busy = True
+        self.assertEqual(expected, actual)
+
+    def test_generate_batch_seed(self):
+        a = generate_batch(self.M, 20, self.starts, stops=[0], seed=5, join=list)
+        b = generate_batch(self.M, 20, self.starts, stops=[0], seed=5, join=list)
+        self.assertEqual(a, b)
+        with self.assertRaises(ValueError):
+            generate_batch(self.M, 1, self.starts, rng=np.random.default_rng(), seed=5)
+
+    def test_chain_with_block_uniform(self):
+        a = list(islice(chain(self.M, 1, rng=block_uniform(9)), 50))
+        b = list(islice(chain(self.M, 1, rng=block_uniform(9)), 50))
+        self.assertEqual(a, b)
@@ -1,4 +1,5 @@
-from wordsalad.utils import join_germanic
+from wordsalad.utils import join_germanic, join_germanic_many
+import io
 import unittest
 
 class TestJoinGermanic(unittest.TestCase):
@@ -45,4 +46,29 @@ class TestJoinGermanic(unittest.TestCase):
 
         for input, expected, kwargs in cases:
             actual = join_germanic(input, **kwargs)
-            self.assertEqual(expected, actual, "Expected |{0}|".format(expected))
\ No newline at end of file
+            self.assertEqual(expected, actual, "Expected |{0}|".format(expected))
+
+class TestJoinGermanicMany(unittest.TestCase):
+
+    def setUp(self):
+        self.sequences = [
+            ["hello", "there", "."],
+            ["\"", "Yo", "man", ",", "you", "'", "re", "chill", "\""],
+            ["one", ".", "two"]
+        ]
+
+    def test_same_as_join_germanic(self):
+        expected = " ".join(join_germanic(s) for s in self.sequences)
+        self.assertEqual(expected, join_germanic_many(self.sequences))
+
+    def test_sep(self):
+        expected = "\n".join(join_germanic(s, capitalize=False) for s in self.sequences)
+        self.assertEqual(expected, join_germanic_many(self.sequences, sep="\n", capitalize=False))
+
+    def test_out(self):
+        out = io.StringIO()
+        self.assertIsNone(join_germanic_many(self.sequences * 1000, out=out))
+        self.assertEqual(join_germanic_many(self.sequences * 1000), out.getvalue())
+
+    def test_empty(self):
+        self.assertEqual("", join_germanic_many([]))
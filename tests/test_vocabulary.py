@@ -0,0 +1,48 @@
+from wordsalad.vocabulary import Vocabulary
+import unittest
+
+class TestVocabulary(unittest.TestCase):
+
+    def test_add_keeps_order(self):
+        vocab = Vocabulary()
+        self.assertEqual(0, vocab.add("a"))
+        self.assertEqual(1, vocab.add("b"))
+        self.assertEqual(0, vocab.add("a"))
+        self.assertEqual(2, len(vocab))
+        self.assertListEqual(["a", "b"], list(vocab))
+
+    def test_lookups(self):
+        vocab = Vocabulary(["x", ("y", "z"), 3])
+        self.assertEqual(1, vocab.indexOf(("y", "z")))
+        self.assertEqual(1, vocab[("y", "z")])
+        self.assertEqual(3, vocab.wordAt(2))
+        self.assertIn("x", vocab)
+        self.assertNotIn("q", vocab)
+        with self.assertRaises(KeyError):
+            vocab.indexOf("q")
+
+    def test_behaves_like_a_dict(self):
+        vocab = Vocabulary(["a", "b", "c"])
+        self.assertDictEqual({"a": 0, "b": 1, "c": 2}, dict(vocab))
+        self.assertListEqual([("a", 0), ("b", 1), ("c", 2)], list(vocab.items()))
+
+    def test_from_mapping(self):
+        vocab = Vocabulary.fromMapping({"b": 1, "a": 0})
+        self.assertListEqual(["a", "b"], vocab.words)
+        with self.assertRaises(ValueError):
+            Vocabulary.fromMapping({"a": 0, "b": 2})
+        with self.assertRaises(ValueError):
+            Vocabulary.fromMapping({"a": 0, "b": 0})
+
+    def test_copy_is_independent(self):
+        vocab = Vocabulary(["a"])
+        other = vocab.copy()
+        other.add("b")
+        self.assertEqual(1, len(vocab))
+        self.assertEqual(2, len(other))
+
+    def test_add_all(self):
+        vocab = Vocabulary(["b"])
+        ids = vocab.addAll(["c", "b", "a", "c", "a"])
+        self.assertListEqual([1, 0, 2, 1, 2], list(ids))
+        self.assertListEqual(["b", "c", "a"], vocab.words)
@@ -1,3 +1,39 @@
-from .matrix import WordSaladMatrix
-from .matrix import WordSaladMatrixBuilder
-from .generators import chain, draw_follower, generate_sentences
\ No newline at end of file
+"""Word salad from Markov chains.
+
+The names below are imported from their modules the first time they are
+used, so importing wordsalad (or only wordsalad.utils, say) stays cheap, and
+scipy is only imported by what builds or changes a matrix. A worker that
+loads saved models with load_matrix and generates from them never imports
+it.
+"""
+import importlib
+
+_LAZY = {
+    "WordSaladMatrix": "matrix",
+    "WordSaladMatrixBuilder": "matrix",
+    "WordSaladMatrixReference": "matrix",
+    "WordSaladNGramMatrix": "ngram",
+    "WordSaladNGramMatrixBuilder": "ngram",
+    "WordSaladCompactMatrix": "compact",
+    "compact_matrix": "compact",
+    "chain": "generators",
+    "draw_follower": "generators",
+    "generate_sentences": "generators",
+    "generate_batch": "generators",
+    "SamplingMode": "sampling",
+    "save_matrix": "serialization",
+    "load_matrix": "serialization",
+}
+
+__all__ = list(_LAZY)
+
+def __getattr__(name):
+    module = _LAZY.get(name)
+    if module is None:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+    value = getattr(importlib.import_module("." + module, __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
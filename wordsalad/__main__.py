@@ -0,0 +1,251 @@
+"""The wordsalad command line tool.
+
+    python -m wordsalad build corpus.txt -o corpus.wsalad
+    python -m wordsalad stats corpus.wsalad
+    python -m wordsalad generate corpus.wsalad 100000 -o salads.txt
+
+build tokenises and counts text files as they are read and saves the matrix
+with save_matrix, so a server can map it (the "model" of a corpus in the
+config of wordsaladflask) instead of building it when it starts. stats
+describes a saved model, and generate writes salads from one as fast as it
+can.
+"""
+from . import streams
+from .generators import generate_batch
+from .registry import model_nbytes
+from .sampling import SamplingMode
+from .serialization import load_matrix, save_matrix
+from .utils import join_germanic_many
+import argparse
+import json
+import numpy as np
+import os
+import sys
+import time
+
+STOPS = list(".?!")
+# The most words in a generated salad, unless --max-words is given.
+DEFAULT_MAX_WORDS = 1000
+
+def build(args):
+    from .compact import compact_matrix, compaction_report
+    start = time.perf_counter()
+    if args.processes:
+        from .parallel import build_parallel
+        _report(args, "Counting {} file(s) on {} processes...".format(len(args.corpus), args.processes))
+        mat = build_parallel(args.corpus, processes=args.processes, encoding=args.encoding)
+    else:
+        from .matrix import WordSaladMatrixBuilder
+        from .input import split_germanic_ids
+        builder = WordSaladMatrixBuilder()
+        start_counts = None
+        for path in args.corpus:
+            with open(path, encoding=args.encoding) as f:
+                progress = _Progress(f, path, os.path.getsize(path), args)
+                ids, start_counts = split_germanic_ids(progress, builder.words, start_counts=start_counts)
+                progress.done()
+            # Every file is a sequence of its own, like build_parallel counts them.
+            builder.count_followers_in_ids(ids)
+            del ids
+        mat = builder.build_matrix(start_counts=start_counts)
+    if args.compact or args.min_count is not None or args.min_probability is not None:
+        compact = compact_matrix(mat, min_count=args.min_count, min_probability=args.min_probability,
+                                 bits=args.compact or 16)
+        r = compaction_report(mat, compact)
+        _report(args, "Compacted {} followers to {}, {:.1%} of the memory, total variation {:.4f}.".format(
+            r["entries"], r["compact_entries"], r["ratio"], r["total_variation"]))
+        mat = compact
+    save_matrix(mat, args.output, keys=args.keys)
+    _report(args, "Wrote {}: {} words, {} followers, {:.1f} MB in {:.1f} s, {}.".format(
+        args.output, mat.wordCount(), len(mat.sampler().indices), os.path.getsize(args.output) / 1e6,
+        time.perf_counter() - start, _peak_memory(workers=bool(args.processes))))
+    return 0
+
+def stats(args):
+    mat = load_matrix(args.model)
+    s = mat.sampler()
+    degrees = np.diff(s.indptr.astype(np.int64))
+    result = {
+        "words": mat.wordCount(),
+        "followers": int(degrees.sum()),
+        "start_words": len(mat.starts) if mat.starts is not None else 0,
+        "quantized_bits": getattr(s, "bits", None),
+        "file_bytes": os.path.getsize(args.model),
+        "memory_bytes": int(model_nbytes(mat)),
+        "out_degree": _distribution(degrees),
+    }
+    if args.json:
+        json.dump(result, sys.stdout, indent=2)
+        print()
+        return 0
+    print(args.model)
+    for name in ["words", "followers", "start_words", "quantized_bits", "file_bytes", "memory_bytes"]:
+        if result[name] is not None:
+            print("  {:<16} {}".format(name.replace("_", " "), result[name]))
+    d = result["out_degree"]
+    print("  out-degree       min {min}  median {median:g}  mean {mean:.2f}  p90 {p90:g}  p99 {p99:g}  max {max}".format(**d))
+    print("  dead ends        {}".format(d["dead_ends"]))
+    for bucket, count in d["histogram"]:
+        print("    {:>12} {:>10}".format(bucket, count))
+    return 0
+
+def generate(args):
+    mode = None
+    if args.temperature is not None or args.top_k is not None or args.top_p is not None:
+        mode = SamplingMode(1.0 if args.temperature is None else args.temperature, args.top_k, args.top_p)
+    # Only the escapes are decoded, other characters are kept as they are.
+    sep = args.sep.encode("latin-1", "backslashreplace").decode("unicode_escape")
+    mat = load_matrix(args.model)
+    if args.start is None and mat.starts is None:
+        raise ValueError("{} has no start words, give some with --start.".format(args.model))
+    unknown = [w for w in args.start or [] if w not in mat]
+    if unknown:
+        raise ValueError("not words of the model: {}".format(", ".join(unknown)))
+    start = time.perf_counter()
+    close = args.output not in (None, "-")
+    out = open(args.output, "w", encoding="utf-8") if close else sys.stdout
+    try:
+        if args.processes:
+            from .parallel import generate_parallel
+            generate_parallel(args.model, args.n, args.start, out, processes=args.processes, chunk=args.chunk,
+                              seed=args.seed, stops=STOPS, max_length=args.max_words, sep=sep, mode=mode)
+        else:
+            _generate_here(mat, args, out, sep, mode)
+        if args.n > 0:
+            out.write("\n")
+    finally:
+        if close:
+            out.close()
+        else:
+            out.flush()
+    seconds = time.perf_counter() - start
+    _report(args, "Generated {} salads in {:.2f} s, {:.0f}/s.".format(
+        args.n, seconds, args.n / seconds if seconds > 0 else 0))
+    return 0
+
+def _generate_here(mat, args, out, sep, mode):
+    # The chunks and streams of generate_parallel, so the same seed gives the
+    # same salads.
+    chunk = max(args.chunk, 1)
+    counts = [min(chunk, args.n - done) for done in range(0, max(args.n, 0), chunk)]
+    for k, (count, rng) in enumerate(zip(counts, streams.spawn(args.seed, len(counts)))):
+        if k > 0:
+            out.write(sep)
+        salads = generate_batch(mat, count, args.start, rng=rng, stops=STOPS,
+                                max_length=args.max_words, join=list, mode=mode)
+        join_germanic_many(salads, out=out, sep=sep)
+
+class _Progress:
+    # A file for split_germanic_ids to read, that reports how far into it it
+    # has got at most every second.
+    def __init__(self, f, name, size, args):
+        self.f = f
+        self.name = name
+        self.size = max(size, 1)
+        self.args = args
+        self.last = time.monotonic()
+
+    def read(self, n):
+        s = self.f.read(n)
+        now = time.monotonic()
+        if now - self.last >= 1.0:
+            self.last = now
+            at = self.f.buffer.tell()
+            if at < self.size:
+                self._show(at)
+        return s
+
+    def done(self):
+        self._show(self.size)
+
+    def _show(self, at):
+        _report(self.args, "{}: {:.0%} of {:.1f} MB, {}".format(
+            self.name, min(at / self.size, 1.0), self.size / 1e6, _peak_memory()))
+
+def _distribution(degrees):
+    if len(degrees) == 0:
+        return {"min": 0, "median": 0.0, "mean": 0.0, "p90": 0.0, "p99": 0.0, "max": 0,
+                "dead_ends": 0, "histogram": []}
+    # Powers of two: 1, 2-3, 4-7, ...
+    positive = degrees[degrees > 0]
+    buckets = np.bincount(np.frexp(positive)[1] - 1) if len(positive) > 0 else []
+    histogram = []
+    for b, count in enumerate(buckets):
+        low, high = 1 << b, (2 << b) - 1
+        histogram.append(["{}".format(low) if low == high else "{}-{}".format(low, high), int(count)])
+    p50, p90, p99 = np.percentile(degrees, [50, 90, 99])
+    return {
+        "min": int(degrees.min()),
+        "median": float(p50),
+        "mean": float(degrees.mean()),
+        "p90": float(p90),
+        "p99": float(p99),
+        "max": int(degrees.max()),
+        "dead_ends": int((degrees == 0).sum()),
+        "histogram": histogram,
+    }
+
+def _peak_memory(workers=False):
+    # The peak resident memory of this process, and of its largest worker.
+    try:
+        import resource
+    except ImportError:
+        return "peak memory unknown"
+    unit = 1 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit
+    if workers:
+        worker = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit
+        return "peak memory {:.1f} MB (workers {:.1f} MB)".format(own / 1e6, worker / 1e6)
+    return "peak memory {:.1f} MB".format(own / 1e6)
+
+def _report(args, message):
+    if not args.quiet:
+        print(message, file=sys.stderr)
+
+def parser():
+    parser = argparse.ArgumentParser(prog="python -m wordsalad", description="Builds, describes and generates from word salad models.")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Reports nothing on stderr.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("build", help="Counts text files and saves the model.")
+    p.add_argument("corpus", nargs="+", help="Text files, each counted as a sequence of its own.")
+    p.add_argument("-o", "--output", required=True, help="The model file to write.")
+    p.add_argument("--encoding", default="utf-8")
+    p.add_argument("--processes", type=int, help="Counts on a pool of this many processes.")
+    p.add_argument("--keys", action="store_true", help="Saves the search keys of generate_batch too.")
+    p.add_argument("--compact", type=int, choices=[8, 16], help="Saves a compact model, quantized to this many bits.")
+    p.add_argument("--min-count", type=int, help="Compacts, leaving out followers seen fewer times.")
+    p.add_argument("--min-probability", type=float, help="Compacts, leaving out less likely followers.")
+    p.set_defaults(run=build)
+
+    p = commands.add_parser("stats", help="Describes a model.")
+    p.add_argument("model")
+    p.add_argument("--json", action="store_true", help="Prints the statistics as JSON.")
+    p.set_defaults(run=stats)
+
+    p = commands.add_parser("generate", help="Writes salads from a model.")
+    p.add_argument("model")
+    p.add_argument("n", type=int, help="How many salads.")
+    p.add_argument("-o", "--output", help="The file to write, stdout by default.")
+    p.add_argument("--processes", type=int, help="Generates on a pool of this many processes.")
+    p.add_argument("--chunk", type=int, default=10000, help="Salads per batch.")
+    p.add_argument("--seed", type=int)
+    p.add_argument("--start", action="append", help="A start word, instead of those of the model. Can be repeated.")
+    p.add_argument("--sep", default="\\n", help="What goes between salads, with backslash escapes.")
+    p.add_argument("--max-words", type=int, default=DEFAULT_MAX_WORDS)
+    p.add_argument("--temperature", type=float)
+    p.add_argument("--top-k", type=int)
+    p.add_argument("--top-p", type=float)
+    p.set_defaults(run=generate)
+    return parser
+
+def main(argv=None):
+    args = parser().parse_args(argv)
+    try:
+        return args.run(args)
+    except (OSError, ValueError, KeyError) as e:
+        print("wordsalad: error: {}".format(e), file=sys.stderr)
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+"""Smaller models for workers that only generate.
+
+compact_matrix drops the rare followers of a WordSaladMatrix, stores what is
+left as quantized cumulative sums (see QuantizedSampler) with the narrowest
+index types the vocabulary allows, and leaves out the float probabilities
+and the counts. compaction_report says how much that saved and how far the
+distributions moved, to pick the thresholds by.
+"""
+from .matrix import WordSaladMatrix
+from .sampling import ModeCache, QuantizedSampler, _row_cumsum
+from .registry import model_nbytes
+import numpy as np
+
+class WordSaladCompactMatrix(WordSaladMatrix):
+    """A WordSaladMatrix that only keeps its sampling index, a
+    QuantizedSampler, its words and its start words.
+
+    It draws and generates like any WordSaladMatrix. matrix is built from
+    the quantized probabilities the first time it is used (by probability,
+    probabilitiesAfter or a SamplingMode, say), which costs the memory the
+    compact matrix saves. It has no counts, so it can not be updated, and
+    it can not use alias tables.
+    """
+    def __init__(self, sampler, vocabulary, starts=None):
+        if not isinstance(sampler, QuantizedSampler):
+            raise TypeError("Expected sampler to be a QuantizedSampler.")
+        if len(sampler.indptr) != len(vocabulary) + 1:
+            raise ValueError("sampler does not match the vocabulary.")
+        self.vocabulary = vocabulary
+        self.counts = None
+        self.starts = starts
+        self._sampler = sampler
+        self._quantized = sampler
+        self._modes = ModeCache()
+        self._matrix = None
+        self._csr = None
+
+    @property
+    def matrix(self):
+        if self._matrix is None:
+            from scipy.sparse import csr_matrix
+            s = self._quantized
+            n = len(self.vocabulary)
+            self._matrix = csr_matrix(
+                (s.probabilities(), s.indices.astype(np.int32), s.indptr.astype(np.int64)), shape=(n, n))
+        return self._matrix
+
+    @matrix.setter
+    def matrix(self, m):
+        # power sets it.
+        self._matrix = m
+
+    def _arrays(self):
+        m = self.matrix.tocsr()
+        return m.data, m.indices, m.indptr
+
+    def useAliasSampling(self, threshold=None):
+        raise ValueError("A compact matrix can not use alias sampling.")
+
+    def __repr__(self):
+        return "<WordSaladCompactMatrix with {} words, {} bits>".format(len(self.vocabulary), self._quantized.bits)
+
+def compact_matrix(mat, min_count=None, min_probability=None, bits=16):
+    """Returns a WordSaladCompactMatrix with the followers of mat, except the
+    ones seen fewer than min_count times or with a probability below
+    min_probability. The likeliest follower of a word is always kept, so no
+    word becomes a dead end. What is left is normalized again and quantized
+    to bits bits (8 or 16), which leaves out followers too unlikely for
+    the precision.
+
+    Word indices are stored in 16 bits when there are at most 65536 words.
+
+    Raises ValueError if min_count is given and mat has no counts."""
+    if not isinstance(mat, WordSaladMatrix):
+        raise TypeError("Expected mat to be of type WordSaladMatrix.")
+    m = mat.matrix.tocsr()
+    rows = m.shape[0]
+    counts = np.diff(m.indptr)
+    rowof = np.repeat(np.arange(0, rows), counts)
+    data = np.asarray(m.data, dtype="d")
+    keep = np.ones(len(data), dtype=bool)
+    if min_count is not None:
+        if mat.counts is None:
+            raise ValueError("min_count needs a matrix with counts.")
+        keep &= np.asarray(mat.counts) >= min_count
+    if min_probability is not None:
+        keep &= data >= min_probability
+    # The likeliest follower of every row, the first one on ties.
+    order = np.lexsort((-data, rowof))
+    firsts = order[m.indptr[:-1][counts > 0]]
+    keep[firsts] = True
+
+    kept = np.bincount(rowof[keep], minlength=rows)
+    indptr = np.zeros(rows + 1, dtype=np.int64)
+    np.cumsum(kept, out=indptr[1:])
+    data = data[keep]
+    sums = _row_cumsum(indptr, data)
+    if len(sums) > 0:
+        data /= np.repeat(sums[indptr[1:][kept > 0] - 1], kept[kept > 0])
+    quantized = QuantizedSampler.from_probabilities(indptr, m.indices[keep], data, bits=bits)
+    index_type = np.uint16 if rows <= (1 << 16) else np.int32
+    pointer_type = np.uint32 if quantized.indptr[-1] < (1 << 32) else np.int64
+    quantized = QuantizedSampler(
+        quantized.indptr.astype(pointer_type), quantized.indices.astype(index_type),
+        quantized.cumulative, bits=bits)
+    return WordSaladCompactMatrix(quantized, mat.vocabulary, starts=mat.starts)
+
+def compaction_report(mat, compact):
+    """Compares a matrix with a compact version of it (see compact_matrix.)
+    Returns a dict with:
+
+        entries, compact_entries    The number of followers.
+        bytes, compact_bytes        Their memory, as model_nbytes estimates it.
+        ratio                       compact_bytes / bytes.
+        total_variation             The total variation distance between the
+                                    followers of a word in mat and in compact,
+                                    averaged over the words.
+        max_total_variation         The largest of those.
+        kl_divergence               The Kullback-Leibler divergence of the
+                                    followers in compact from those in mat, in
+                                    nats, averaged over the words.
+
+    The averages are weighted by how often each word was followed by
+    anything if mat has counts, otherwise every word with followers counts
+    the same."""
+    m = mat.matrix.tocsr()
+    rows, n = m.shape
+    p_rows = np.repeat(np.arange(0, rows, dtype=np.int64), np.diff(m.indptr))
+    p_keys = p_rows * n + m.indices
+    p = np.asarray(m.data, dtype="d")
+    s = compact._quantized
+    q_rows = np.repeat(np.arange(0, rows, dtype=np.int64), np.diff(s.indptr.astype(np.int64)))
+    q_keys = q_rows * n + s.indices
+    q = s.probabilities()
+
+    # Where every follower of compact is in mat.
+    order = np.argsort(p_keys, kind="stable")
+    at = np.searchsorted(p_keys, q_keys, sorter=order)
+    at = order[np.minimum(at, len(order) - 1)] if len(order) > 0 else at
+    if not np.array_equal(p_keys[at], q_keys):
+        raise ValueError("compact has followers that mat does not.")
+
+    # Half the sum of |p - q|: the kept followers, and the ones dropped.
+    diff = p.copy()
+    diff[at] = np.abs(p[at] - q)
+    tv = 0.5 * np.bincount(p_rows, weights=diff, minlength=rows)
+    kl = np.bincount(q_rows, weights=q * np.log(q / p[at]), minlength=rows)
+
+    if mat.counts is not None:
+        weights = np.bincount(p_rows, weights=np.asarray(mat.counts, dtype="d"), minlength=rows)
+    else:
+        weights = (np.diff(m.indptr) > 0).astype("d")
+    total = weights.sum()
+    before = model_nbytes(mat)
+    after = model_nbytes(compact)
+    return {
+        "entries": int(m.nnz),
+        "compact_entries": int(len(q)),
+        "bytes": int(before),
+        "compact_bytes": int(after),
+        "ratio": after / before if before > 0 else 1.0,
+        "total_variation": float((tv * weights).sum() / total) if total > 0 else 0.0,
+        "max_total_variation": float(tv.max()) if rows > 0 else 0.0,
+        "kl_divergence": float((kl * weights).sum() / total) if total > 0 else 0.0,
+    }
@@ -1,8 +1,14 @@
 from .matrix import WordSaladMatrix
+from .ngram import WordSaladNGramMatrix
+from . import metrics
+from . import streams
+from .sampling import StartSampler
+import numpy as np
 import random
+import time
 from itertools import takewhile
 
-def draw_follower(mat, word, rng=random.uniform):
+def draw_follower(mat, word, rng=random.uniform, mode=None):
     """Draw a follower for a given word, using the given RNG function. rng 
     should have the same interface as random.uniform. 
     
@@ -11,21 +17,27 @@ def draw_follower(mat, word, rng=random.uniform):
     
     By default rng is random.uniform and thus the distribution is uniform, all 
     words have equal chance of getting picked.
+
+    The follower is looked up in the sampling index of the matrix (see 
+    WordSaladMatrix.sampler), so a draw costs O(log k) for a word with k 
+    followers. With a SamplingMode the follower is drawn in that mode, at the
+    same cost.
     """
-    probs = mat.probabilities(word).tocoo() # Use a COO, lets us iterate better.
-    p = rng(0.01, 1.0)
-    f = -1
-    for i,p1 in zip(probs.col, probs.data):
-        if p1 != 0.0:
-            p -= p1
-            if p <= 0.0:
-                f = i
-                break
+    if word not in mat:
+        raise ValueError("word is not in the matrix.")
+    p = rng(0.0, 1.0)
+    sampler = mat.sampler() if mode is None else mat.sampler(mode)
+    f = sampler.draw(mat.indexOf(word), p)
+    sink = metrics.sink
+    if sink is not None:
+        sink.count("draw_follower.draws")
+        if f == -1:
+            sink.count("draw_follower.dead_ends")
     if f == -1:
         return None
-    return mat.wordAt(i)
+    return mat.wordAt(f)
 
-def chain(mat, start, rng=random.uniform):
+def chain(mat, start, rng=random.uniform, mode=None):
     """Evaluates the Markov Chain for the start word. 
     
     The chain will continue until we reach a word which has no follower (no word has a probility of following it.)
@@ -35,26 +47,66 @@ def chain(mat, start, rng=random.uniform):
         With a matrix for ("hey" 1.0 -> "man") ("man" 1.0 -> "hey") chain(matrix, "hey") will generate an endless sequence of:
             
             "hey", "man", "hey", "man", ... 
+
+    For a WordSaladNGramMatrix start is a context (a tuple of words), and the
+    chain yields its words followed by one drawn word at a time.
+
+    The followers are drawn in mode, a SamplingMode, if given.
     """
+    if isinstance(mat, WordSaladNGramMatrix):
+        return _ngram_chain(mat, start, rng, mode)
+    return _chain(mat, start, rng, mode)
+
+def _chain(mat, start, rng, mode):
     w = start
     while w != None:
         yield w
-        w = draw_follower(mat, w, rng=rng)
+        w = draw_follower(mat, w, rng=rng, mode=mode)
+
+def _ngram_chain(mat, start, rng, mode):
+    # The context is tracked by its row in the matrix, the successor of every
+    # drawn element is the row of the next context.
+    if start not in mat:
+        raise ValueError("start is not in the matrix.")
+    sampler = mat.sampler(mode)
+    # locate gives positions in the arrays of the matrix, whatever the mode.
+    indices = mat.matrix.indices
+    i = mat.indexOf(start)
+    yield from start
+    while True:
+        j = sampler.locate(i, rng(0.0, 1.0))
+        if j == -1:
+            return
+        yield mat.wordAt(indices[j])
+        i = mat.successor(j)
 
-def generate_sentences(mat, n, start_words, rng=random.uniform, stops=[]):
+def generate_sentences(mat, n, start_words=None, rng=random.uniform, stops=[], seed=None, mode=None):
     """Generates n sequences of words, drawn at random from the matrix mat.
 
     Each sequence will start with a word from start_words, and end whenever there
     are no more followers (see chain), or a word is in stops. 
+
+    start_words is a sequence of words to pick from, a StartSampler, or None 
+    for the start words kept with the matrix (see 
+    WordSaladMatrix.setStartWords.) A sampler is picked from without copying
+    anything.
     
     Each sequence will be an iterable.
 
-    The stop word will be included."""
-    if type(mat) is not WordSaladMatrix:
-        raise TypeError("Expected mat to be of type WordSaladMatrix.")
-    start_words = list(start_words)
-    if len(start_words) < 1:
-        raise ValueError("Empty start_words sequence.")
+    The stop word will be included.
+
+    If seed is given (an int or a numpy Generator, see wordsalad.streams) it
+    is used instead of rng and the random module: the start words are picked
+    with it, and every sequence draws from its own stream spawned from it. 
+    The same int seed then always gives the same sequences, in whatever order
+    they are consumed.
+
+    mode is a SamplingMode to draw the followers in (see chain.)
+
+    mat can also be a WordSaladNGramMatrix, start_words are then contexts."""
+    if not isinstance(mat, (WordSaladMatrix, WordSaladNGramMatrix)):
+        raise TypeError("Expected mat to be of type WordSaladMatrix or WordSaladNGramMatrix.")
+    start_words = _start_words(mat, start_words)
 
     def taketostop(it):
         # Like takewhile but also returns the end item.
@@ -63,8 +115,151 @@ def generate_sentences(mat, n, start_words, rng=random.uniform, stops=[]):
             if w in stops:
                 break
 
-    starts = (random.choice(start_words) for i in range(0, n))
+    if seed is None:
+        if isinstance(start_words, StartSampler):
+            picks = [mat.wordAt(start_words.draw(random.random())) for i in range(0, n)]
+        else:
+            picks = [random.choice(start_words) for i in range(0, n)]
+        starts = [(w, rng) for w in picks]
+    else:
+        gen = streams.generator(seed)
+        if isinstance(start_words, StartSampler):
+            picks = [mat.wordAt(i) for i in start_words.draw_many(gen.random(max(n, 0))).tolist()]
+        else:
+            picks = [start_words[i] for i in gen.integers(0, len(start_words), size=max(n, 0)).tolist()]
+        rngs = streams.spawn_uniform(gen, max(n, 0))
+        starts = list(zip(picks, rngs))
+    sink = metrics.sink
+    if sink is not None:
+        return [
+            _measured_taketostop(sink, chain(mat, s, rng=r, mode=mode), stops)
+            for s, r in starts
+        ]
     return [
-        taketostop(chain(mat, s, rng=rng))
-        for s in starts
-    ]
\ No newline at end of file
+        taketostop(chain(mat, s, rng=r, mode=mode))
+        for s, r in starts
+    ]
+
+def _start_words(mat, start_words):
+    # The start words to pick from, as a list or a StartSampler.
+    if start_words is None:
+        start_words = getattr(mat, "starts", None)
+        if start_words is None:
+            raise TypeError("start_words is None and the matrix has no start words.")
+    if not isinstance(start_words, StartSampler):
+        start_words = list(start_words)
+    if len(start_words) < 1:
+        raise ValueError("Empty start_words sequence.")
+    return start_words
+
+def _measured_taketostop(sink, it, stops):
+    # taketostop of generate_sentences, that records the length of the
+    # sequence and whether it ran out of followers, when it is done.
+    n = 0
+    dead_end = True
+    try:
+        for w in it:
+            n += 1
+            yield w
+            if w in stops:
+                dead_end = False
+                break
+    except GeneratorExit:
+        # Abandoned by the caller.
+        dead_end = False
+        raise
+    finally:
+        sink.count("generate_sentences.sentences")
+        sink.count("generate_sentences.words", n)
+        sink.observe("generate_sentences.length", n)
+        if dead_end:
+            sink.count("generate_sentences.dead_ends")
+
+def generate_batch(mat, n, start_words=None, rng=None, stops=[], max_length=None, join=None, seed=None, mode=None):
+    """Generates n sequences like generate_sentences, but advances all of them
+    together instead of one word at a time.
+
+    start_words is taken like generate_sentences takes it.
+
+    Every step draws one vector of random numbers from rng, which should be a
+    numpy.random.Generator, and looks up the followers of all unfinished 
+    sequences at once. If rng is None a Generator is created from seed (see 
+    wordsalad.streams), so the same int seed gives the same sequences. A sequence 
+    drops out when it reaches a word in stops or a word without followers. If 
+    max_length is given no sequence gets longer than that, otherwise looping 
+    chains never end (see chain.) The followers are drawn in mode, a 
+    SamplingMode, if given.
+
+    Returns a list of numpy arrays with the word indices of each sequence. If 
+    join is given, it is called with the list of words of each sequence 
+    instead, and the list of results is returned. join=list gives plain lists
+    of words, join=wordsalad.utils.join_germanic gives sentences.
+    """
+    if not isinstance(mat, WordSaladMatrix):
+        raise TypeError("Expected mat to be of type WordSaladMatrix.")
+    n = int(n)
+    start_words = _start_words(mat, start_words)
+    if not isinstance(start_words, StartSampler) and any(w not in mat for w in set(start_words)):
+        raise ValueError("start_words contains a word that is not in the matrix.")
+    if rng is None:
+        rng = streams.generator(seed)
+    elif seed is not None:
+        raise ValueError("Give either rng or seed, not both.")
+    if n < 1:
+        return []
+    sink = metrics.sink
+    if sink is not None:
+        began = time.perf_counter()
+
+    sampler = mat.sampler(mode)
+    stopping = np.zeros(mat.wordCount(), dtype=bool)
+    stopping[[mat.indexOf(w) for w in stops if w in mat]] = True
+
+    # Every step records which sequences were extended, and with what.
+    active = np.arange(0, n)
+    if isinstance(start_words, StartSampler):
+        current = start_words.draw_many(rng.random(n)).astype(sampler.indices.dtype)
+    else:
+        current = np.array(
+            [mat.indexOf(start_words[i]) for i in rng.integers(0, len(start_words), size=n)],
+            dtype=sampler.indices.dtype)
+    seqs = [active]
+    words = [current]
+    length = 1
+    while len(active) > 0 and (max_length is None or length < max_length):
+        going = ~stopping[current]
+        active = active[going]
+        current = current[going]
+        followers = sampler.draw_many(current, rng.random(len(current)))
+        found = followers >= 0
+        active = active[found]
+        current = followers[found]
+        seqs.append(active)
+        words.append(current)
+        length += 1
+
+    seqs = np.concatenate(seqs)
+    words = np.concatenate(words)
+    # A stable sort keeps the words of each sequence in the order drawn.
+    words = words[np.argsort(seqs, kind="stable")]
+    lengths = np.bincount(seqs, minlength=n)
+    ends = np.cumsum(lengths).tolist()
+    res = [words[i:j] for i, j in zip([0] + ends, ends)]
+    if sink is not None:
+        _record_batch(sink, lengths, words[np.cumsum(lengths) - 1], stopping, max_length, time.perf_counter() - began)
+    if join is not None:
+        return [join([mat.wordAt(i) for i in seq]) for seq in res]
+    return res
+
+def _record_batch(sink, lengths, last, stopping, max_length, seconds):
+    # Records the metrics of generate_batch, given the length and last word of
+    # every sequence.
+    dead_ends = ~stopping[last]
+    if max_length is not None:
+        dead_ends &= lengths < max_length
+    sink.count("generate_batch.sentences", len(lengths))
+    sink.count("generate_batch.words", int(lengths.sum()))
+    sink.count("generate_batch.dead_ends", int(dead_ends.sum()))
+    for n in lengths.tolist():
+        sink.observe("generate_batch.length", n)
+    sink.observe("generate_batch.seconds", seconds)
@@ -1,40 +1,140 @@
 import string
+import re
+from array import array
+from functools import lru_cache
+import numpy as np
 
-def split_germanic(text, strip={"\r"," ", "\n", "\t"}, whitespace=string.whitespace, punctuation=string.punctuation, start_words=[], sentence_end=".?!"):
+# How much is read at a time when split_germanic is given a file object.
+CHUNK_SIZE = 1 << 16
+
+def split_germanic(text, strip={"\r"," ", "\n", "\t"}, whitespace=string.whitespace, punctuation=string.punctuation, start_words=None, sentence_end=".?!"):
     """Tries to split the input text as if it were natural language "germanic" text,
     like english or german.
 
     whitespace will be used as word separators, characters in strip will be removed
     and punctuation will be treated like single, one character words.
 
+    text can be a string, a file object opened in text mode or an iterable of 
+    string chunks. Files and chunks are tokenised as they are read, words 
+    straddling two chunks are handled, so the whole text never has to be in 
+    memory.
+
+    If start_words is a list, every word starting a sentence is appended to it.
+
     Returns a generator.
     """
     whitespace = str(whitespace)
     if whitespace == "":
         raise ValueError("whitespace is empty, I have nothing to split on.")
-    
-    nonWordChars = whitespace + punctuation
-    i = 0
+    punctuation = "".join(punctuation)
+    sentence_end = "".join(sentence_end)
+
+    tokens, delimiters, singles = _tokenizer(whitespace, punctuation, sentence_end)
     prevWasSentenceEnd = True
-    while i < len(text):
-        c = text[i]
-        if c in whitespace:
-            while i < len(text) and text[i] in whitespace:
-                i+=1
-        elif c not in punctuation and c not in sentence_end:
-            word = ""
-            while i < len(text) and text[i] not in nonWordChars:
-                word += text[i]
-                i+=1
-            if word != "":
-                yield word
+    for chunk in _complete_chunks(text, delimiters):
+        if start_words is None:
+            yield from tokens(chunk)
+            continue
+        for t in tokens(chunk):
+            # Single characters that can't start a word are punctuation.
+            if t in singles:
+                prevWasSentenceEnd = True
+            else:
                 if prevWasSentenceEnd:
-                    start_words.append(word)
+                    start_words.append(t)
                 prevWasSentenceEnd = False
-        else:
-            yield c
-            prevWasSentenceEnd = True
-            i+=1
+            yield t
+
+def split_germanic_ids(text, vocabulary, whitespace=string.whitespace, punctuation=string.punctuation, sentence_end=".?!", start_counts=None):
+    """Splits text like split_germanic, but returns indices into vocabulary
+    (a wordsalad.vocabulary.Vocabulary) instead of words. New words are added
+    to it.
+
+    Returns two numpy arrays: the index of every word in the text, in order,
+    and how many sentences start with each word of the vocabulary, for the
+    words split_germanic would add to start_words. If start_counts is given,
+    the counts are added to it (in a new array, as long as the vocabulary.)
+
+    The words of a chunk are only kept until they have been looked up, so
+    memory grows with the number of words in the text by four bytes each,
+    and with the vocabulary. Pass the vocabulary of a 
+    WordSaladMatrixBuilder and give the indices to its count_followers_in_ids.
+    """
+    whitespace = str(whitespace)
+    if whitespace == "":
+        raise ValueError("whitespace is empty, I have nothing to split on.")
+    punctuation = "".join(punctuation)
+    sentence_end = "".join(sentence_end)
+
+    tokens, delimiters, singles = _tokenizer(whitespace, punctuation, sentence_end)
+    ids = array("i")
+    starts = array("i")
+    # Whether each word of the vocabulary is a single punctuation character.
+    single = bytearray()
+    prevWasSentenceEnd = True
+    for chunk in _complete_chunks(text, delimiters):
+        chunk_ids = vocabulary.addAll(tokens(chunk))
+        if len(chunk_ids) == 0:
+            continue
+        single.extend(w in singles for w in vocabulary.words[len(single):])
+        c = np.frombuffer(chunk_ids, dtype=np.int32)
+        s = np.frombuffer(single, dtype=bool)[c]
+        # A word starts a sentence if it follows a single.
+        follows = np.empty(len(c), dtype=bool)
+        follows[0] = prevWasSentenceEnd
+        follows[1:] = s[:-1]
+        starts.frombytes(c[follows & ~s].tobytes())
+        prevWasSentenceEnd = bool(s[-1])
+        ids.frombytes(chunk_ids.tobytes())
+
+    counts = np.bincount(np.frombuffer(starts, dtype=np.int32), minlength=len(vocabulary)).astype(np.int64)
+    if start_counts is not None:
+        counts[0:len(start_counts)] += start_counts
+    return np.frombuffer(ids, dtype=np.int32), counts
+
+@lru_cache(maxsize=32)
+def _tokenizer(whitespace, punctuation, sentence_end):
+    # A word starts with anything that isn't whitespace, punctuation or a 
+    # sentence end, and runs until whitespace or punctuation. Everything else
+    # that isn't whitespace is a token of its own. Whitespace is skipped by 
+    # virtue of not matching.
+    def chars(s):
+        return "".join(re.escape(c) for c in s)
+    W = chars(whitespace)
+    WP = chars(whitespace + punctuation)
+    WPS = chars(whitespace + punctuation + sentence_end)
+    pattern = re.compile("[^{0}][^{1}]*|[^{2}]".format(WPS, WP, W), re.DOTALL)
+    delimiters = frozenset(whitespace + punctuation)
+    singles = frozenset(punctuation + sentence_end) - frozenset(whitespace)
+    return pattern.findall, delimiters, singles
+
+def _complete_chunks(text, delimiters):
+    # Yields pieces of text that end on a word boundary. Whatever follows the
+    # last delimiter in a chunk might continue in the next one, so it is held
+    # back and put in front of it.
+    if isinstance(text, str):
+        # Splitting a long string a chunk at a time keeps only one chunk of 
+        # words in memory.
+        if len(text) <= CHUNK_SIZE:
+            yield text
+            return
+        s = text
+        text = (s[i:i + CHUNK_SIZE] for i in range(0, len(s), CHUNK_SIZE))
+    read = getattr(text, "read", None)
+    chunks = iter(lambda: read(CHUNK_SIZE), "") if read is not None else text
+    # The carry has no delimiter in it, so only the new chunk is searched for
+    # the last one. A long run without any is kept in pieces until it ends.
+    carry = []
+    for chunk in chunks:
+        i = max(chunk.rfind(d) for d in delimiters) + 1
+        if i == 0:
+            carry.append(chunk)
+            continue
+        carry.append(chunk[:i])
+        yield "".join(carry)
+        carry = [chunk[i:]] if i < len(chunk) else []
+    if carry:
+        yield "".join(carry)
 
 def group_words(words, size=2, empty=""):
     """Generates pairs (tuples) of consequtive words.
@@ -1,33 +1,35 @@
-from scipy.sparse import csr_matrix, coo_matrix, diags
-from scipy.sparse import isspmatrix
+from array import array
+from collections.abc import Iterable, Mapping
+from itertools import chain, islice
+import numpy as np
+from .sampling import CumulativeSampler, AliasSampler, ModeCache, ModeSampler, StartSampler, ALIAS_THRESHOLD, _row_cumsum
+from .vocabulary import Vocabulary
+from . import metrics
 import random
+import threading
 
 class WordSaladMatrixBuilder():
     """Aids in the construction of a WordSaladMatrix. The WordSaladMatrix object
     has some finicky requirements and this object helps construct one in a 
     reasonably efficient manner.
     
-    It uses a sparse COO matrix to construct the final sparse matrix which can
-    then be used to find word follower probabilities."""
+    Every counted pair of words is stored as two word indices in typed arrays,
+    which are turned into a sparse matrix and normalized in build_matrix.
+
+    For large inputs, count_followers_in_ids takes a whole sequence of word
+    indices at once."""
     def __init__(self):
-        self.words = dict()
-        self.c     = 0
-        self.row = []
-        self.col = []
-        self.data = []
+        self.words = Vocabulary()
+        self.row = array("i")
+        self.col = array("i")
+
+    @property
+    def c(self):
+        """The number of words added so far."""
+        return len(self.words)
     
     def add_word(self, w):
-        if w not in self.words:
-            self.words[w] = self.c
-            
-            #self.row.append(self.c)
-            #self.col.append(self.c)
-            #self.data.append(0)            
-            
-            self.c += 1
-            return self.c - 1
-        else:
-            return self.words[w]
+        return self.words.add(w)
     
     def count_follower(self, w, f):
         i = self.add_word(w)
@@ -35,8 +37,39 @@ class WordSaladMatrixBuilder():
         
         self.row.append(i)
         self.col.append(j)
-        self.data.append(1)
     
+    def merge(self, other):
+        """Adds the words and counted followers of another builder to this 
+        one. Words new to this builder get indices in the order other 
+        added them.
+
+        Together with count_follower for the pair where two pieces of a text
+        meet, a text can be counted in pieces (in parallel, say) and merged
+        into the same matrix as if it had been counted in one go."""
+        remap = np.empty(other.c, dtype=np.intc)
+        for w, i in other.words.items():
+            remap[i] = self.add_word(w)
+        # Words are added in index order, dicts keep insertion order.
+        self.row.frombytes(remap[np.asarray(other.row, dtype=np.intc)].tobytes())
+        self.col.frombytes(remap[np.asarray(other.col, dtype=np.intc)].tobytes())
+
+    def count_followers_in_ids(self, ids):
+        """Counts every two consecutive word indices in ids, as given by 
+        add_word. ids can be an array("i"), a numpy array or any other 
+        sequence of ints.
+
+        This is the bulk version of count_follower, no Python object is created
+        per pair of words."""
+        ids = np.asarray(ids, dtype=np.intc)
+        if ids.ndim != 1:
+            raise ValueError("ids must be one dimensional.")
+        if len(ids) < 2:
+            return
+        if ids.min() < 0 or ids.max() >= self.c:
+            raise ValueError("ids contains an index that is not a word in the builder.")
+        self.row.frombytes(ids[:-1].tobytes())
+        self.col.frombytes(ids[1:].tobytes())
+
     def count_followers_in_sequence(self, sequence, endmarker=None):
         """Takes an iterable, and for each two words, calls count_follower.
 
@@ -54,32 +87,43 @@ class WordSaladMatrixBuilder():
             >>> builder.count_follower(2, 3)
         """
         it = iter(sequence)
-        prev = next(it)
-        for w in it:
-            self.count_follower(prev, w)
-            prev = w
-        
+        head = list(islice(it, 2))
+        # A lone word has no follower, and is not added, just like with 
+        # count_follower.
+        if len(head) < 1 or (len(head) < 2 and endmarker is None):
+            return
+        ids = array("i", map(self.add_word, chain(head, it)))
         if endmarker is not None:
-            self.count_follower(prev, endmarker)
+            ids.append(self.add_word(endmarker))
+        self.count_followers_in_ids(ids)
         
-    def build_matrix(self):
-        m = coo_matrix((self.data, (self.row, self.col)), shape=(self.c, self.c))
-        m.sum_duplicates()
-        m = m.tocsr()
-        # Get row sums as a row matrix, and convert to float (default is int).        
-        sums = m.sum(axis=1).astype("f")
-        # Get the reciprocal of each element.
-        for i in range(0, sums.shape[0]):
-            if sums[i, 0] > 0.0:
-               sums[i, 0] = 1.0 / sums[i, 0]
-            else:
-                sums[i, 0] = 0.0
-        # Create a diagonal matrix (scales rows on left-multiply) of sums
-        # When we multiply we will normalize each row so it becomes a 
-        # weighted sum instead, and in our case a probability vector for a 
-        # certain word.
-        sums = diags(sums.flat, 0, shape=m.shape)
-        return WordSaladMatrix(sums * m, self.words)
+    def build_matrix(self, start_counts=None):
+        """Builds the matrix. start_counts, if given, is the number of 
+        sentences every word index starts (see split_germanic_ids), and is
+        kept with the matrix as its start words."""
+        from scipy.sparse import csr_matrix, coo_matrix
+        with metrics.timed("build_matrix.seconds"):
+            with metrics.timed("build_matrix.count_seconds"):
+                row = np.asarray(self.row)
+                col = np.asarray(self.col)
+                ones = np.ones(len(row), dtype=np.intc)
+                # Converting to CSR sums the duplicate pairs.
+                m = coo_matrix((ones, (row, col)), shape=(self.c, self.c)).tocsr()
+                m.sum_duplicates()
+            with metrics.timed("build_matrix.normalize_seconds"):
+                # Scaling every element by the reciprocal of its row sum 
+                # normalizes each row so it becomes a weighted sum instead, 
+                # and in our case a probability vector for a certain word.
+                inv = _reciprocals(m.sum(axis=1))
+                data = inv[np.repeat(np.arange(0, self.c), np.diff(m.indptr))] * m.data
+                probs = csr_matrix((data, m.indices, m.indptr), shape=m.shape)
+            starts = None
+            if start_counts is not None:
+                starts = StartSampler.from_counts(start_counts)
+            mat = WordSaladMatrix(probs, self.words.copy(), counts=m.data, starts=starts)
+        if metrics.sink is not None:
+            metrics.sink.count("build_matrix.pairs", len(self.row))
+        return mat
 
 class WordSaladMatrix:
     """The WordSaladMatrix is a matrix (and a table) of "words" and their 
@@ -97,39 +141,102 @@ class WordSaladMatrix:
     
     The underlying matrix is sparse with the motivation that since a structure
     is expected, a great deal of followers will have probability zero.
+
+    wordtoindex maps every word to its row (and column) in freqmatrix. A dict
+    is copied into a Vocabulary, a Vocabulary is used as it is.
+
+    counts, if given, holds the raw number of times each follower was seen, 
+    aligned with the data of freqmatrix which must then be a CSR matrix. It is
+    what lets the matrix be updated with more text (see update.)
+
+    See fromCSR for creating one without scipy.
     """
-    def __init__(self, freqmatrix, wordtoindex):
+    def __init__(self, freqmatrix, wordtoindex, counts=None, starts=None):
+        from scipy.sparse import isspmatrix
         if not isspmatrix(freqmatrix):
             raise TypeError("freqmatrix must be a scipy sparse matrix, is type {}.".format(type(freqmatrix)))
+        if counts is not None and freqmatrix.format != "csr":
+            raise ValueError("counts needs freqmatrix to be a CSR matrix.")
+        self._csr = None
         self.matrix = freqmatrix
-        # Bijection word -> index
-        self.wordtoindex = dict(wordtoindex)
-        # The inverse of the bijection word -> index
-        self.indextoword = {i:w for w,i in self.wordtoindex.items()}
-        if self.matrix.shape[0] != self.matrix.shape[1]:
+        self._setUp(wordtoindex, freqmatrix.shape, freqmatrix.nnz, counts, starts)
+
+    @classmethod
+    def fromCSR(cls, data, indices, indptr, wordtoindex, counts=None, starts=None):
+        """Creates a matrix from the arrays of a CSR matrix, without importing
+        scipy. The scipy matrix is only built when matrix is first used:
+        drawing and generating only need the sampling index, so serving a
+        saved matrix (see load_matrix) never does."""
+        mat = cls.__new__(cls)
+        mat._csr = (np.asarray(data), np.asarray(indices), np.asarray(indptr))
+        mat._matrix = None
+        n = len(indptr) - 1
+        mat._setUp(wordtoindex, (n, n), len(data), counts, starts)
+        return mat
+
+    def _setUp(self, wordtoindex, shape, nnz, counts, starts):
+        self.counts = None
+        if counts is not None:
+            self.counts = np.asarray(counts)
+            if self.counts.shape != (nnz,):
+                raise ValueError("counts does not match the elements of freqmatrix.")
+        # Bijection word <-> index
+        if isinstance(wordtoindex, Vocabulary):
+            self.vocabulary = wordtoindex
+        else:
+            self.vocabulary = Vocabulary.fromMapping(wordtoindex)
+        if shape[0] != shape[1]:
             raise ValueError("Needs a square matrix.")
-        if len(self.wordtoindex) != self.matrix.shape[0]:
+        if len(self.vocabulary) != shape[0]:
             raise ValueError("length of wordtoindex does not match dimension of matrix.")
+        # The weighted start words, a StartSampler, if the matrix has them.
+        self.starts = starts
+        if starts is not None and len(starts) > 0 and int(starts.ids.max()) >= len(self.vocabulary):
+            raise ValueError("starts has a word that is not in the matrix.")
+        self._sampler = None
+        self._modes = ModeCache()
+
+    @property
+    def matrix(self):
+        """The probability matrix, a scipy sparse matrix."""
+        if self._matrix is None:
+            from scipy.sparse import csr_matrix
+            data, indices, indptr = self._csr
+            n = len(indptr) - 1
+            self._matrix = csr_matrix((data, indices, indptr), shape=(n, n), copy=False)
+        return self._matrix
+
+    @matrix.setter
+    def matrix(self, m):
+        self._matrix = m
+
+    def _arrays(self):
+        # The data, indices and indptr of the CSR matrix, without building
+        # matrix if it is not built yet.
+        if self._matrix is None:
+            return self._csr
+        m = self._matrix.tocsr()
+        return m.data, m.indices, m.indptr
     
     def __contains__(self, w):
-        return w in self.wordtoindex
+        return w in self.vocabulary.index
     
     def indexOf(self, w):
-        return self.wordtoindex[w]
+        return self.vocabulary.index[w]
     
     def wordAt(self, i):
-        return self.indextoword[i]
+        return self.vocabulary.words[i]
     
     def wordCount(self):
-        return len(self.wordtoindex)
+        return len(self.vocabulary)
 
     def probability(self, w, f):
         """Returns the probability that a word w is followed by word f."""
-        if w not in self.wordtoindex or f not in self.wordtoindex:
+        if w not in self.vocabulary or f not in self.vocabulary:
             raise ValueError("w or f is not in the matrix.")
         
-        i = self.wordtoindex[w]
-        j = self.wordtoindex[f]
+        i = self.vocabulary.indexOf(w)
+        j = self.vocabulary.indexOf(f)
         return self.matrix[i, j]
     
     def probabilities(self, w):
@@ -137,21 +244,260 @@ class WordSaladMatrix:
         elements as there are words encoded in the matrix.
         
         Each index has a bijective relation to a word."""
-        if w not in self.wordtoindex:
+        if w not in self.vocabulary:
             raise ValueError("w is not in the matrix.")
-        return self.matrix.getrow(self.wordtoindex[w])
+        return self.matrix.getrow(self.vocabulary.indexOf(w))
     
+    def probabilitiesAfter(self, words, k, top=None):
+        """Returns the probability vector of the word reached after k steps,
+        starting from words. Like probabilities, it is a sparse row with as
+        many elements as there are words in the matrix.
+
+        words is either a single word, a mapping of words to weights or an
+        iterable of words, which are weighted equally. The weights are
+        normalized to sum to 1.
+
+        The vector is multiplied by the matrix k times, the matrix itself is
+        never raised to a power or changed. Words without followers end the
+        chain, so their share of the probability is lost and the result can
+        sum to less than 1.
+
+        If top is given, only the top largest probabilities are kept after
+        each step, which bounds the work and memory per step. The result is
+        then an approximation, where the dropped probabilities are lost too.
+
+        Raises ValueError if a word is not in the matrix.
+        """
+        k = int(k)
+        if k < 0:
+            raise ValueError("k must not be negative.")
+        if top is not None:
+            top = int(top)
+            if top < 1:
+                raise ValueError("top must be at least 1.")
+        m = self.matrix.tocsr()
+        v = self._startVector(words)
+        for _ in range(0, k):
+            v = _truncate(v, top)
+            v = v @ m
+            v.eliminate_zeros()
+        return _truncate(v, top)
+
+    def _startVector(self, words):
+        # The normalized start distribution of probabilitiesAfter.
+        try:
+            single = words in self.vocabulary
+        except TypeError:
+            single = False
+        if single:
+            weights = {words: 1.0}
+        elif isinstance(words, Mapping):
+            weights = words
+        elif isinstance(words, (str, bytes)) or not isinstance(words, Iterable):
+            # A single word, not a sequence of characters.
+            raise ValueError("words is not in the matrix.")
+        else:
+            try:
+                weights = dict.fromkeys(words, 1.0)
+            except TypeError:
+                raise ValueError("words is not in the matrix.")
+        if any(w not in self.vocabulary for w in weights):
+            raise ValueError("words are not all in the matrix.")
+        n = len(self.vocabulary)
+        cols = np.fromiter((self.vocabulary.indexOf(w) for w in weights), dtype=np.intc, count=len(weights))
+        data = np.fromiter(weights.values(), dtype=np.float64, count=len(weights))
+        total = data.sum()
+        if total <= 0.0:
+            raise ValueError("words must have a positive total weight.")
+        from scipy.sparse import csr_matrix
+        v = csr_matrix((data / total, (np.zeros_like(cols), cols)), shape=(1, n))
+        v.sum_duplicates()
+        return v
+
+    def setStartWords(self, words):
+        """Keeps the start words with the matrix, weighted by how many times
+        they occur in words (like the start_words of split_germanic.)
+        generate_sentences and generate_batch use them when they are not
+        given any.
+
+        Raises ValueError if a word is not in the matrix."""
+        counts = np.zeros(len(self.vocabulary), dtype=np.int64)
+        index = self.vocabulary.index
+        try:
+            ids = np.fromiter(map(index.__getitem__, words), dtype=np.intp)
+        except KeyError:
+            raise ValueError("words contains a word that is not in the matrix.")
+        np.add.at(counts, ids, 1)
+        self.starts = StartSampler.from_counts(counts)
+
+    def startWords(self):
+        """Returns the distinct start words kept with the matrix, or None."""
+        if self.starts is None:
+            return None
+        return [self.wordAt(i) for i in self.starts.ids.tolist()]
+
+    def sampler(self, mode=None):
+        """Returns the sampling index used to draw followers from the matrix.
+
+        The index is built on first use and kept for the lifetime of the 
+        matrix. With a SamplingMode the index for drawing in that mode is 
+        returned instead (see ModeSampler), the most recently used ones are
+        kept (see ModeCache.)"""
+        if mode is not None and not mode.plain():
+            def build():
+                data, indices, indptr = self._arrays()
+                return ModeSampler(indptr, indices, data, mode)
+            return self._modes.get(mode, build)
+        if self._sampler is None:
+            data, indices, indptr = self._arrays()
+            self._sampler = CumulativeSampler(indptr, indices, data)
+        return self._sampler
+
+    def useAliasSampling(self, threshold=ALIAS_THRESHOLD):
+        """Switches draws from words with more than threshold followers to
+        alias tables, which take constant time however many followers a word
+        has (see AliasSampler.) The followers are drawn with the same
+        probabilities as before. Returns the new sampler."""
+        self._sampler = AliasSampler.from_sampler(self.sampler(), threshold=threshold)
+        return self._sampler
+
+    def update(self, sequence, endmarker=None):
+        """Returns a new matrix with the followers in sequence counted on top
+        of the ones in this matrix, the way count_followers_in_sequence of 
+        WordSaladMatrixBuilder counts them.
+
+        New words are added after the existing ones, which keep their indices.
+        Only rows of words that got new followers are normalized again, the 
+        others (and their part of the sampling index, if built) are copied.
+
+        This matrix is left as it is, so it can keep being used while the new 
+        one is built. See WordSaladMatrixReference for swapping them.
+
+        Raises ValueError if the matrix was not created with counts.
+        """
+        if self.counts is None:
+            raise ValueError("The matrix has no counts and can't be updated.")
+        from scipy.sparse import csr_matrix, coo_matrix
+        words = self.vocabulary.copy()
+        it = iter(sequence)
+        head = list(islice(it, 2))
+        if len(head) < 1 or (len(head) < 2 and endmarker is None):
+            return self
+        ids = array("i", map(words.add, chain(head, it)))
+        if endmarker is not None:
+            ids.append(words.add(endmarker))
+        ids = np.asarray(ids)
+
+        m = self.matrix
+        n0 = m.shape[0]
+        n = len(words)
+        indptr = np.concatenate((m.indptr, np.full(n - n0, m.indptr[-1], dtype=m.indptr.dtype)))
+        old = csr_matrix((self.counts, m.indices, indptr), shape=(n, n))
+        delta = coo_matrix((np.ones(len(ids) - 1, dtype=self.counts.dtype), (ids[:-1], ids[1:])), shape=(n, n)).tocsr()
+        counts = old + delta
+        counts.sum_duplicates()
+
+        changed = np.zeros(n, dtype=bool)
+        changed[ids[:-1]] = True
+        if not m.has_sorted_indices:
+            # Unchanged rows can only be copied if their elements keep their 
+            # order in the sum.
+            changed[:] = True
+        rows = np.repeat(np.arange(0, n), np.diff(counts.indptr))
+        fresh = changed[rows]
+        kept = ~changed[np.repeat(np.arange(0, n0), np.diff(m.indptr))]
+
+        data = np.empty(counts.nnz, dtype="d")
+        data[~fresh] = m.data[kept]
+        inv = _reciprocals(np.bincount(rows[fresh], weights=counts.data[fresh], minlength=n))
+        data[fresh] = inv[rows[fresh]] * counts.data[fresh]
+        probs = csr_matrix((data, counts.indices, counts.indptr), shape=(n, n))
+        res = WordSaladMatrix(probs, words, counts=counts.data, starts=self.starts)
+
+        if self._sampler is not None:
+            cumulative = np.empty(counts.nnz, dtype="d")
+            cumulative[~fresh] = self._sampler.cumulative[kept]
+            sub = np.zeros(np.count_nonzero(changed) + 1, dtype=np.int64)
+            np.cumsum(np.diff(counts.indptr)[changed], out=sub[1:])
+            cumulative[fresh] = _row_cumsum(sub, data[fresh])
+            res._sampler = CumulativeSampler(probs.indptr, probs.indices, probs.data, cumulative=cumulative)
+            if isinstance(self._sampler, AliasSampler):
+                old = self._sampler
+                res._sampler = AliasSampler.from_sampler(res._sampler, old.threshold, old.low, old.high)
+        return res
+
+    def save(self, path, keys=False):
+        """Writes the matrix to a file, see wordsalad.serialization."""
+        from .serialization import save_matrix
+        save_matrix(self, path, keys=keys)
+
+    @staticmethod
+    def load(path, mmap=True):
+        """Reads a matrix written by save. With mmap=True the file is memory 
+        mapped, so processes loading the same file share its memory."""
+        from .serialization import load_matrix
+        return load_matrix(path, mmap=mmap)
+
     def power(self, n):
         """Raises the probability matrix by integer n.
         
         This can be used to find out what the probabilities are after n words.
         
         This is usually pretty CPU-intensive, depending on the size of the 
-        matrix.
+        matrix, and the matrix is changed in place. probabilitiesAfter answers
+        the same question for given words without either problem.
         """
         n = int(n)
         self.matrix **= n
+        self._csr = None
+        self._sampler = None
+        self._modes = ModeCache()
+        # The counts no longer describe the matrix.
+        self.counts = None
   
     def __repr__(self):
-        return "<WordSaladMatrix with matrix shape {}>".format(self.matrix.shape)
+        n = len(self.vocabulary)
+        return "<WordSaladMatrix with matrix shape {}>".format((n, n))
+
+class WordSaladMatrixReference:
+    """Holds the current version of a matrix that is being updated while other
+    threads use it.
+
+    Readers call get once and use what they got for as long as they need to,
+    it never changes underneath them. Updates build a new matrix (see 
+    WordSaladMatrix.update) and swap it in, one at a time.
+    """
+    def __init__(self, mat):
+        self._mat = mat
+        self._lock = threading.Lock()
+
+    def get(self):
+        return self._mat
+
+    def set(self, mat):
+        with self._lock:
+            self._mat = mat
+
+    def update(self, sequence, endmarker=None):
+        """Updates the current matrix with sequence and swaps in the result, 
+        which is returned."""
+        with self._lock:
+            self._mat = self._mat.update(sequence, endmarker=endmarker)
+            return self._mat
+
+def _truncate(v, top):
+    # Keeps the top largest elements of the sparse row v.
+    if top is None or v.nnz <= top:
+        return v
+    from scipy.sparse import csr_matrix
+    keep = np.sort(np.argpartition(v.data, len(v.data) - top)[len(v.data) - top:])
+    return csr_matrix((v.data[keep], v.indices[keep], [0, top]), shape=v.shape)
+
+def _reciprocals(sums):
+    # The reciprocal of each row sum, zero for words without followers. Sums
+    # are taken as 32 bit floats, the result is a 64 bit float array.
+    sums = np.asarray(sums, dtype="f").ravel()
+    inv = np.zeros_like(sums)
+    np.divide(1.0, sums, out=inv, where=sums > 0.0)
+    return inv.astype("d")
 
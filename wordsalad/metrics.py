@@ -0,0 +1,133 @@
+"""Optional counters and histograms for the hot paths of wordsalad.
+
+Nothing is recorded until a sink is set with set_sink. A sink is any object
+with two methods:
+
+    count(name, n=1)        Adds n to the counter name.
+    observe(name, value)    Adds value to the histogram name.
+
+MemorySink keeps them in memory. The instrumented functions look the sink up
+once per call, and take the same path as without instrumentation when there
+is none, so leaving it unset costs nothing measurable.
+
+Names are dotted, the function first: "generate_sentences.length",
+"build_matrix.normalize_seconds"... Names ending in "_seconds" are durations.
+"""
+from bisect import bisect_left
+from contextlib import contextmanager
+import threading
+import time
+
+# The current sink, None when disabled. Read it with metrics.sink, not with
+# from-imports, so set_sink is seen everywhere.
+sink = None
+
+# Histogram buckets: durations from a microsecond to 10 seconds, and anything
+# else (mostly lengths) in powers of two.
+SECONDS_BUCKETS = tuple(m * 10.0 ** e for e in range(-6, 1) for m in (1, 2.5, 5)) + (10.0,)
+COUNT_BUCKETS = tuple(float(1 << i) for i in range(0, 17))
+
+def set_sink(new):
+    """Sets the sink that records metrics, None disables them. Returns the
+    previous sink."""
+    global sink
+    old = sink
+    sink = new
+    return old
+
+def enabled():
+    return sink is not None
+
+@contextmanager
+def timed(name):
+    """Observes the time spent in the block as name, if a sink is set.
+
+    Meant for things that run once per call, not per word."""
+    s = sink
+    if s is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        s.observe(name, time.perf_counter() - start)
+
+class Histogram:
+    """Counts of values at or below each bound, like a Prometheus histogram,
+    and the sum and count of all values."""
+    def __init__(self, bounds):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self):
+        cumulative = []
+        total = 0
+        for bound, c in zip(self.bounds + (float("inf"),), self.counts):
+            total += c
+            cumulative.append((bound, total))
+        return {"buckets": cumulative, "sum": self.sum, "count": self.count}
+
+class MemorySink:
+    """A sink that keeps counters and histograms in memory, safe to use from
+    several threads."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, name, value):
+        with self._lock:
+            h = self.histograms.get(name)
+            if h is None:
+                h = self.histograms[name] = Histogram(
+                    SECONDS_BUCKETS if name.endswith("_seconds") else COUNT_BUCKETS)
+            h.observe(value)
+
+    def snapshot(self):
+        """Returns the counters and histograms as a dict."""
+        with self._lock:
+            return {
+                "counters": dict(self.counters),
+                "histograms": {name: h.snapshot() for name, h in self.histograms.items()},
+            }
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def prometheus(self, prefix="wordsalad_"):
+        """Returns the metrics in the Prometheus text format."""
+        return prometheus_text(self.snapshot(), prefix=prefix)
+
+def prometheus_text(snapshot, prefix="wordsalad_"):
+    """Formats a snapshot of MemorySink in the Prometheus text format."""
+    lines = []
+    for name, value in sorted(snapshot["counters"].items()):
+        name = _metric_name(prefix, name)
+        lines.append("# TYPE {} counter".format(name))
+        lines.append("{} {}".format(name, value))
+    for name, h in sorted(snapshot["histograms"].items()):
+        name = _metric_name(prefix, name)
+        lines.append("# TYPE {} histogram".format(name))
+        for bound, c in h["buckets"]:
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append('{}_bucket{{le="{}"}} {}'.format(name, le, c))
+        lines.append("{}_sum {}".format(name, h["sum"]))
+        lines.append("{}_count {}".format(name, h["count"]))
+    return "\n".join(lines) + "\n"
+
+def _metric_name(prefix, name):
+    return prefix + "".join(c if c.isalnum() else "_" for c in name)
@@ -0,0 +1,234 @@
+from .sampling import CumulativeSampler, AliasSampler, ModeCache, ModeSampler, ALIAS_THRESHOLD
+from .matrix import _reciprocals
+from .vocabulary import Vocabulary
+from array import array
+import numpy as np
+
+# Constants of 64 bit FNV-1a, used to hash contexts that can't be packed.
+_FNV_OFFSET = 14695981039346656037
+_FNV_PRIME = 1099511628211
+_MASK = (1 << 64) - 1
+
+class WordSaladNGramMatrixBuilder():
+    """Constructs a WordSaladNGramMatrix, a Markov chain where the next word
+    depends on the previous order words instead of just the last one.
+
+    Words are added one sequence at a time, and kept as arrays of word
+    indices until build_matrix is called. Contexts (order consecutive words)
+    are never stored as Python tuples.
+    """
+    def __init__(self, order=2):
+        order = int(order)
+        if order < 1:
+            raise ValueError("order must be at least 1.")
+        self.order = order
+        self.words = Vocabulary()
+        self.sequences = []
+
+    @property
+    def c(self):
+        """The number of words added so far."""
+        return len(self.words)
+
+    def add_word(self, w):
+        return self.words.add(w)
+
+    def count_followers_in_sequence(self, sequence, endmarker=None):
+        """Counts, for every order consecutive words in the sequence, the word
+        that follows them.
+
+        If endmarker is not None it is added after the last word. Sequences
+        shorter than order are ignored.
+        """
+        ids = array("i", map(self.add_word, sequence))
+        if endmarker is not None:
+            ids.append(self.add_word(endmarker))
+        if len(ids) >= self.order:
+            self.sequences.append(np.array(ids, dtype=np.int32))
+
+    def build_matrix(self):
+        k = self.order
+        windows = [np.lib.stride_tricks.sliding_window_view(ids, k) for ids in self.sequences]
+        windows = np.concatenate(windows) if len(windows) > 0 else np.zeros((0, k), dtype=np.int32)
+        contexts, ctx = np.unique(windows, axis=0, return_inverse=True)
+        ctx = ctx.ravel()
+
+        # Order the contexts by key, which is what lookups search.
+        keys = _context_keys(contexts, self.c)
+        order = np.argsort(keys, kind="stable")
+        rank = np.empty_like(order)
+        rank[order] = np.arange(0, len(order))
+        contexts = contexts[order]
+        keys = keys[order]
+        ctx = rank[ctx]
+
+        # Every window but the last of each sequence is followed by a word,
+        # and by the window one step further along.
+        ends = np.cumsum([len(ids) - k + 1 for ids in self.sequences], dtype=np.int64)
+        has_next = np.ones(len(windows), dtype=bool)
+        has_next[ends - 1] = False
+        followers = [ids[k:] for ids in self.sequences]
+        followers = np.concatenate(followers) if len(followers) > 0 else np.zeros(0, dtype=np.int32)
+        row = ctx[has_next]
+        nxt = ctx[np.flatnonzero(has_next) + 1]
+
+        # Count each (context, follower) pair, sorted by context then follower.
+        pairs, first, counts = np.unique(
+            row.astype(np.int64) * max(self.c, 1) + followers,
+            return_index=True, return_counts=True)
+        prow = pairs // max(self.c, 1)
+        pcol = pairs % max(self.c, 1)
+        indptr = np.zeros(len(contexts) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(prow, minlength=len(contexts)), out=indptr[1:])
+
+        sums = np.bincount(prow, weights=counts, minlength=len(contexts))
+        data = _reciprocals(sums)[prow] * counts
+        from scipy.sparse import csr_matrix
+        m = csr_matrix((data, pcol, indptr), shape=(len(contexts), self.c))
+
+        return WordSaladNGramMatrix(m, self.words.copy(), contexts, keys, nxt[first])
+
+class WordSaladNGramMatrix:
+    """A Markov chain of order k, where the probability of a word depends on
+    the k words before it (its context.)
+
+    Contexts are kept as rows of word indices in a numpy array, ordered by a
+    packed 64 bit key, and looked up with a binary search. The matrix has one
+    row per context seen in the corpus and one column per word. For every
+    non-zero element, the context that follows is stored too, so walking the
+    chain never needs to look a context up.
+
+    Contexts are tuples of k words where they are given or returned, so they
+    can be used with draw_follower, chain and generate_sentences just like the
+    words of a WordSaladMatrix. chain yields the words of the start context
+    and then one word per step.
+    """
+    def __init__(self, freqmatrix, words, contexts, keys, successors):
+        self.matrix = freqmatrix.tocsr()
+        self.vocabulary = words if isinstance(words, Vocabulary) else Vocabulary(words)
+        self.contexts = np.asarray(contexts, dtype=np.int32)
+        self.keys = np.asarray(keys, dtype=np.uint64)
+        self.successors = np.asarray(successors, dtype=np.int32)
+        self.order = self.contexts.shape[1]
+        if self.matrix.shape != (len(self.contexts), len(self.vocabulary)):
+            raise ValueError("Matrix shape does not match the contexts and words.")
+        if len(self.successors) != self.matrix.nnz:
+            raise ValueError("Needs one successor per matrix element.")
+        self._successors = memoryview(self.successors)
+        self._sampler = None
+        self._modes = ModeCache()
+
+    def _contextIds(self, context):
+        try:
+            ids = [self.vocabulary.index[w] for w in context]
+        except (KeyError, TypeError):
+            return None
+        if len(ids) != self.order:
+            return None
+        return ids
+
+    def _find(self, context):
+        ids = self._contextIds(context)
+        if ids is None:
+            return -1
+        key = np.uint64(_context_key(ids, len(self.vocabulary)))
+        lo = np.searchsorted(self.keys, key, side="left")
+        hi = np.searchsorted(self.keys, key, side="right")
+        # Equal keys only happen for hashed contexts.
+        for i in range(lo, hi):
+            if self.contexts[i].tolist() == ids:
+                return int(i)
+        return -1
+
+    def __contains__(self, context):
+        return self._find(context) != -1
+
+    def indexOf(self, context):
+        i = self._find(context)
+        if i == -1:
+            raise KeyError(context)
+        return i
+
+    def contextAt(self, i):
+        words = self.vocabulary.words
+        return tuple(words[j] for j in self.contexts[i].tolist())
+
+    def wordAt(self, i):
+        return self.vocabulary.words[i]
+
+    def wordCount(self):
+        return len(self.vocabulary)
+
+    def contextCount(self):
+        return len(self.contexts)
+
+    def successor(self, position):
+        """Returns the context that follows when the element at position in the
+        CSR arrays of the matrix is drawn."""
+        return self._successors[position]
+
+    def startContexts(self, words):
+        """Returns all contexts that start with one of the given words, for
+        instance the start words collected by split_germanic."""
+        ids = [self.vocabulary.indexOf(w) for w in words if w in self.vocabulary]
+        rows = np.flatnonzero(np.isin(self.contexts[:, 0], ids))
+        return [self.contextAt(i) for i in rows]
+
+    def probability(self, context, f):
+        """Returns the probability that context is followed by word f."""
+        if context not in self or f not in self.vocabulary:
+            raise ValueError("context or f is not in the matrix.")
+        return self.matrix[self.indexOf(context), self.vocabulary.indexOf(f)]
+
+    def probabilities(self, context):
+        """Returns the probability vector of the words following context."""
+        if context not in self:
+            raise ValueError("context is not in the matrix.")
+        return self.matrix.getrow(self.indexOf(context))
+
+    def sampler(self, mode=None):
+        """Returns the sampling index of the matrix, see
+        WordSaladMatrix.sampler."""
+        if mode is not None and not mode.plain():
+            return self._modes.get(mode, lambda: ModeSampler.from_matrix(self.matrix, mode))
+        if self._sampler is None:
+            self._sampler = CumulativeSampler.from_matrix(self.matrix)
+        return self._sampler
+
+    def useAliasSampling(self, threshold=ALIAS_THRESHOLD):
+        """See WordSaladMatrix.useAliasSampling."""
+        self._sampler = AliasSampler.from_sampler(self.sampler(), threshold=threshold)
+        return self._sampler
+
+    def __repr__(self):
+        return "<WordSaladNGramMatrix of order {} with matrix shape {}>".format(self.order, self.matrix.shape)
+
+def _packable(n, k):
+    # Whether k indices below n fit in one 64 bit key.
+    return max(n, 1) ** k <= _MASK
+
+def _context_keys(contexts, n):
+    # Mixed radix packing when it fits in 64 bits, otherwise a hash.
+    contexts = contexts.astype(np.uint64)
+    k = contexts.shape[1]
+    if _packable(n, k):
+        keys = np.zeros(len(contexts), dtype=np.uint64)
+        for t in range(0, k):
+            keys = keys * np.uint64(max(n, 1)) + contexts[:, t]
+        return keys
+    keys = np.full(len(contexts), _FNV_OFFSET, dtype=np.uint64)
+    for t in range(0, k):
+        keys = (keys ^ contexts[:, t]) * np.uint64(_FNV_PRIME)
+    return keys
+
+def _context_key(ids, n):
+    # The same as _context_keys, for one context.
+    if _packable(n, len(ids)):
+        key = 0
+        for i in ids:
+            key = key * max(n, 1) + i
+        return key
+    key = _FNV_OFFSET
+    for i in ids:
+        key = ((key ^ i) * _FNV_PRIME) & _MASK
+    return key
@@ -0,0 +1,242 @@
+from .matrix import WordSaladMatrix, WordSaladMatrixBuilder
+from .generators import generate_batch
+from .input import split_germanic_ids
+from .serialization import load_matrix, save_matrix
+from .utils import join_germanic_many
+from . import streams
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import io
+import numpy as np
+import os
+import shutil
+import string
+import tempfile
+
+# How far past a split point we look for a sentence boundary at a time.
+_SCAN_SIZE = 1 << 16
+
+def build_parallel(paths, processes=None, shards=None, encoding="utf-8", whitespace=string.whitespace, punctuation=string.punctuation, sentence_end=".?!"):
+    """Tokenises (with split_germanic) and counts one or more text files on a
+    pool of processes, and builds a single WordSaladMatrix from the counts.
+
+    Every file is split into byte ranges that end on a sentence boundary,
+    shards ranges in total (by default one per process), and each range is
+    counted by a worker into its own WordSaladMatrixBuilder. The builders are
+    merged in order, and the pair of words where two ranges of the same file
+    meet is counted, so the result is the same as counting each file with
+    count_followers_in_sequence in one process. Files are counted as separate
+    sequences, no follower is counted across them.
+
+    Splitting needs a sentence_end character that is also in punctuation, and
+    a whitespace character, that are ASCII. The encoding should be one where
+    ASCII characters are single bytes, like UTF-8. Otherwise each file is
+    counted as a whole.
+
+    Returns the matrix, with the start words split_germanic would have found
+    kept with it (see WordSaladMatrix.setStartWords.)
+    """
+    if isinstance(paths, (str, bytes, os.PathLike)):
+        paths = [paths]
+    paths = list(paths)
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if shards is None:
+        shards = processes
+    split_args = {"whitespace": whitespace, "punctuation": punctuation, "sentence_end": sentence_end}
+
+    sizes = [os.path.getsize(p) for p in paths]
+    total = max(sum(sizes), 1)
+    tasks = []
+    for p, size in zip(paths, sizes):
+        # Every file gets its share of the shards, but at least one.
+        n = max(1, round(shards * size / total))
+        points = split_points(p, n, whitespace, punctuation, sentence_end)
+        for begin, end in zip([0] + points, points + [size]):
+            tasks.append((p, begin, end, encoding, split_args))
+
+    builder = WordSaladMatrixBuilder()
+    # How many sentences every start word starts.
+    starts = {}
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        results = pool.map(_count_range, tasks)
+        # The words of the previous range in the same file, the number of
+        # words in the file so far, and pieces waiting for the first word of
+        # the file to be followed.
+        prevpath = None
+        for (p, begin, end, _, _), (part, first, last, n, partstarts) in zip(tasks, results):
+            if p != prevpath:
+                prevpath, prevlast, count, pending = p, None, 0, None
+            for w, k in zip(*partstarts):
+                starts[w] = starts.get(w, 0) + k
+            if n == 0:
+                continue
+            count += n
+            if count == 1:
+                # A lone word is not counted unless something follows it.
+                pending, prevlast = part, last
+                continue
+            if pending is not None:
+                builder.merge(pending)
+                pending = None
+            builder.merge(part)
+            if prevlast is not None:
+                builder.count_follower(prevlast, first)
+            prevlast = last
+    # A lone word that nothing follows or is followed by is not a word of the
+    # matrix, and can't start anything.
+    start_counts = np.zeros(builder.c, dtype=np.int64)
+    for w, k in starts.items():
+        i = builder.words.index.get(w)
+        if i is not None:
+            start_counts[i] += k
+    return builder.build_matrix(start_counts=start_counts)
+
+def split_points(path, n, whitespace=string.whitespace, punctuation=string.punctuation, sentence_end=".?!"):
+    """Returns up to n - 1 byte offsets that split the file at path into n
+    roughly equal ranges. Each offset is right after a whitespace character
+    that follows a sentence end, so no word or sentence is split."""
+    ws = bytes(c for c in map(ord, str(whitespace)) if c < 128)
+    ends = bytes(c for c in map(ord, set(sentence_end) & set(punctuation)) if c < 128 and chr(c) not in str(whitespace))
+    if n < 2 or ws == b"" or ends == b"":
+        return []
+    size = os.path.getsize(path)
+    points = []
+    with open(path, "rb") as f:
+        for k in range(1, n):
+            p = _boundary_after(f, max(k * size // n, points[-1] if points else 0), ws, ends)
+            if p is None or p >= size:
+                break
+            if not points or p > points[-1]:
+                points.append(p)
+    return points
+
+def _boundary_after(f, offset, ws, ends):
+    # The first offset at or after offset that follows a sentence end and a
+    # whitespace byte.
+    pos = max(offset - 2, 0)
+    while True:
+        f.seek(pos)
+        buf = f.read(_SCAN_SIZE + 2)
+        if len(buf) < 2:
+            return None
+        for i in range(2, len(buf) + 1):
+            if pos + i >= offset and buf[i - 1] in ws and buf[i - 2] in ends:
+                return pos + i
+        if len(buf) < _SCAN_SIZE + 2:
+            return None
+        pos += _SCAN_SIZE
+
+def _count_range(task):
+    # Runs in a worker. Counts the followers in one byte range of a file.
+    path, begin, end, encoding, split_args = task
+    with open(path, "rb") as f:
+        f.seek(begin)
+        data = f.read(end - begin)
+    text = io.TextIOWrapper(io.BytesIO(data), encoding=encoding)
+    builder = WordSaladMatrixBuilder()
+    ids, start_counts = split_germanic_ids(text, builder.words, **split_args)
+    builder.count_followers_in_ids(ids)
+    # Only the distinct start words and their counts are sent back.
+    firsts = np.flatnonzero(start_counts)
+    starts = ([builder.words.wordAt(i) for i in firsts.tolist()], start_counts[firsts].tolist())
+    if len(ids) == 0:
+        return builder, None, None, 0, starts
+    return builder, builder.words.wordAt(ids[0]), builder.words.wordAt(ids[-1]), len(ids), starts
+
+def generate_parallel(model, n, start_words, out, processes=None, chunk=10000, seed=None, ordered=True, stops=[], max_length=None, sep="\n", mode=None):
+    """Generates n salads with generate_batch on a pool of processes, joins
+    them with join_germanic and writes them to out, separated by sep.
+
+    model is a WordSaladMatrix or the path of one saved with save_matrix,
+    preferably with keys=True. A matrix is saved to a temporary file first.
+    Every worker maps the file (see load_matrix) once, so the processes share
+    one copy of the arrays and only the start words and the tasks are sent to
+    them.
+
+    The salads are generated chunk at a time, each chunk from its own stream
+    spawned from seed (see wordsalad.streams.) If ordered is True chunks are
+    written in order, and the same int seed gives the same output whatever
+    the number of processes. Otherwise chunks are written as soon as they
+    are done, which keeps all workers busy when some chunks are slow.
+
+    start_words is a list of words, or None to use the start words saved
+    with the model (see WordSaladMatrix.setStartWords), which then are not
+    sent to the workers at all. mode is a SamplingMode, every worker builds
+    its index once.
+
+    out is a file name or anything with a write method. Returns the number of
+    salads written.
+    """
+    n = int(n)
+    chunk = max(int(chunk), 1)
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if start_words is not None:
+        start_words = list(start_words)
+        if len(start_words) < 1:
+            raise ValueError("Empty start_words sequence.")
+
+    directory = None
+    if isinstance(model, WordSaladMatrix):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, "model.wsalad")
+        save_matrix(model, path, keys=True)
+    else:
+        path = os.fspath(model)
+
+    close = False
+    if isinstance(out, (str, bytes, os.PathLike)):
+        out = open(out, "w", encoding="utf-8")
+        close = True
+    try:
+        counts = [min(chunk, n - done) for done in range(0, max(n, 0), chunk)]
+        tasks = zip(counts, streams.spawn(seed, len(counts)))
+        options = (start_words, stops, max_length, sep, mode)
+        with ProcessPoolExecutor(max_workers=processes, initializer=_attach, initargs=(path, options)) as pool:
+            first = True
+            for text in _results(pool, tasks, 2 * processes, ordered):
+                if not first:
+                    out.write(sep)
+                first = False
+                out.write(text)
+    finally:
+        if close:
+            out.close()
+        if directory is not None:
+            shutil.rmtree(directory, ignore_errors=True)
+    return max(n, 0)
+
+def _results(pool, tasks, window, ordered):
+    # Yields the results of _generate_chunk for tasks, with at most window of
+    # them submitted at a time.
+    pending = deque()
+    for task in tasks:
+        pending.append(pool.submit(_generate_chunk, task))
+        if len(pending) >= window:
+            yield from _collect(pending, ordered)
+    while pending:
+        yield from _collect(pending, ordered)
+
+def _collect(pending, ordered):
+    if ordered:
+        yield pending.popleft().result()
+        return
+    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+    for f in done:
+        pending.remove(f)
+        yield f.result()
+
+# The model and options of a worker of generate_parallel.
+_worker = None
+
+def _attach(path, options):
+    # Runs once in every worker.
+    global _worker
+    _worker = (load_matrix(path, mmap=True), options)
+
+def _generate_chunk(task):
+    count, rng = task
+    mat, (start_words, stops, max_length, sep, mode) = _worker
+    salads = generate_batch(mat, count, start_words, rng=rng, stops=stops, max_length=max_length, join=list, mode=mode)
+    return join_germanic_many(salads, sep=sep)
@@ -0,0 +1,152 @@
+"""A pool of salads generated ahead of time, for serving small requests from
+a few busy corpora without generating anything while they wait.
+
+A SaladPool keeps up to depth finished salads (strings) in a ring buffer. A
+background thread tops it up whenever it falls batch salads below depth, and
+take pops salads off the front, generating whatever the pool cannot cover on
+the spot.
+"""
+from collections import deque
+import threading
+import time
+
+from . import metrics
+
+class SaladPool:
+    """Salads generated ahead of time by a background thread.
+
+    generate is called with a number n and returns a list of n salads. The
+    pool's thread calls it to fill the pool up to depth whenever there is room
+    for at least batch salads, and take calls it for the salads the pool runs
+    out of.
+
+        pool = SaladPool(lambda n: [join_germanic(s) for s in generate_batch(mat, n, join=list)], 1000)
+        pool.start()
+        salads = pool.take(5)
+
+    If generate raises in the thread the error is counted and it tries again
+    after retry seconds.
+    """
+    def __init__(self, generate, depth, batch=64, retry=1.0, name=None):
+        depth = int(depth)
+        if depth < 1:
+            raise ValueError("depth must be at least 1.")
+        self.generate = generate
+        self.depth = depth
+        self.batch = max(1, min(int(batch), depth))
+        self.retry = retry
+        self.name = name
+        self._salads = deque(maxlen=depth)
+        self._changed = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        self._started = None
+        self.refilled = 0
+        self.drained = 0
+        self.on_demand = 0
+        self.errors = 0
+        self.refill_seconds = 0.0
+
+    def start(self):
+        """Starts the thread that fills the pool, if it is not running."""
+        with self._changed:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._started = time.monotonic()
+            self._thread = threading.Thread(target=self._fill, daemon=True,
+                name="SaladPool-{}".format(self.name) if self.name else None)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        """Stops the thread, after the batch it is generating. The salads in
+        the pool stay there."""
+        with self._changed:
+            thread = self._thread
+            self._stopping = True
+            self._changed.notify_all()
+        if thread is not None:
+            thread.join(timeout)
+        with self._changed:
+            self._thread = None
+
+    def running(self):
+        return self._thread is not None
+
+    def take(self, n):
+        """Returns n salads, from the pool as far as it has any and the rest
+        generated now."""
+        n = int(n)
+        with self._changed:
+            k = min(n, len(self._salads))
+            popleft = self._salads.popleft
+            salads = [popleft() for i in range(0, k)]
+            self.drained += k
+            if k > 0:
+                self._changed.notify()
+        if k < n:
+            salads.extend(self.generate(n - k))
+            with self._changed:
+                self.on_demand += n - k
+        sink = metrics.sink
+        if sink is not None:
+            sink.count("salad_pool.drained", k)
+            sink.count("salad_pool.on_demand", n - k)
+        return salads
+
+    def wait(self, n=None, timeout=None):
+        """Waits until the pool holds at least n salads (all of depth by
+        default.) Returns whether it does."""
+        n = self.depth if n is None else min(int(n), self.depth)
+        with self._changed:
+            return self._changed.wait_for(lambda: len(self._salads) >= n, timeout)
+
+    def __len__(self):
+        return len(self._salads)
+
+    def stats(self):
+        """Returns the counters as a dict. The rates are salads per second
+        since the pool was started."""
+        with self._changed:
+            elapsed = time.monotonic() - self._started if self._started is not None else 0.0
+            return {
+                "size": len(self._salads),
+                "depth": self.depth,
+                "refilled": self.refilled,
+                "drained": self.drained,
+                "on_demand": self.on_demand,
+                "errors": self.errors,
+                "refill_seconds": self.refill_seconds,
+                "refill_rate": self.refilled / elapsed if elapsed > 0 else 0.0,
+                "drain_rate": self.drained / elapsed if elapsed > 0 else 0.0,
+            }
+
+    def __repr__(self):
+        return "<SaladPool {} of {} salads>".format(len(self._salads), self.depth)
+
+    def _fill(self):
+        while True:
+            with self._changed:
+                self._changed.wait_for(
+                    lambda: self._stopping or len(self._salads) + self.batch <= self.depth)
+                if self._stopping:
+                    return
+                n = self.depth - len(self._salads)
+            start = time.perf_counter()
+            try:
+                salads = self.generate(n)
+            except Exception:
+                with self._changed:
+                    self.errors += 1
+                    self._changed.wait_for(lambda: self._stopping, self.retry)
+                continue
+            seconds = time.perf_counter() - start
+            with self._changed:
+                self._salads.extend(salads)
+                self.refilled += len(salads)
+                self.refill_seconds += seconds
+                self._changed.notify_all()
+            sink = metrics.sink
+            if sink is not None:
+                sink.count("salad_pool.refilled", len(salads))
+                sink.observe("salad_pool.refill_seconds", seconds)
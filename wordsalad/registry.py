@@ -0,0 +1,175 @@
+from collections import OrderedDict
+from concurrent.futures import Future
+import numpy as np
+import sys
+import threading
+
+class ModelRegistry:
+    """Loads models by name when they are first asked for, and keeps the most
+    recently used ones.
+
+    loader is called with a name and returns the model, or raises. sizeof
+    returns the size of a model in bytes (model_nbytes by default.) When the
+    loaded models are larger than max_bytes in total, or more than max_models
+    of them are loaded, the least recently used ones are dropped until they
+    fit, except the one just loaded. None means no limit.
+
+    Models are loaded outside the lock. If several threads ask for a model
+    that is being loaded they all wait for the same load, the loader is only
+    called once. A failed load is not remembered, the next get tries again.
+
+    A model that is dropped stays usable for whoever already got it, it is
+    only forgotten by the registry.
+    """
+    def __init__(self, loader, max_bytes=None, max_models=None, sizeof=None):
+        self.loader = loader
+        self.max_bytes = max_bytes
+        self.max_models = max_models
+        self.sizeof = sizeof if sizeof is not None else model_nbytes
+        self._models = OrderedDict()
+        self._loading = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.failures = 0
+
+    def get(self, name):
+        """Returns the model called name, loading it if needed."""
+        with self._lock:
+            entry = self._models.get(name)
+            if entry is not None:
+                self._models.move_to_end(name)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            future = self._loading.get(name)
+            owner = future is None
+            if owner:
+                future = self._loading[name] = Future()
+        if not owner:
+            return future.result()
+
+        try:
+            model = self.loader(name)
+            size = int(self.sizeof(model))
+        except BaseException as e:
+            with self._lock:
+                del self._loading[name]
+                self.failures += 1
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._loading[name]
+            self._models[name] = (model, size)
+            self._bytes += size
+            self._shrink()
+        future.set_result(model)
+        return model
+
+    def put(self, name, model):
+        """Adds (or replaces) a model that was loaded some other way."""
+        size = int(self.sizeof(model))
+        with self._lock:
+            self._drop(name)
+            self._models[name] = (model, size)
+            self._bytes += size
+            self._shrink()
+
+    def evict(self, name):
+        """Forgets the model called name, returns whether it was loaded."""
+        with self._lock:
+            if name not in self._models:
+                return False
+            self._drop(name)
+            self.evictions += 1
+            return True
+
+    def clear(self):
+        with self._lock:
+            self.evictions += len(self._models)
+            self._models.clear()
+            self._bytes = 0
+
+    def names(self):
+        """Returns the names of the loaded models, least recently used first."""
+        with self._lock:
+            return list(self._models)
+
+    def stats(self):
+        """Returns the counters and the current size as a dict."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "failures": self.failures,
+                "models": len(self._models),
+                "bytes": self._bytes,
+            }
+
+    def __contains__(self, name):
+        with self._lock:
+            return name in self._models
+
+    def __len__(self):
+        with self._lock:
+            return len(self._models)
+
+    def __repr__(self):
+        return "<ModelRegistry with {} models in {} bytes>".format(len(self._models), self._bytes)
+
+    def _drop(self, name):
+        entry = self._models.pop(name, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def _shrink(self):
+        # Drops the least recently used models until the limits are met, but
+        # never the most recently used.
+        while len(self._models) > 1 and (
+                (self.max_bytes is not None and self._bytes > self.max_bytes) or
+                (self.max_models is not None and len(self._models) > self.max_models)):
+            name = next(iter(self._models))
+            self._drop(name)
+            self.evictions += 1
+
+def model_nbytes(model):
+    """Estimates the memory used by a model: the arrays of a WordSaladMatrix or
+    WordSaladNGramMatrix, with its sampling indices if built, and its words.
+
+    A tuple or list (like a matrix and its start words) is the sum of its
+    elements."""
+    if isinstance(model, (tuple, list)):
+        return sum(model_nbytes(m) for m in model) + sys.getsizeof(model)
+    if isinstance(model, np.ndarray):
+        return model.nbytes
+    if isinstance(model, str):
+        return sys.getsizeof(model)
+    if not hasattr(model, "vocabulary") or not hasattr(model, "_sampler"):
+        return sys.getsizeof(model)
+    # The arrays, each once: samplers share some with the matrix. A compact
+    # matrix that has not built its matrix yet has none.
+    m = model.__dict__.get("matrix", model.__dict__.get("_matrix"))
+    arrays = list(model.__dict__.get("_csr") or [])
+    if m is not None:
+        arrays += [m.data, m.indices, m.indptr]
+    for name in ["counts", "contexts", "keys", "successors"]:
+        arrays.append(getattr(model, name, None))
+    starts = getattr(model, "starts", None)
+    if starts is not None:
+        arrays += [starts.ids, starts.cumulative]
+    samplers = [model._sampler, getattr(model, "_quantized", None)]
+    modes = getattr(model, "_modes", None)
+    if modes is not None:
+        samplers += modes.values()
+    for sampler in samplers:
+        if sampler is not None:
+            arrays += [sampler.indptr, sampler.indices, sampler.cumulative, getattr(sampler, "positions", None)]
+    seen = {id(a): a for a in arrays if isinstance(a, np.ndarray)}
+    size = sum(a.nbytes for a in seen.values())
+    words = model.vocabulary.words
+    size += sys.getsizeof(words) + sys.getsizeof(model.vocabulary.index)
+    size += sum(map(sys.getsizeof, words))
+    return size
@@ -0,0 +1,448 @@
+import numpy as np
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import namedtuple, OrderedDict
+import threading
+
+# Rows with more followers than this get an alias table in AliasSampler. Below
+# about this many, the binary search (in C) is as fast as the table lookup (in
+# Python.)
+ALIAS_THRESHOLD = 16384
+# How many ModeSamplers a matrix keeps, see ModeCache.
+MODE_CACHE_SIZE = 8
+
+class CumulativeSampler:
+    """A sampling index over the rows of a CSR probability matrix.
+
+    For every row the follower probabilities are accumulated once, in the order
+    they are stored in the matrix, so that drawing a follower is a binary
+    search instead of a walk over the whole row. Nothing is allocated per draw.
+
+    Drawing with the same number p gives the same follower as subtracting the
+    probabilities one by one until p is used up, which is how draw_follower
+    used to work.
+
+    cumulative can be given to reuse sums computed earlier, such as the ones
+    stored in a serialized matrix.
+    """
+    def __init__(self, indptr, indices, data, cumulative=None):
+        self.indptr = np.asarray(indptr)
+        self.indices = np.asarray(indices)
+        if cumulative is None:
+            cumulative = _row_cumsum(self.indptr, np.asarray(data, dtype="d"))
+        self.cumulative = np.asarray(cumulative)
+        # Memoryviews index into the arrays without going through numpy
+        # scalars, which keeps single draws cheap.
+        self._indptr = memoryview(self.indptr)
+        self._indices = memoryview(self.indices)
+        self._cumulative = memoryview(self.cumulative)
+        self._keys = None
+
+    @classmethod
+    def from_matrix(cls, m):
+        """Creates a sampler from a scipy CSR matrix."""
+        return cls(m.indptr, m.indices, m.data)
+
+    def draw(self, i, p):
+        """Returns the column of the first follower of row i where the
+        accumulated probability reaches p, or -1 if there is none."""
+        lo = self._indptr[i]
+        hi = self._indptr[i + 1]
+        j = bisect_left(self._cumulative, p, lo, hi)
+        if j == hi:
+            return -1
+        return self._indices[j]
+
+    def locate(self, i, p):
+        """Like draw, but returns the position of the follower in the CSR 
+        arrays instead of its column, or -1."""
+        lo = self._indptr[i]
+        hi = self._indptr[i + 1]
+        j = bisect_left(self._cumulative, p, lo, hi)
+        if j == hi:
+            return -1
+        return j
+
+    def keys(self):
+        """Returns the sorted search keys draw_many uses, built on first use.
+
+        Offsetting every row by twice its index turns the per-row cumulative 
+        sums into one sorted array, so all rows can be searched with a single
+        searchsorted. Rows sum to 1, so the offset keeps them apart."""
+        if self._keys is None:
+            rowof = np.repeat(np.arange(0, len(self.indptr) - 1), np.diff(self.indptr))
+            self._keys = self.cumulative + 2.0 * rowof
+        return self._keys
+
+    def draw_many(self, rows, ps):
+        """Vectorized draw. Returns an array with the follower column for
+        every row in rows using the matching number in ps, -1 where a row has
+        no follower for it."""
+        keys = self.keys()
+        # Wide enough for rows + 1, whatever type the indices are stored in.
+        rows = np.asarray(rows, dtype=np.intp)
+        hi = self.indptr[rows + 1]
+        targets = np.asarray(ps, dtype="d") + 2.0 * rows
+        # searchsorted is a lot faster on sorted needles.
+        order = np.argsort(targets)
+        j = np.empty(len(rows), dtype=np.intp)
+        j[order] = np.searchsorted(keys, targets[order])
+        found = j < hi
+        # Signed, for the -1 of rows without followers.
+        out = np.full(len(rows), -1, dtype=np.promote_types(self.indices.dtype, np.int8))
+        out[found] = self.indices[j[found]]
+        return out
+
+class SamplingMode(namedtuple("SamplingMode", ["temperature", "top_k", "top_p"])):
+    """How followers are drawn, with the usual meanings:
+
+        temperature     Probabilities are raised to 1 / temperature and
+                        normalized again. Below 1 the likely followers get
+                        likelier, above 1 less so. 0 always draws the likeliest.
+        top_k           Only the top_k likeliest followers are drawn from.
+        top_p           Only the likeliest followers that together have a
+                        probability of at least top_p are drawn from.
+
+    They are applied in that order, and the followers that are left are
+    drawn in proportion to their probabilities. None means no limit.
+    SamplingMode() draws from the matrix as it is.
+    """
+    def __new__(cls, temperature=1.0, top_k=None, top_p=None):
+        temperature = float(temperature)
+        if not temperature >= 0.0:
+            raise ValueError("temperature must be at least 0.")
+        if top_k is not None:
+            top_k = int(top_k)
+            if top_k < 1:
+                raise ValueError("top_k must be at least 1.")
+        if top_p is not None:
+            top_p = float(top_p)
+            if not 0.0 < top_p <= 1.0:
+                raise ValueError("top_p must be more than 0 and at most 1.")
+        if temperature == 0.0:
+            temperature, top_k = 1.0, 1
+        return super().__new__(cls, temperature, top_k, top_p)
+
+    def plain(self):
+        """Returns whether the mode draws from the matrix as it is."""
+        return self.temperature == 1.0 and self.top_k is None and self.top_p in (None, 1.0)
+
+class ModeSampler(CumulativeSampler):
+    """A CumulativeSampler for a SamplingMode.
+
+    Every row is sorted by probability once, the mode is applied to it and
+    the followers it leaves are accumulated, so drawing costs the same binary
+    search as with CumulativeSampler, with no sorting or allocation per draw.
+
+    The arrays only hold the followers the mode leaves. positions maps them
+    back to their positions in the CSR arrays of the matrix, which locate
+    returns, like the other samplers do.
+    """
+    def __init__(self, indptr, indices, data, mode):
+        self.mode = mode
+        indptr = np.asarray(indptr)
+        data = np.asarray(data, dtype="d")
+        rows = len(indptr) - 1
+        counts = np.diff(indptr)
+        rowof = np.repeat(np.arange(0, rows), counts)
+        # Likeliest first within every row, ties in matrix order.
+        order = np.lexsort((-data, rowof))
+        w = data[order]
+        first = np.repeat(indptr[:-1], counts)
+        if mode.temperature != 1.0 and len(w) > 0:
+            # Relative to the likeliest of the row, so nothing underflows
+            # before it has to.
+            with np.errstate(divide="ignore"):
+                w = np.exp((np.log(w) - np.log(w[first])) / mode.temperature)
+        keep = np.ones(len(w), dtype=bool)
+        if mode.top_k is not None:
+            keep &= np.arange(0, len(w)) - first < mode.top_k
+        if mode.top_p is not None and mode.top_p < 1.0:
+            # Of what top_k leaves, which is the start of every row.
+            kept_w = np.where(keep, w, 0.0)
+            cum = _row_cumsum(indptr, kept_w)
+            totals = np.zeros(rows)
+            ends = indptr[1:][counts > 0] - 1
+            totals[counts > 0] = cum[ends]
+            # A follower is kept while the ones before it have less than
+            # top_p together.
+            keep &= (cum - kept_w) < mode.top_p * totals[rowof]
+        kept = np.bincount(rowof[keep], minlength=rows)
+        new_indptr = np.zeros(rows + 1, dtype=indptr.dtype)
+        np.cumsum(kept, out=new_indptr[1:])
+        self.positions = order[keep].astype(indptr.dtype)
+        w = w[keep]
+        cumulative = _row_cumsum(new_indptr, w)
+        if len(cumulative) > 0:
+            # Every row ends at exactly 1.
+            cumulative /= np.repeat(cumulative[new_indptr[1:][kept > 0] - 1], kept[kept > 0])
+        super().__init__(new_indptr, np.asarray(indices)[self.positions], None, cumulative=cumulative)
+        self._positions = memoryview(self.positions)
+
+    @classmethod
+    def from_matrix(cls, m, mode):
+        """Creates a sampler for mode from a scipy CSR matrix."""
+        return cls(m.indptr, m.indices, m.data, mode)
+
+    def locate(self, i, p):
+        j = super().locate(i, p)
+        if j == -1:
+            return -1
+        return self._positions[j]
+
+class ModeCache:
+    """The ModeSamplers of a matrix, the size most recently used ones.
+
+    The modes may come from clients (the query parameters of a server, say),
+    and every one costs as much memory as the matrix, so only a few are
+    kept. A mode that was dropped is built again when it is used."""
+    def __init__(self, size=MODE_CACHE_SIZE):
+        self.size = size
+        self._samplers = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, mode, build):
+        """Returns the sampler for mode, calling build() to make it if it is
+        not kept."""
+        with self._lock:
+            sampler = self._samplers.get(mode)
+            if sampler is not None:
+                self._samplers.move_to_end(mode)
+                return sampler
+        sampler = build()
+        with self._lock:
+            self._samplers[mode] = sampler
+            self._samplers.move_to_end(mode)
+            while len(self._samplers) > self.size:
+                self._samplers.popitem(last=False)
+        return sampler
+
+    def values(self):
+        with self._lock:
+            return list(self._samplers.values())
+
+    def __len__(self):
+        return len(self._samplers)
+
+class QuantizedSampler(CumulativeSampler):
+    """A CumulativeSampler with the cumulative sums stored as integers of bits
+    bits (8 or 16), every row ending at scale = 2 ** bits - 1. A follower gets
+    a whole number of the scale steps, its probability is that over scale.
+
+    draw takes p like the other samplers, and gives every follower exactly
+    its quantized probability when p is uniform in [0, 1).
+    """
+    def __init__(self, indptr, indices, cumulative, bits=16):
+        if bits not in (8, 16):
+            raise ValueError("bits must be 8 or 16.")
+        super().__init__(indptr, indices, None, cumulative=cumulative)
+        self.bits = bits
+        self.scale = (1 << bits) - 1
+
+    @classmethod
+    def from_probabilities(cls, indptr, indices, data, bits=16):
+        """Quantizes the CSR rows indptr, indices, data, which must each sum
+        to 1, into a new sampler.
+
+        Every follower gets its share of the scale rounded down, and the steps
+        left over in a row go to the followers that lost the most (the largest
+        remainder method), so every row sums to scale exactly. Followers that
+        get no step at all, the ones with probabilities below about 1 / scale,
+        are left out."""
+        if bits not in (8, 16):
+            raise ValueError("bits must be 8 or 16.")
+        scale = (1 << bits) - 1
+        indptr = np.asarray(indptr)
+        counts = np.diff(indptr)
+        rows = len(counts)
+        rowof = np.repeat(np.arange(0, rows), counts)
+        x = np.asarray(data, dtype="d") * scale
+        steps = np.floor(x).astype(np.int64)
+        left = scale - np.bincount(rowof, weights=steps, minlength=rows).astype(np.int64)
+        left[counts == 0] = 0
+        order = np.lexsort((steps - x, rowof))
+        rank = np.arange(0, len(order)) - indptr[:-1][rowof[order]]
+        steps[order[rank < left[rowof[order]]]] += 1
+
+        keep = steps > 0
+        new_indptr = np.zeros(rows + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rowof[keep], minlength=rows), out=new_indptr[1:])
+        cumulative = _row_cumsum(new_indptr, steps[keep])
+        dtype = np.uint8 if bits == 8 else np.uint16
+        return cls(new_indptr, np.asarray(indices)[keep], cumulative.astype(dtype), bits=bits)
+
+    def draw(self, i, p):
+        lo = self._indptr[i]
+        hi = self._indptr[i + 1]
+        j = bisect_left(self._cumulative, p * self.scale, lo, hi)
+        if j == hi:
+            return -1
+        return self._indices[j]
+
+    def locate(self, i, p):
+        lo = self._indptr[i]
+        hi = self._indptr[i + 1]
+        j = bisect_left(self._cumulative, p * self.scale, lo, hi)
+        if j == hi:
+            return -1
+        return j
+
+    def keys(self):
+        if self._keys is None:
+            rowof = np.repeat(np.arange(0, len(self.indptr) - 1), np.diff(self.indptr))
+            self._keys = self.cumulative / float(self.scale) + 2.0 * rowof
+        return self._keys
+
+    def probabilities(self):
+        """Returns the quantized probabilities, aligned with indices."""
+        cum = self.cumulative.astype(np.int64)
+        steps = np.diff(cum, prepend=0)
+        firsts = self.indptr[:-1][np.diff(self.indptr) > 0]
+        steps[firsts] = cum[firsts]
+        return steps / float(self.scale)
+
+class StartSampler:
+    """Start words weighted by how many sentences they start, as the distinct
+    word indices and the cumulative sums of their counts.
+
+    draw picks one in O(log n) for n distinct start words, without copying
+    anything, however many sentences the counts came from.
+    """
+    def __init__(self, ids, cumulative):
+        self.ids = np.asarray(ids)
+        self.cumulative = np.asarray(cumulative)
+        if self.ids.shape != self.cumulative.shape:
+            raise ValueError("Needs one cumulative count per start word.")
+        self.total = int(self.cumulative[-1]) if len(self.cumulative) > 0 else 0
+        self._ids = memoryview(self.ids)
+        self._cumulative = memoryview(self.cumulative)
+
+    @classmethod
+    def from_counts(cls, counts):
+        """Creates a sampler from the number of sentences every word index
+        starts (like the counts of split_germanic_ids.)"""
+        counts = np.asarray(counts, dtype=np.int64)
+        ids = np.flatnonzero(counts).astype(np.int32)
+        return cls(ids, np.cumsum(counts[ids]))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def draw(self, p):
+        """Returns the word index for a number p in [0, 1)."""
+        if self.total == 0:
+            raise ValueError("There are no start words.")
+        k = min(int(p * self.total), self.total - 1)
+        return self._ids[bisect_right(self._cumulative, k)]
+
+    def draw_many(self, ps):
+        """Vectorized draw, for an array of numbers in [0, 1)."""
+        if self.total == 0:
+            raise ValueError("There are no start words.")
+        k = np.minimum((np.asarray(ps) * self.total).astype(np.int64), self.total - 1)
+        return self.ids[np.searchsorted(self.cumulative, k, side="right")]
+
+class AliasSampler(CumulativeSampler):
+    """A CumulativeSampler that draws from rows with more than threshold
+    followers in constant time, with an alias table (Walker's method, built
+    the way Vose describes.) Tables are built the first time a row is drawn
+    from, so only rows that are used and have many followers cost memory.
+    Other rows, and draw_many, use the cumulative sums.
+
+    draw and locate take p the same way CumulativeSampler does, and assume
+    it is uniform between low and high, the range draw_follower and chain
+    draw it from (0 and 1.) A row's table is built to give each follower exactly the
+    probability the cumulative search would give it for such a p, including
+    the small chance of no follower at all where the row sums to less than
+    high. The follower for a given p is not the same, only the distribution.
+    """
+    def __init__(self, indptr, indices, data, cumulative=None, threshold=ALIAS_THRESHOLD, low=0.0, high=1.0):
+        super().__init__(indptr, indices, data, cumulative=cumulative)
+        if not low < high:
+            raise ValueError("low must be less than high.")
+        self.threshold = int(threshold)
+        self.low = float(low)
+        self.high = float(high)
+        self._tables = [None] * (len(self.indptr) - 1)
+
+    @classmethod
+    def from_sampler(cls, sampler, threshold=ALIAS_THRESHOLD, low=0.0, high=1.0):
+        """Creates an alias sampler sharing the arrays of another sampler."""
+        return cls(sampler.indptr, sampler.indices, None, cumulative=sampler.cumulative,
+                   threshold=threshold, low=low, high=high)
+
+    def draw(self, i, p):
+        j = self.locate(i, p)
+        if j == -1:
+            return -1
+        return self._indices[j]
+
+    def locate(self, i, p):
+        lo = self._indptr[i]
+        hi = self._indptr[i + 1]
+        if hi - lo <= self.threshold:
+            j = bisect_left(self._cumulative, p, lo, hi)
+            if j == hi:
+                return -1
+            return j
+        table = self._tables[i]
+        if table is None:
+            table = self._tables[i] = self._table(i)
+        prob, alias, outcome, scale = table
+        # Which slot, and where in it, p falls.
+        x = (p - self.low) * scale
+        k = int(x)
+        if not 0 <= k < len(prob):
+            k = 0 if k < 0 else len(prob) - 1
+        if x - k < prob[k]:
+            return outcome[k]
+        return alias[k]
+
+    def tables(self):
+        """Returns the number of alias tables built so far."""
+        return sum(1 for t in self._tables if t is not None)
+
+    def _table(self, i):
+        # The probability of every follower, as the part of [low, high] that
+        # the cumulative search gives it, and of no follower as one more.
+        lo = self._indptr[i]
+        hi = self._indptr[i + 1]
+        cum = np.asarray(self.cumulative[lo:hi], dtype="d")
+        prev = np.concatenate(([0.0], cum[:-1]))
+        w = np.clip(np.minimum(cum, self.high) - np.maximum(prev, self.low), 0.0, None)
+        none = self.high - max(cum[-1], self.low)
+        if none > 0.0:
+            w = np.append(w, none)
+        n = len(w)
+        scaled = (w * (n / w.sum())).tolist()
+        outcome = list(range(lo, hi)) + [-1] * (n - (hi - lo))
+
+        prob = array("d", bytes(8 * n))
+        alias = array("q", outcome)
+        small = [k for k in range(0, n) if scaled[k] < 1.0]
+        large = [k for k in range(0, n) if scaled[k] >= 1.0]
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            prob[s] = scaled[s]
+            alias[s] = outcome[l]
+            scaled[l] = scaled[l] + scaled[s] - 1.0
+            if scaled[l] < 1.0:
+                small.append(l)
+            else:
+                large.append(l)
+        # What is left is 1 up to rounding.
+        for k in small + large:
+            prob[k] = 1.0
+        return prob, alias, array("q", outcome), n / (self.high - self.low)
+
+def _row_cumsum(indptr, data):
+    # Cumulative sums restarting at the beginning of every row.
+    cum = np.cumsum(data)
+    counts = np.diff(indptr)
+    starts = indptr[:-1][counts > 0]
+    if len(starts) > 0:
+        base = np.zeros(len(indptr) - 1, dtype=cum.dtype)
+        base[counts > 0] = np.concatenate(([0.0], cum[starts[1:] - 1]))
+        cum -= np.repeat(base, counts)
+    return cum
@@ -0,0 +1,211 @@
+"""Reading and writing WordSaladMatrix objects in a compact binary format.
+
+A file starts with an 8 byte magic string and the length of a JSON header as a
+little-endian uint64. The header describes the matrix and lists a number of
+named sections, each a raw little-endian array placed at an offset (aligned to
+64 bytes) after the header:
+
+    indptr, indices, data       The CSR arrays of the probability matrix.
+    cumulative                  The sampling index (see CumulativeSampler.)
+                                A WordSaladCompactMatrix has no data, its
+                                indptr, indices and cumulative are those of
+                                its QuantizedSampler, and the header says
+                                how many bits.
+    counts                      The raw follower counts, if the matrix has them.
+    keys                        The search keys of CumulativeSampler.draw_many,
+                                if saved with keys=True.
+    starts.ids, starts.cumulative
+                                The start words and their cumulative counts
+                                (see StartSampler), if the matrix has them.
+    vocab.offsets, vocab.text   The words, as a string table with offsets.
+    vocab.tuples                For tuple words, offsets into the string table.
+                                Words that are neither strings nor tuples of
+                                strings are pickled into vocab.text instead.
+
+Since the arrays are stored as they are used, a file can be memory mapped, and
+every process mapping it shares the same pages.
+"""
+from .matrix import WordSaladMatrix
+from .compact import WordSaladCompactMatrix
+from .sampling import CumulativeSampler, QuantizedSampler, StartSampler
+from .vocabulary import Vocabulary
+import numpy as np
+import json
+import os
+import pickle
+import struct
+
+MAGIC = b"WSALAD\x00\x01"
+VERSION = 1
+ALIGNMENT = 64
+
+def save_matrix(mat, path, keys=False):
+    """Writes mat to the file at path.
+
+    With keys=True the search keys of draw_many (used by generate_batch) are
+    saved too, so processes mapping the file share them instead of each
+    building their own.
+
+    The file is written next to path and moved into place when complete, so a
+    reader never sees a half written file."""
+    if not isinstance(mat, WordSaladMatrix):
+        raise TypeError("Expected mat to be of type WordSaladMatrix.")
+    kind, sections = _encode_words(mat.vocabulary.words)
+    n = len(mat.vocabulary)
+    meta = {
+        "version": VERSION,
+        "shape": [n, n],
+        "vocabulary": kind,
+    }
+    if isinstance(mat, WordSaladCompactMatrix):
+        s = mat._quantized
+        sections.update({"indptr": s.indptr, "indices": s.indices, "cumulative": s.cumulative})
+        meta["quantized"] = s.bits
+    else:
+        data, indices, indptr = mat._arrays()
+        sections.update({
+            "indptr": indptr,
+            "indices": indices,
+            "data": data,
+            "cumulative": mat.sampler().cumulative,
+        })
+    if mat.counts is not None:
+        sections["counts"] = mat.counts
+    if keys:
+        sections["keys"] = mat.sampler().keys()
+    if mat.starts is not None:
+        sections["starts.ids"] = mat.starts.ids
+        sections["starts.cumulative"] = mat.starts.cumulative
+    write_sections(path, meta, sections)
+
+def load_matrix(path, mmap=True):
+    """Reads a WordSaladMatrix (or WordSaladCompactMatrix) written by
+    save_matrix.
+
+    With mmap=True the arrays are mapped from the file instead of read, and
+    are read-only. scipy is not imported until something needs the matrix
+    itself (see WordSaladMatrix.fromCSR.)
+
+    Only load files from a source you trust: the words of a vocabulary that
+    is not all strings are unpickled, and unpickling can run arbitrary code."""
+    meta, sections = read_sections(path, mmap=mmap)
+    if meta.get("version") != VERSION:
+        raise ValueError("Unsupported file version {}.".format(meta.get("version")))
+    words = _decode_words(meta["vocabulary"], sections)
+    starts = None
+    if "starts.ids" in sections:
+        starts = StartSampler(sections["starts.ids"], sections["starts.cumulative"])
+    if "quantized" in meta:
+        sampler = QuantizedSampler(
+            sections["indptr"], sections["indices"], sections["cumulative"], bits=meta["quantized"])
+        sampler._keys = sections.get("keys")
+        return WordSaladCompactMatrix(sampler, Vocabulary(words), starts=starts)
+    mat = WordSaladMatrix.fromCSR(
+        sections["data"], sections["indices"], sections["indptr"], Vocabulary(words),
+        counts=sections.get("counts"), starts=starts)
+    mat._sampler = CumulativeSampler(
+        sections["indptr"], sections["indices"], sections["data"],
+        cumulative=sections["cumulative"])
+    mat._sampler._keys = sections.get("keys")
+    return mat
+
+def write_sections(path, meta, sections):
+    """Writes the dict meta and the numpy arrays in the dict sections to path,
+    in the format described in the module documentation."""
+    arrays = {}
+    table = {}
+    offset = 0
+    for name, a in sections.items():
+        a = np.ascontiguousarray(a)
+        a = a.astype(a.dtype.newbyteorder("<"), copy=False)
+        arrays[name] = a
+        table[name] = {"dtype": a.dtype.str, "offset": offset, "length": len(a)}
+        offset = _align(offset + a.nbytes)
+    header = dict(meta)
+    header["sections"] = table
+    header = json.dumps(header).encode("utf-8")
+
+    tmp = "{}.tmp{}".format(path, os.getpid())
+    try:
+        with open(tmp, "wb") as f:
+            f.write(MAGIC)
+            f.write(struct.pack("<Q", len(header)))
+            f.write(header)
+            f.write(b"\x00" * (_align(f.tell()) - f.tell()))
+            start = f.tell()
+            for name, a in arrays.items():
+                f.write(b"\x00" * (start + table[name]["offset"] - f.tell()))
+                f.write(a.view(np.uint8))
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+def read_sections(path, mmap=True):
+    """Reads a file written by write_sections, returns the meta dict and a dict
+    of arrays."""
+    if mmap:
+        buf = np.memmap(path, dtype=np.uint8, mode="r")
+    else:
+        with open(path, "rb") as f:
+            buf = np.frombuffer(f.read(), dtype=np.uint8)
+    if len(buf) < 16 or bytes(buf[0:8]) != MAGIC:
+        raise ValueError("{} is not a wordsalad matrix file.".format(path))
+    (n,) = struct.unpack("<Q", bytes(buf[8:16]))
+    meta = json.loads(bytes(buf[16:16 + n]).decode("utf-8"))
+    start = _align(16 + n)
+    sections = {}
+    for name, s in meta.pop("sections").items():
+        dtype = np.dtype(s["dtype"])
+        begin = start + s["offset"]
+        sections[name] = buf[begin:begin + s["length"] * dtype.itemsize].view(dtype)
+    return meta, sections
+
+def _align(n):
+    return (n + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+def _encode_strings(strings):
+    # A string table: all strings after each other, and the offset (in code
+    # points) where each one starts.
+    lengths = np.fromiter(map(len, strings), dtype=np.int64, count=len(strings))
+    offsets = np.zeros(len(strings) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    text = np.frombuffer("".join(strings).encode("utf-8"), dtype=np.uint8)
+    return offsets, text
+
+def _decode_strings(offsets, text):
+    s = bytes(text).decode("utf-8")
+    offsets = offsets.tolist()
+    return [s[i:j] for i, j in zip(offsets, offsets[1:])]
+
+def _encode_words(words):
+    if all(type(w) is str for w in words):
+        offsets, text = _encode_strings(words)
+        return "str", {"vocab.offsets": offsets, "vocab.text": text}
+    if all(type(w) is tuple and all(type(e) is str for e in w) for w in words):
+        offsets, text = _encode_strings([e for w in words for e in w])
+        tuples = np.zeros(len(words) + 1, dtype=np.int64)
+        np.cumsum([len(w) for w in words], out=tuples[1:])
+        return "tuple", {"vocab.offsets": offsets, "vocab.text": text, "vocab.tuples": tuples}
+    # Anything else hashable is pickled, one word at a time.
+    blobs = [pickle.dumps(w, protocol=pickle.HIGHEST_PROTOCOL) for w in words]
+    offsets = np.zeros(len(words) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in blobs], out=offsets[1:])
+    text = np.frombuffer(b"".join(blobs), dtype=np.uint8)
+    return "pickle", {"vocab.offsets": offsets, "vocab.text": text}
+
+def _decode_words(kind, sections):
+    offsets = sections["vocab.offsets"]
+    text = sections["vocab.text"]
+    if kind == "str":
+        return _decode_strings(offsets, text)
+    if kind == "tuple":
+        elements = _decode_strings(offsets, text)
+        tuples = sections["vocab.tuples"].tolist()
+        return [tuple(elements[i:j]) for i, j in zip(tuples, tuples[1:])]
+    if kind == "pickle":
+        blob = bytes(text)
+        offsets = offsets.tolist()
+        return [pickle.loads(blob[i:j]) for i, j in zip(offsets, offsets[1:])]
+    raise ValueError("Unknown vocabulary kind {}.".format(kind))
@@ -0,0 +1,94 @@
+"""Reproducible random streams for generating word salads.
+
+A seed is anything numpy.random.default_rng accepts (None, an int, a
+SeedSequence...) or a numpy Generator. spawn derives independent child
+generators from one, so every chain or worker can get its own stream: the
+result does not depend on the order they run in, and they share no state or
+lock.
+
+block_uniform returns a function with the interface of random.uniform, which
+draw_follower and chain take as rng, that draws its numbers from a Generator
+a block at a time.
+"""
+from itertools import chain
+import numpy as np
+
+# How many numbers block_uniform draws at a time by default.
+BLOCK_SIZE = 1024
+# How many streams of spawn_uniform draw their first numbers together.
+_GROUP = 1024
+
+def generator(seed=None):
+    """Returns seed if it is a Generator, otherwise a new Generator seeded
+    with it."""
+    if isinstance(seed, np.random.Generator):
+        return seed
+    return np.random.default_rng(seed)
+
+def spawn(seed, n):
+    """Returns n independent Generators derived from seed.
+
+    For an int the same children are returned every time. A Generator or a
+    SeedSequence gives new children every call, like their spawn methods."""
+    if isinstance(seed, np.random.Generator):
+        return seed.spawn(int(n))
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    return [np.random.default_rng(s) for s in seed.spawn(int(n))]
+
+def spawn_uniform(seed, n, block=64):
+    """Returns n independent replacements for random.uniform (see
+    block_uniform) derived from seed, for n short chains.
+
+    Like spawn, but the first block numbers of a stream are drawn together
+    with those of the streams next to it, _GROUP streams at a time, when the
+    first of them is used. A Generator is only spawned for the streams that
+    need more. Stream k always gets the same numbers, however many the others
+    use and in what order."""
+    gen = generator(seed)
+    n = int(n)
+    block = max(int(block), 1)
+    entropy = gen.integers(0, 1 << 63, size=4).tolist()
+    # The first blocks of the groups in use, and how many of them are left.
+    groups = {}
+    def first(k):
+        g, row = divmod(k, _GROUP)
+        entry = groups.get(g)
+        if entry is None:
+            size = min(_GROUP, n - g * _GROUP)
+            rng = np.random.default_rng(np.random.SeedSequence(entropy, spawn_key=(0, g)))
+            entry = groups[g] = [rng.random((size, block)), size]
+        numbers = entry[0][row].tolist()
+        entry[1] -= 1
+        if entry[1] == 0:
+            groups.pop(g, None)
+        return numbers
+    def blocks(k):
+        yield first(k)
+        g = np.random.default_rng(np.random.SeedSequence(entropy, spawn_key=(1, k)))
+        while True:
+            yield g.random(block).tolist()
+    return [_uniform(chain.from_iterable(blocks(k))) for k in range(0, n)]
+
+def block_uniform(seed=None, block=BLOCK_SIZE):
+    """Returns a replacement for random.uniform that takes its numbers from a
+    numpy Generator (created from seed with generator), block numbers at a
+    time.
+
+        chain(mat, "The", rng=block_uniform(42))
+
+    It is not thread-safe, give every thread its own (see spawn.)
+    """
+    gen = generator(seed)
+    block = max(int(block), 1)
+    def blocks():
+        while True:
+            yield gen.random(block).tolist()
+    return _uniform(chain.from_iterable(blocks()))
+
+def _uniform(numbers):
+    # random.uniform with the numbers of an iterator. Default arguments are
+    # the fastest lookups, this is called once per word.
+    def uniform(a, b, _next=next, _numbers=numbers):
+        return a + (b - a) * _next(_numbers)
+    return uniform
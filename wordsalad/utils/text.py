@@ -1,5 +1,8 @@
 import string
 import random
+import time
+from functools import lru_cache
+from .. import metrics
 
 def join_germanic(iterable, capitalize=True, quoteChars="\"", concat="'"):
     """Like "".join(iterable) but with special handling, making it easier to just concatenate a list of words.
@@ -25,61 +28,122 @@ def join_germanic(iterable, capitalize=True, quoteChars="\"", concat="'"):
     
     For example if quoteChars="'", it won't know whether an apostrophe is an apostrophe or a quote.
     """
-    def mkcapital(w):
-        return w.capitalize()
-    
-    def nopmkcapital(w):
-        return w
-        
-    capital = mkcapital if capitalize else nopmkcapital
+    rules = _join_rules(bool(capitalize), quoteChars, concat)
+    parts = []
+    sink = metrics.sink
+    if sink is None:
+        _join_into(parts, iterable, rules)
+        return "".join(parts)
+    # With a lazy iterable this includes the time taken to produce the words.
+    start = time.perf_counter()
+    _join_into(parts, iterable, rules)
+    joined = "".join(parts)
+    sink.observe("join_germanic.seconds", time.perf_counter() - start)
+    return joined
 
-    quoteLevels = {c: 0 for c in quoteChars}
-    
-    # Check whether c is a quote, and handle it.
-    def checkQuote(c):
-        if c in quoteChars:
-            ql = quoteLevels[c]
-            # If we have already seen this quote, decrement, if not we increment.
-            # This way we can know how many start quotes we have seen
-            if ql > 0:
-                ql -= 1
-            else:
-                ql += 1
-            quoteLevels[c] = ql
-
-    s = ""
+def join_germanic_many(sequences, out=None, sep=" ", capitalize=True, quoteChars="\"", concat="'"):
+    """Joins every sequence of words in sequences with join_germanic, and
+    joins the results with sep.
+
+    If out is None the result is returned as a string. Otherwise it is written
+    to out, which can be anything with a write method, like a file or an
+    io.StringIO, and nothing is returned.
+    """
+    sink = metrics.sink
+    if sink is not None:
+        start = time.perf_counter()
+    rules = _join_rules(bool(capitalize), quoteChars, concat)
+    parts = []
+    n = 0
+    for seq in sequences:
+        if n > 0:
+            parts.append(sep)
+        n += 1
+        _join_into(parts, seq, rules)
+        if out is not None and len(parts) > 4096:
+            out.write("".join(parts))
+            parts = []
+    joined = "".join(parts)
+    if sink is not None:
+        sink.count("join_germanic_many.sequences", n)
+        sink.observe("join_germanic_many.seconds", time.perf_counter() - start)
+    if out is None:
+        return joined
+    out.write(joined)
+
+def _membership(s):
+    # join_germanic tests words with "w in s", which for a string is true for
+    # any substring of it. A set of all of them gives the same answers with a
+    # hash lookup.
+    if isinstance(s, str):
+        return frozenset(s[i:j] for i in range(0, len(s) + 1) for j in range(i, len(s) + 1))
+    return frozenset(s)
+
+def _join_rules(capitalize, quoteChars, concat):
+    if isinstance(quoteChars, str) and isinstance(concat, str):
+        return _cached_join_rules(capitalize, quoteChars, concat)
+    return _make_join_rules(capitalize, quoteChars, concat)
+
+@lru_cache(maxsize=32)
+def _cached_join_rules(capitalize, quoteChars, concat):
+    return _make_join_rules(capitalize, quoteChars, concat)
+
+def _make_join_rules(capitalize, quoteChars, concat):
+    quotes = _membership(quoteChars)
+    concat = _membership(concat)
+    nospace = _membership(".!?,;:")
+    # Words that need any of the rules below, anything else just gets a space
+    # in front of it when following an equally plain word.
+    special = quotes | concat | nospace | {""}
+    return (capitalize, quoteChars, quotes, concat, nospace, special)
+
+def _join_into(parts, iterable, rules):
+    # Appends the words of iterable, and the spaces between them, to parts.
+    capitalize, quoteChars, quotes, concat, nospace, special = rules
+    quoteLevels = dict.fromkeys(quoteChars, 0)
     last = ""
+    # Whether last is a word that no rule applies to after it.
+    plain = False
     for w in iterable:
-        w = str(w)
-        space = True if last != "" else False
+        if type(w) is not str:
+            w = str(w)
+        if plain and w not in special:
+            parts.append(" ")
+            parts.append(w)
+            last = w
+            plain = not w.endswith(".")
+            continue
+
+        space = last != ""
         # Don't add spaces around concat-words.
         if w in concat or last in concat:
             space = False
         # "."" followed by more "."
         elif last.endswith("."):
-            w = capital(w)
+            if capitalize:
+                w = w.capitalize()
             if w.startswith("."):
                 space = False
         # Remove space after last word in a sentence or certain punctuation.
-        elif w in ".!?,;:":
+        elif w in nospace:
             space = False
         # The last two takes care of end and start quotes.
-        elif w in quoteChars:
-            ql = quoteLevels[w]
-            if ql == 1:
-                space = False 
-        elif last != "" and last in quoteChars:
-            ql = quoteLevels[last]
-            if ql == 1:
+        elif w in quotes:
+            if quoteLevels[w] == 1:
                 space = False
-        
-        checkQuote(w)
+        elif last != "" and last in quotes:
+            if quoteLevels[last] == 1:
+                space = False
+
+        # If we have already seen this quote, decrement, if not we increment.
+        # This way we can know how many start quotes we have seen
+        if w in quotes:
+            quoteLevels[w] = quoteLevels[w] - 1 if quoteLevels[w] > 0 else quoteLevels[w] + 1
         if space:
-            s += " "
-        s += w
+            parts.append(" ")
+        parts.append(w)
         last = w
-    
-    return s
+        plain = last != "" and last not in concat and last not in quotes and not last.endswith(".")
 
 def mojibakify(s, bit_rot = True):
 	'''Takes an input string, destroys it and returns a byte object.
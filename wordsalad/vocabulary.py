@@ -0,0 +1,87 @@
+from collections.abc import Mapping
+from array import array
+
+class Vocabulary(Mapping):
+    """A bijection between words and the indices 0, 1, ..., n - 1, in the order
+    the words were added.
+
+    Indices are looked up with one dict (word -> index), words with a list
+    (index -> word), so a word costs one dict entry and one list slot rather
+    than an entry in two dicts.
+
+    It is a read-only Mapping from words to indices, so it can be used where a
+    dict from words to indices is expected. Words are only ever added, with
+    add.
+    """
+    def __init__(self, words=()):
+        self.words = []
+        self.index = {}
+        for w in words:
+            self.add(w)
+
+    @classmethod
+    def fromMapping(cls, wordtoindex):
+        """Creates a vocabulary from a mapping of words to the indices
+        0, 1, ..., n - 1. Raises ValueError if it is not one."""
+        vocab = cls()
+        vocab.words = [None] * len(wordtoindex)
+        seen = [False] * len(wordtoindex)
+        for w, i in wordtoindex.items():
+            if not (0 <= i < len(seen)) or seen[i]:
+                raise ValueError("wordtoindex does not map words to 0, 1, ..., n - 1.")
+            seen[i] = True
+            vocab.words[i] = w
+        vocab.index = dict(wordtoindex)
+        return vocab
+
+    def add(self, w):
+        """Adds w if it is new, and returns its index."""
+        i = self.index.get(w)
+        if i is None:
+            i = self.index[w] = len(self.words)
+            self.words.append(w)
+        return i
+
+    def addAll(self, words):
+        """Adds the new words among words, in the order they first appear, and
+        returns the index of every word as an array("i").
+
+        Every occurrence is looked up twice, in C: once to find the new words
+        and once for its index. Only the new words are stored."""
+        words = list(words)
+        index = self.index
+        for w in dict.fromkeys(words):
+            if w not in index:
+                index[w] = len(self.words)
+                self.words.append(w)
+        return array("i", map(index.__getitem__, words))
+
+    def indexOf(self, w):
+        return self.index[w]
+
+    def wordAt(self, i):
+        return self.words[i]
+
+    def copy(self):
+        vocab = Vocabulary()
+        vocab.words = list(self.words)
+        vocab.index = dict(self.index)
+        return vocab
+
+    def __getitem__(self, w):
+        return self.index[w]
+
+    def __contains__(self, w):
+        return w in self.index
+
+    def __iter__(self):
+        return iter(self.words)
+
+    def __len__(self):
+        return len(self.words)
+
+    def items(self):
+        return zip(self.words, range(0, len(self.words)))
+
+    def __repr__(self):
+        return "<Vocabulary of {} words>".format(len(self.words))
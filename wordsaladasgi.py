@@ -0,0 +1,120 @@
+"""An ASGI version of the endpoints in wordsaladflask, for running under an
+ASGI server (uvicorn wordsaladasgi:application, say.)
+
+Salads are generated in batches on a thread pool, off the event loop, and each
+batch is sent as soon as it is done. A large request therefore only holds a
+thread for one batch at a time and never blocks the small ones. Corpora with a
+pool are served from it, a batch at a time as well.
+
+It uses the config and the corpora of wordsaladflask.
+"""
+import wordsalad
+import wordsalad.streams
+import wordsalad.utils
+import wordsaladflask
+from wordsaladflask import app, salads, pools
+import asyncio
+import re
+import urllib.parse
+
+# How many salads are generated per batch, unless "batch_size" is set in the
+# config.
+DEFAULT_BATCH_SIZE = 64
+
+_SALAD = re.compile(r"^/salad/([0-9]+)/([^/]+)$")
+
+def generateBatch(mat, n, rng=None, mode=None):
+    """Generates n salads and joins them into one string."""
+    return wordsalad.utils.join_germanic_many(wordsalad.generate_batch(
+        mat, n, rng=rng, stops=wordsaladflask.STOPS, mode=mode,
+        max_length=wordsaladflask.maxWords(), join=list))
+
+def takeBatch(pool, n):
+    """Takes n salads from pool and joins them into one string."""
+    return " ".join(pool.take(n))
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+
+    path = scope["path"]
+    if path == "/salad/corpora":
+        await _respond(send, 200, wordsaladflask.get_corpora())
+        return
+    if path == "/metrics":
+        await _respond(send, 200, wordsaladflask.get_metrics().get_data(as_text=True))
+        return
+    match = _SALAD.match(path)
+    if match is None:
+        await _respond(send, 404, "404")
+        return
+
+    n, corpus = int(match.group(1)), match.group(2)
+    if corpus not in wordsaladflask.corpusNames():
+        await _respond(send, 200, "404")
+        return
+    limit = wordsaladflask.maxSalads()
+    if n > limit:
+        await _respond(send, 400, "n must be at most {}".format(limit))
+        return
+
+    loop = asyncio.get_running_loop()
+    batch = int(app.config.get("batch_size", DEFAULT_BATCH_SIZE))
+    query = _query(scope)
+    seed = _seed(query)
+    try:
+        mode = wordsaladflask.samplingMode(query)
+    except ValueError as e:
+        await _respond(send, 400, str(e))
+        return
+    pool = pools.get(corpus) if seed is None and mode is None else None
+    if pool is None:
+        # Building a corpus that is not loaded yet can take a while.
+        mat = await loop.run_in_executor(None, salads.get, corpus)
+        # Every batch gets its own stream, spawned from the seed if there is one.
+        rngs = wordsalad.streams.spawn(seed, (n + batch - 1) // batch)
+    await send({"type": "http.response.start", "status": 200, "headers": _HEADERS})
+    sep = ""
+    for k, done in enumerate(range(0, n, batch)):
+        if pool is not None:
+            text = await loop.run_in_executor(None, takeBatch, pool, min(batch, n - done))
+        else:
+            text = await loop.run_in_executor(None, generateBatch, mat, min(batch, n - done), rngs[k], mode)
+        await send({"type": "http.response.body", "body": (sep + text).encode("utf-8"), "more_body": True})
+        sep = " "
+    await send({"type": "http.response.body", "body": b""})
+
+_HEADERS = [(b"content-type", b"text/html; charset=utf-8")]
+
+def _query(scope):
+    # The first value of every query parameter.
+    query = urllib.parse.parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    return {name: values[0] for name, values in query.items()}
+
+def _seed(query):
+    # The seed query parameter, like wordsaladflask.get takes it.
+    try:
+        return int(query["seed"])
+    except (KeyError, ValueError):
+        return None
+
+async def _respond(send, status, text):
+    await send({"type": "http.response.start", "status": status, "headers": _HEADERS})
+    await send({"type": "http.response.body", "body": text.encode("utf-8")})
+
+async def _lifespan(receive, send):
+    # Sets up the corpora on startup, the same way wordsaladflask.main does.
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            loop = asyncio.get_running_loop()
+            config = wordsaladflask.loadConfig(wordsaladflask.DEFAULT_CONFIG_PATH)
+            app.config.update(config)
+            await loop.run_in_executor(None, wordsaladflask.buildSalads, config)
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
@@ -1,45 +1,196 @@
 import wordsalad
 import wordsalad.input
+import wordsalad.metrics
+import wordsalad.parallel
+import wordsalad.pool
+import wordsalad.registry
 import wordsalad.utils
+from itertools import islice
+import functools
 import json
 import logging
-from flask import Flask
+import time
+from flask import Flask, Response, request, stream_with_context
 
-salads = {}
 app = Flask(__name__)
 
+# The largest n a single request may ask for, unless "max_salads" is set in
+# the config.
+DEFAULT_MAX_SALADS = 1000
+# The most words in a salad, unless "max_words" is set in the config. The
+# likeliest followers can go round in circles, with top_k=1 say, and never
+# reach a stop.
+DEFAULT_MAX_WORDS = 1000
+STOPS = list(".?!")
+
 @app.route("/salad/<int:n>/<string:corpus>")
 def get(n, corpus):
-    """Generate n word salads from the given (optional) corpus."""
+    """Generate n word salads from the given (optional) corpus.
+
+    The salads are sent as they are generated, or taken from the corpus'
+    pool if it has one. With an integer seed query parameter (?seed=42) the
+    same request always gives the same salads, those never come from the
+    pool. The temperature, top_k and top_p query parameters choose how words
+    are drawn (see wordsalad.SamplingMode), such requests are not served from
+    the pool either."""
     app.logger.debug("Call to get with n=%d corpus='%s'.", n, corpus)
     
-    if corpus not in salads:
+    if corpus not in corpusNames():
         return "404"
-    mat, starts = salads[corpus]
-    res = [list(k) for k in wordsalad.generate_sentences(mat, n, starts, stops=list(".?!"))]
-    return " ".join([wordsalad.utils.join_germanic(k) for k in res])
+    limit = maxSalads()
+    if n > limit:
+        return "n must be at most {}".format(limit), 400
+    seed = request.args.get("seed", type=int)
+    try:
+        mode = samplingMode(request.args)
+    except ValueError as e:
+        return str(e), 400
+    pool = pools.get(corpus) if seed is None and mode is None else None
+    if pool is not None:
+        joined = pool.take(n)
+    else:
+        mat = salads.get(corpus)
+        limit = maxWords()
+        joined = (wordsalad.utils.join_germanic(islice(k, limit))
+                  for k in wordsalad.generate_sentences(mat, n, stops=STOPS, seed=seed, mode=mode))
+
+    def stream():
+        start = time.perf_counter()
+        sep = ""
+        for salad in joined:
+            yield sep + salad
+            sep = " "
+        sink = wordsalad.metrics.sink
+        if sink is not None:
+            sink.count("salad_request.salads", n)
+            sink.observe("salad_request.seconds", time.perf_counter() - start)
+    return Response(stream_with_context(stream()))
+
+def samplingMode(args):
+    """Returns the SamplingMode given by the temperature, top_k and top_p in
+    args (a mapping of query parameters), or None if there are none.
+
+    Raises ValueError for values SamplingMode does not take."""
+    given = {name: args[name] for name in ["temperature", "top_k", "top_p"] if name in args}
+    if not given:
+        return None
+    return wordsalad.SamplingMode(**given)
+
+def maxSalads():
+    return int(app.config.get("max_salads", DEFAULT_MAX_SALADS))
+
+def maxWords(config=None):
+    config = app.config if config is None else config
+    return int(config.get("max_words", DEFAULT_MAX_WORDS))
 
 @app.route("/salad/corpora")
 def get_corpora():
     """Fetch a list of "corpora" we can use as a source text."""
     app.logger.debug("Call to get_corpora.")
-    return json.dumps(app.config["corpora"])
+    return json.dumps([dict(c, loaded=c["name"] in salads) for c in app.config["corpora"]])
+
+@app.route("/metrics")
+def get_metrics():
+    """The metrics of the corpora registry, and those recorded by wordsalad if
+    "metrics" is set in the config, in the Prometheus text format."""
+    text = ""
+    for name, value in sorted(salads.stats().items()):
+        kind = "gauge" if name in ("models", "bytes") else "counter"
+        text += "# TYPE wordsalad_registry_{0} {1}\nwordsalad_registry_{0} {2}\n".format(name, kind, value)
+    pool_stats = {corpus: pool.stats() for corpus, pool in sorted(pools.items())}
+    for name in (_POOL_METRICS if pool_stats else []):
+        kind = "counter" if name in ("refilled", "drained", "on_demand", "errors") else "gauge"
+        text += "# TYPE wordsalad_pool_{} {}\n".format(name, kind)
+        for corpus, stats in pool_stats.items():
+            text += 'wordsalad_pool_{}{{corpus="{}"}} {}\n'.format(name, corpus, stats[name])
+    sink = wordsalad.metrics.sink
+    if isinstance(sink, wordsalad.metrics.MemorySink):
+        text += sink.prometheus()
+    return Response(text, mimetype="text/plain")
+
+_POOL_METRICS = ["size", "depth", "refilled", "drained", "on_demand", "errors", "refill_rate", "drain_rate"]
+
+def corpusNames():
+    return [c["name"] for c in app.config.get("corpora", [])]
 
 DEFAULT_CONFIG_PATH="config.json"
 
+def buildSalad(name, config=None):
+    """Builds the matrix of the corpus called name, with its start words.
+
+    If the corpus has a "model" file saved with WordSaladMatrix.save (or
+    python -m wordsalad build) it is mapped instead."""
+    config = app.config if config is None else config
+    corpus = next((c for c in config["corpora"] if c["name"] == name), None)
+    if corpus is None:
+        raise KeyError(name)
+    if corpus.get("model"):
+        return wordsalad.load_matrix(corpus["model"])
+    processes = config.get("processes")
+    if processes:
+        # Tokenise and count on a pool of processes.
+        return wordsalad.parallel.build_parallel(corpus["filename"], processes=processes)
+
+    builder = wordsalad.WordSaladMatrixBuilder()
+    # The file is tokenised as it is read.
+    with open(corpus["filename"], encoding="utf-8") as f:
+        ids, starts = wordsalad.input.split_germanic_ids(f, builder.words)
+    builder.count_followers_in_ids(ids)
+    app.logger.info("Built corpus '%s'.", name)
+    return builder.build_matrix(start_counts=starts)
+
+# The corpora are built when first asked for, and the least recently used are
+# dropped when "max_model_bytes" or "max_models" in the config is exceeded.
+salads = wordsalad.registry.ModelRegistry(buildSalad)
+
+# Pools of salads generated ahead of time, by corpus name, for the corpora
+# with a "pool_depth".
+pools = {}
+
+def poolGenerator(name, config=None):
+    """Returns a function that generates n joined salads from the corpus called
+    name, for its SaladPool."""
+    config = app.config if config is None else config
+    def generate(n):
+        mat = salads.get(name)
+        return [wordsalad.utils.join_germanic(s) for s in wordsalad.generate_batch(
+            mat, n, stops=STOPS, max_length=maxWords(config), join=list)]
+    return generate
+
+def startPools(config):
+    """Starts a pool for every corpus with a "pool_depth" (or for all of them
+    if "pool_depth" is set at the top of the config), refilled "pool_batch"
+    salads at a time. Corpora that no longer have one have their pool
+    stopped."""
+    for name in list(pools):
+        pools.pop(name).stop()
+    for corpus in config.get("corpora", []):
+        depth = corpus.get("pool_depth", config.get("pool_depth"))
+        if not depth:
+            continue
+        pool = wordsalad.pool.SaladPool(
+            poolGenerator(corpus["name"], config), depth,
+            batch=config.get("pool_batch", 64), name=corpus["name"])
+        pools[corpus["name"]] = pool
+        pool.start()
+
 def buildSalads(config):
-    for corpus in config["corpora"]:
-        txt = ""
-        with open(corpus["filename"], encoding="utf-8") as f:
-            txt = f.read()
-        
-        starts = []
-        words = wordsalad.input.split_germanic(txt, start_words=starts)
-        
-        builder = wordsalad.WordSaladMatrixBuilder()
-        builder.count_followers_in_sequence(words)
-
-        salads[corpus["name"]] = (builder.build_matrix(), starts)
+    """Sets the limits of the corpora registry from config. If "preload" is
+    set in the config every corpus is built right away, otherwise on first
+    use. If "metrics" is set, metrics are recorded for /metrics. The pools
+    are started last (see startPools.)
+
+    The registry builds corpora from config from now on, so the pools can
+    fill before config is in app.config."""
+    salads.loader = functools.partial(buildSalad, config=config)
+    salads.max_bytes = config.get("max_model_bytes")
+    salads.max_models = config.get("max_models")
+    if config.get("metrics") and wordsalad.metrics.sink is None:
+        wordsalad.metrics.set_sink(wordsalad.metrics.MemorySink())
+    if config.get("preload"):
+        for corpus in config["corpora"]:
+            salads.put(corpus["name"], buildSalad(corpus["name"], config))
+    startPools(config)
 
 def loadConfig(path):
     app.logger.info("Loading config from '%s'.", path)
@@ -49,8 +200,8 @@ def loadConfig(path):
 
 def main():
     config = loadConfig(DEFAULT_CONFIG_PATH)
-    buildSalads(config)
     app.config.update(config)
+    buildSalads(config)
     app.run()
 
 if __name__ == '__main__':